@@ -1,40 +1,315 @@
+import time
+_STARTUP_T0 = time.perf_counter()
+
 import tkinter as tk
+import argparse
+import importlib
 import json
+import marshal
 import copy
+import ctypes, ctypes.util
+import functools
+import hashlib
+import heapq
+import math
 import os
+import platform
+import queue
+import secrets
+import select
 import shutil
+import socket
+import struct
 import subprocess, shlex
 import sys
+import tempfile
+import threading
+import zlib
+from collections import OrderedDict, deque, namedtuple
+from collections.abc import Mapping, MutableMapping
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import ttk, messagebox, simpledialog
 
-try:
-    from PIL import Image, ImageTk
-    import win32api
-    import win32gui
-    import win32con
-    # Windowsの管理者権限でアプリを起動するためのライブラリ
-    import win32com.shell.shell as shell  # type: ignore
-except ImportError:
-    messagebox.showerror("ライブラリ不足", "この機能には Pillow と pywin32 が必要です。\n'pip install Pillow pywin32' を実行してください。")
-    exit()
-
-try:
-    from tkinterdnd2 import DND_FILES, TkinterDnD
-except ImportError:
-    messagebox.showerror("ライブラリ不足", "この機能には tkinterdnd2 が必要です。\n'pip install tkinterdnd2' を実行してください。")
-    exit()
-
-class AppLauncher(TkinterDnD.Tk):
+# --- 遅延インポートと起動時間の計測 ---
+# Pillow / pywin32 / tkinterdnd2 は読み込みに時間がかかるため、起動時には読み込まず
+# 初めて必要になった時点で lazy_import で読み込む
+# 読み込みや起動の各段階にかかった時間は startup_report で確認できる
+_startup_events = []
+_startup_lock = threading.Lock()
+
+
+def record_startup_event(label: str, duration: float = 0.0):
     """
-    設定ファイルに基づいてアプリケーションをカテゴリ別に表示するランチャー
+    起動からの経過時間とともにイベントを記録する
+    """
+    with _startup_lock:
+        _startup_events.append((label, time.perf_counter() - _STARTUP_T0, duration))
+
+
+def lazy_import(module_name: str):
+    """
+    モジュールを初回のみ読み込み、読み込みにかかった時間を記録する
+    見つからない場合は ImportError をそのまま送出する
+    """
+    module = sys.modules.get(module_name)
+    if module is not None:
+        return module
+    start = time.perf_counter()
+    module = importlib.import_module(module_name)
+    record_startup_event(f"import {module_name}", time.perf_counter() - start)
+    return module
+
+
+# tkinterdnd2 に同梱されている tkdnd のフォルダ名 ((OS, CPU) -> tkinterdnd2/tkdnd/ の下のフォルダ)
+_TKDND_PLATFORM_DIRS = {
+    ("Darwin", "arm64"): "osx-arm64",
+    ("Darwin", "x86_64"): "osx-x64",
+    ("Linux", "aarch64"): "linux-arm64",
+    ("Linux", "x86_64"): "linux-x64",
+    ("Windows", "ARM64"): "win-arm64",
+    ("Windows", "AMD64"): "win-x64",
+    ("Windows", "x86"): "win-x86",
+}
+
+
+def tkdnd_library_dir(package_dir: str, tcl_version: str) -> str:
+    """
+    tkinterdnd2 のフォルダから、この環境用の tkdnd ライブラリのフォルダを求める
+    (Tcl 9 用のフォルダがあればそちらを使う)。対応していない環境では RuntimeError を送出する
+    """
+    system = platform.system()
+    # Windows の platform.machine() は OS の CPU を返すため、プロセスの CPU は環境変数から取る
+    machine = os.environ.get("PROCESSOR_ARCHITECTURE", platform.machine()) if system == "Windows" else platform.machine()
+    platform_dir = _TKDND_PLATFORM_DIRS.get((system, machine))
+    if platform_dir is None:
+        raise RuntimeError(f"この環境用の tkdnd がありません: {system} {machine}")
+    library_dir = os.path.join(package_dir, "tkdnd", platform_dir)
+    if int(tcl_version.split(".")[0]) >= 9 and os.path.isdir(library_dir + "-tcl9"):
+        return library_dir + "-tcl9"
+    return library_dir
+
+
+def startup_report() -> str:
+    """
+    記録された起動イベントを表形式の文字列にする
+    """
+    lines = [f"{'経過(ms)':>10} {'所要(ms)':>10}  イベント"]
+    with _startup_lock:
+        events = list(_startup_events)
+    for label, elapsed, duration in events:
+        lines.append(f"{elapsed * 1000:10.1f} {duration * 1000:10.1f}  {label}")
+    return "\n".join(lines)
+
+# --- 処理時間のトレース ---
+class Tracer:
     """
+    主な処理の所要時間を span として記録するトレーサー
+
+    有効な場合は直近 capacity 件の span をリングバッファ (deque) に保持し、
+    Chrome のトレース形式 (chrome://tracing や Perfetto で開ける JSON) と、
+    処理ごとの p50 / p95 の要約を書き出せる。
+    無効な場合、traced で包んだ関数は enabled を1回確認するだけで元の関数を呼ぶ
+    """
+    CAPACITY = 20000
+
     def __init__(self):
+        self.enabled = False
+        # (名前, 開始 ns, 所要 ns, スレッド ID, 引数 or None)
+        self._spans = deque(maxlen=self.CAPACITY)
+        self._thread_names = {}
+
+    def enable(self, capacity: int | None = None):
+        if capacity is not None:
+            self._spans = deque(self._spans, maxlen=capacity)
+        self.enabled = True
+
+    def span(self, name: str, **args):
+        """
+        with tracer.span("名前"): ... の範囲を記録する (無効なら何もしない)
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, args or None)
+
+    def traced(self, name: str):
+        """
+        関数の呼び出しを span として記録するデコレーター
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                start = time.perf_counter_ns()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self._record(name, start, time.perf_counter_ns() - start, None)
+            return wrapper
+        return decorator
+
+    def _record(self, name: str, start: int, duration: int, args):
+        thread = threading.current_thread()
+        self._thread_names.setdefault(thread.ident, thread.name)
+        # deque への追加はスレッドセーフ (古いものから自動で捨てられる)
+        self._spans.append((name, start, duration, thread.ident, args))
+
+    def spans(self) -> list:
+        return list(self._spans)
+
+    def chrome_trace(self) -> dict:
+        """
+        Chrome のトレース形式 (Trace Event Format) の辞書
+        """
+        origin = int(_STARTUP_T0 * 1e9)
+        pid = os.getpid()
+        events = [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+            for tid, name in list(self._thread_names.items())
+        ]
+        for name, start, duration, tid, args in self.spans():
+            event = {
+                "name": name, "cat": name.split(".", 1)[0], "ph": "X", "pid": pid, "tid": tid,
+                "ts": (start - origin) / 1000, "dur": duration / 1000
+            }
+            if args:
+                event["args"] = args
+            events.append(event)
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def summary(self) -> str:
+        """
+        処理ごとの回数と所要時間 (p50 / p95 / 最大) の表
+        """
+        durations = {}
+        for name, _, duration, _, _ in self.spans():
+            durations.setdefault(name, []).append(duration / 1e6)
+        lines = [f"{'処理':<20} {'回数':>6} {'p50(ms)':>9} {'p95(ms)':>9} {'最大(ms)':>9}"]
+        for name in sorted(durations):
+            values = sorted(durations[name])
+            lines.append(
+                f"{name:<20} {len(values):>6} {_percentile(values, 50):9.2f} "
+                f"{_percentile(values, 95):9.2f} {values[-1]:9.2f}"
+            )
+        return "\n".join(lines)
+
+    def export(self, trace_path: str, summary_path: str | None = None):
+        """
+        トレースを JSON で、要約をテキストで書き出す
+        """
+        with open(trace_path, 'w', encoding='utf-8') as f:
+            json.dump(self.chrome_trace(), f, ensure_ascii=False)
+        if summary_path is not None:
+            with open(summary_path, 'w', encoding='utf-8') as f:
+                f.write(self.summary() + "\n")
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "args", "start")
+
+    def __init__(self, tracer: Tracer, name: str, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.tracer._record(self.name, self.start, time.perf_counter_ns() - self.start, self.args)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def _percentile(sorted_values: list, percent: float) -> float:
+    """
+    昇順のリストの百分位数 (最近傍順位法)
+    """
+    rank = max(1, math.ceil(len(sorted_values) * percent / 100))
+    return sorted_values[rank - 1]
+
+
+def env_flag(name: str) -> bool:
+    """
+    環境変数を真偽値として読む (未設定、空、"0"、"false" は無効)
+    """
+    return os.environ.get(name, "").strip().lower() not in ("", "0", "false")
+
+
+# 環境変数 LAUNCHER_TRACE=1 または --trace で有効になる
+tracer = Tracer()
+if env_flag("LAUNCHER_TRACE"):
+    tracer.enable()
+
+# 起動履歴から作られる仮想カテゴリ (config.json には保存されない)
+RECENT_CATEGORY = object()
+RECENT_CATEGORY_TITLE = "最近使ったアプリ"
+
+class AppLauncher(tk.Tk):
+    """
+    設定ファイルに基づいてアプリケーションをカテゴリ別に表示するランチャー
+    """
+    # アイコン抽出に使うワーカースレッド数
+    ICON_WORKERS = 4
+    # ワーカーからの結果を受け取るキューの確認間隔(ms)と1回あたりの処理件数
+    UI_POLL_MS = 30
+    UI_POLL_BATCH = 64
+    # 再利用のために保持しておくアプリボタンの上限
+    BUTTON_POOL_SIZE = 256
+    # これより多くのアプリを持つカテゴリは仮想化リストで表示する
+    VIRTUAL_LIST_THRESHOLD = 50
+    # 「最近使ったアプリ」に表示する件数
+    RECENT_LIMIT = 15
+    # アイコンの大きさの候補。画面の拡大率に合わせて BASE_ICON_SIZE に近いものを選ぶ
+    ICON_SIZES = (16, 24, 32, 48, 64)
+    BASE_ICON_SIZE = 32
+    # 作成済みの Tk 画像を保持するメモリの上限 (32x32 で約4000件)
+    ICON_CACHE_BYTES = 16 * 1024 * 1024
+    # フォルダのカテゴリを表示したとき、前回の走査からこの秒数が経っていれば走査し直す
+    FOLDER_RESCAN_SECONDS = 10
+
+    def __init__(self, startup_report_enabled: bool = False, resident: bool = False,
+                 data_dir: str | None = None, icon_backend=None, spawn=subprocess.Popen):
+        """
+        data_dir を指定すると config.json やキャッシュをそのフォルダに置く
+        icon_backend と spawn は、ベンチマークなどで Windows API やプロセスの起動を
+        使わない代替に差し替えるためのもの
+        """
         super().__init__()
+        record_startup_event("Tk 初期化")
         self.title("アプリランチャー")
+        self.startup_report_enabled = startup_report_enabled
+        # 常駐モードでは閉じるボタンでウィンドウを隠すだけにし、次回の表示を即座に行う
+        self.resident = resident
+        self.data_dir = data_dir
 
         # 永続的な設定ファイルのパスを取得し、設定を読み込む
         self.config_path = self._get_persistent_config_path("config.json")
+        # 書き込みはアトミックに行い、連続した保存はまとめてバックグラウンドで書き出す
+        self.config_store = ConfigStore(
+            self.config_path,
+            on_error=lambda error: self.post_to_ui(self._on_config_save_error, error),
+            # フォルダのカテゴリは、変更のあったフォルダだけを列挙し直す
+            folder_index=FolderIndex(self._get_persistent_config_path("folder_index.json")),
+            snapshot=StartupSnapshot(self._get_persistent_config_path("config.snapshot"))
+        )
+        self._folder_scans = set()
+        self._ui_queue = queue.Queue()
         self.config = self._load_or_create_config()
+        record_startup_event("設定の読み込み")
 
         # 設定の読み込みに失敗した場合は終了
         if not self.config:
@@ -45,34 +320,260 @@ class AppLauncher(TkinterDnD.Tk):
         # ウィンドウサイズをコンパクトに変更
         self.geometry("420x400")
 
-        # アイコンをキャッシュするための辞書
-        self.icon_cache = {}
+        # 作成済みの Tk 画像 ((解決済みパス, サイズ) -> PhotoImage) の LRU キャッシュ
+        self.icon_cache = IconImageCache(self.ICON_CACHE_BYTES)
+        self.icon_size = self._pick_icon_size()
+        # 描画済みアイコンをディスクに永続化し、次回起動時の抽出処理を省く
+        # 設定のパス -> 実行ファイルの解決結果 (アイコン、起動、入力チェックで共有する)
+        self.path_resolver = PathResolver()
+        if icon_backend is None:
+            icon_backend = default_icon_backend(self._get_persistent_config_path("icon_index.json"), self.path_resolver)
+        self.icon_backend = icon_backend
+        self.icon_store = IconStore(self._get_persistent_config_path("icon_cache.bin"), self.icon_backend)
+        # 設定上のパス -> 解決済みパス (メインスレッドからのみ参照)
+        # PATH が変わって path_resolver の世代が進んだら破棄する
+        self._icon_paths = {}
+        self._icon_paths_generation = 0
+        # 前回の終了時のスナップショットが有効なら、パスの解決結果を引き継ぐ
+        self.config_store.snapshot.seed(self.path_resolver, self._icon_paths)
+
+        # アイコンはワーカースレッドで抽出し、結果はキュー経由でメインスレッドに戻す
+        self._icon_executor = ThreadPoolExecutor(max_workers=self.ICON_WORKERS, thread_name_prefix="icon")
+        self._icon_generation = 0
+        self._pending_icons = set()
+        # 読み込みが終わり、Tk 画像の作成を待っているアイコン (アイドル時にまとめて作成する)
+        self._icon_batch = []
+        self._icon_batch_scheduled = False
+        # 読み込み中に表示する透明なアイコン (ボタンの大きさを揃えるため)
+        self.placeholder_icon = tk.PhotoImage(width=self.icon_size[0], height=self.icon_size[1])
+        self._icons_enabled = True
+        self._reported_missing = set()
+        # 登録されたパスの検査 (見つからないアプリは一覧で赤く表示する)
+        self.health = PathHealthChecker(
+            self.path_resolver,
+            on_results=lambda results: self.post_to_ui(self._on_health_results, results)
+        )
+        # tkinterdnd2 はドラッグ&ドロップを初めて使うときに読み込む
+        self._dnd_files = None
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
+        self.after(self.UI_POLL_MS, self._process_ui_queue)
+
+        # 起動履歴 (SQLite) と frecency のスコア。読み込みはバックグラウンドで行う
+        self.usage = UsageStore(
+            self._get_persistent_config_path("usage.db"),
+            on_loaded=lambda: self.post_to_ui(self._invalidate_recent)
+        )
+        self.recent_pane = None
+
+        # 起動したアプリのプロセスを追跡し、終了したものを回収する
+        self.launcher = LaunchSupervisor(spawn=spawn)
+
+        # 全カテゴリを横断して検索するための索引
+        # 起動を遅らせないよう、最初の表示の後にバックグラウンドで作成する
+        self.search_index = None
+        self.search_results = []
+        self._search_index_building = False
+        # 設定やフォルダの中身が変わるたびに増やす (作成中に変わった索引は作り直す)
+        self._search_index_version = 0
+        # 索引ができたときに実行する処理 (作成中に届いた --launch など)
+        self._on_search_index_ready = []
 
         self.settings_win = None
         # モダンなウィジェットスタイルを適用
         self.style = ttk.Style(self)
-        self.style.theme_use("vista")
+        if "vista" in self.style.theme_names():
+            self.style.theme_use("vista")
+        self.style.configure("Broken.TButton", foreground="#c0392b")
 
         self._create_widgets()
+        record_startup_event("ウィジェットの作成")
+
+        # 外部のスクリプトや同期フォルダによる config.json の変更を監視し、差分だけを反映する
+        self.config_watcher = ConfigWatcher(
+            self.config_path,
+            on_change=lambda config: self.post_to_ui(self._on_external_config_change, config),
+            own_signature=lambda: self.config_store.last_written_signature,
+            load=self.config_store.load
+        )
+        self.config_watcher.start()
 
-        # 最初のカテゴリのアプリを表示
-        if self.config:
+        # 先にカテゴリ一覧を描画し、最初のカテゴリのアプリはその後で表示する
+        self.update_idletasks()
+        record_startup_event("カテゴリ一覧の描画")
+        self.after_idle(self._show_initial_category)
+
+    def _show_initial_category(self):
+        """
+        最初のカテゴリのアプリを表示する
+        """
+        if self.config and self.current_category is None:
             first_category = next(iter(self.config))
             self.show_apps_for_category(first_category)
+        record_startup_event("最初のカテゴリの表示")
+        if self.startup_report_enabled:
+            self._write_startup_report()
+        self.after_idle(self._register_drop_targets)
+        self.after_idle(self._check_all_paths)
+        self.after_idle(self._request_search_index)
+
+    def _check_all_paths(self):
+        """
+        読み込み済みの全カテゴリのパスの検査を依頼する (結果の期限が切れていないものは除く)
+        """
+        for apps in loaded_categories(self.config):
+            self.health.check(apps)
+
+    def _on_health_results(self, results: dict):
+        """
+        [メインスレッド] パスの検査結果を、表示中のボタンと設定画面に反映する
+        """
+        if self.current_pane is not None:
+            for button in self.current_pane.icon_targets():
+                if button.app_path in results:
+                    self._mark_health(button)
+        if self.settings_win and self.settings_win.winfo_exists():
+            self.settings_win.on_health_results(results)
+
+    def _mark_health(self, button):
+        """
+        起動できないパスのボタンを赤く表示する
+        """
+        style = "Broken.TButton" if self.health.problem(button.app_path) else ""
+        if str(button.cget("style")) != style:
+            button.configure(style=style)
+
+    def _on_row_bound(self, button, path: str):
+        """
+        仮想化リストの行にアプリが割り当てられたときに、検査結果とアイコンを反映する
+        """
+        self._mark_health(button)
+        self._request_icon(button, path)
+
+    def _on_row_released(self, button):
+        """
+        仮想化リストの行が表示範囲から外れたときに、その行のアイコンの読み込みを取り消す
+        """
+        future = getattr(button, "icon_future", None)
+        if future is not None:
+            future.cancel()
+            button.icon_future = None
+
+    def _write_snapshot(self):
+        """
+        次回の起動用に、設定の解析結果とパスの解決結果を保存する (設定の保存後に呼ぶ)
+        """
+        self.config_store.snapshot.write(self.config_path, self.path_resolver, self._icon_paths)
+
+    def _write_trace(self):
+        """
+        トレースを trace.json (Chrome のトレース形式) と trace_summary.txt に書き出す
+        """
+        try:
+            tracer.export(
+                self._get_persistent_config_path("trace.json"),
+                self._get_persistent_config_path("trace_summary.txt")
+            )
+        except OSError:
+            pass
+
+    def _write_startup_report(self):
+        """
+        起動時間のレポートを標準エラー出力と startup_report.txt に書き出す
+        """
+        report = startup_report() + "\n\n" + self.icon_cache.describe()
+        if sys.stderr is not None:
+            print(report, file=sys.stderr)
+        try:
+            with open(self._get_persistent_config_path("startup_report.txt"), 'w', encoding='utf-8') as f:
+                f.write(report + "\n")
+        except OSError:
+            pass
+
+    def _report_missing_library(self, package: str, purpose: str):
+        """
+        ライブラリが見つからないことを一度だけ通知する
+        """
+        if package in self._reported_missing:
+            return
+        self._reported_missing.add(package)
+        messagebox.showwarning(
+            "ライブラリ不足",
+            f"{purpose}には {package} が必要です。\n'pip install {package}' を実行してください。",
+            parent=self
+        )
+
+    def enable_drag_and_drop(self, report: bool = True):
+        """
+        tkinterdnd2 を読み込んで Tk に tkdnd を登録し、DND_FILES を返す
+        (TkinterDnD.Tk と同じく、同梱の tkdnd を auto_path に加えて package require する)
+        利用できない場合は None を返す (report が False なら通知もしない)
+        """
+        if self._dnd_files is None:
+            try:
+                # 読み込むとウィジェットに drop_target_register などが加わる
+                dnd = lazy_import("tkinterdnd2")
+                library_dir = tkdnd_library_dir(os.path.dirname(dnd.__file__), self.tk.call("info", "tclversion"))
+                self.tk.call("lappend", "auto_path", library_dir)
+                self.tk.call("package", "require", "tkdnd")
+                self._dnd_files = dnd.DND_FILES
+            except ImportError:
+                if report:
+                    self._report_missing_library("tkinterdnd2", "ドラッグ&ドロップ")
+            except (RuntimeError, tk.TclError) as e:
+                if report:
+                    messagebox.showerror("エラー", f"ドラッグ&ドロップを初期化できませんでした:\n{e}", parent=self)
+        return self._dnd_files
+
+    def _register_drop_targets(self):
+        """
+        ファイルやフォルダをドロップしてアプリを登録できるようにする
+        tkinterdnd2 の読み込みは最初の表示の後に行い、ない場合は何もしない
+        """
+        dnd_files = self.enable_drag_and_drop(report=False)
+        if dnd_files is None:
+            return
+        # ボタンなどの子ウィジェットへのドロップも、登録した親のフレームが受け取る
+        for widget in (self.category_frame, self.app_frame):
+            widget.drop_target_register(dnd_files)
+            widget.dnd_bind("<<Drop>>", self._on_drop_files)
+
+    def _on_drop_files(self, event):
+        """
+        ドロップされたファイルとフォルダからアプリを探し、プレビューを表示する
+        """
+        paths = list(self.tk.splitlist(event.data))
+        if self.settings_win and self.settings_win.winfo_exists():
+            # 設定画面の編集中は、設定画面に追加する
+            self.settings_win.import_paths(paths)
+            return event.action
+        # フォルダのカテゴリの中身はフォルダから作られるため、追加先にはしない
+        categories = [name for name in self.config if not is_folder_category(self.config, name)]
+        category = self.current_category if self.current_category in categories else next(iter(categories), "")
+        ImportPreviewDialog(self, paths, categories, category, self.post_to_ui, self._import_apps)
+        return event.action
+
+    def _import_apps(self, category: str, apps: list):
+        """
+        プレビューで選ばれたアプリをカテゴリの末尾に追加して保存する (登録済みのパスは除く)
+        """
+        editor = ConfigEditor(self.config)
+        for op in import_ops(editor, category, apps):
+            editor.apply(op)
+        if not editor.modified:
+            return
+        new_config = editor.build()
+        self.config_store.schedule_save(new_config)
+        self.reload_ui(new_config)
+        self.show_apps_for_category(category)
 
     def _get_persistent_config_path(self, filename: str) -> str:
         """
         永続的な設定ファイルのパスを取得する。
         .exeの場合は実行ファイルと同じディレクトリ、開発環境ではスクリプトと同じディレクトリ。
         """
-        # PyInstallerによって作成された実行可能ファイルから実行されているかチェック
-        if getattr(sys, 'frozen', False) and hasattr(sys, '_MEIPASS'):
-            # .exeのパスを取得
-            app_path = os.path.dirname(sys.executable)
-        else:
-            # スクリプトとして実行されている場合は、スクリプトのディレクトリ
-            app_path = os.path.dirname(os.path.abspath(__file__))
-        return os.path.join(app_path, filename)
+        if self.data_dir is not None:
+            return os.path.join(self.data_dir, filename)
+        return persistent_path(filename)
 
     def _load_or_create_config(self) -> dict:
         """
@@ -92,64 +593,266 @@ class AppLauncher(TkinterDnD.Tk):
                 return {}
 
         # 永続的な設定ファイルを読み込む
-        return self._load_config(self.config_path)
+        return self._load_config()
 
-    def _get_icon(self, path: str, size=(32, 32)):
+    def _pick_icon_size(self):
         """
-        指定されたパスからアイコンを取得し、Tkinterで使える形式に変換
-        取得したアイコンはキャッシュされ、リソースは適切に解放
+        画面の拡大率 (tk scaling) に合わせたアイコンの大きさ
         """
         try:
-            full_path = win32api.SearchPath(None, path, ".exe")[0]
-        except Exception:
-            full_path = path
+            # tk scaling は1ポイントあたりのピクセル数 (96 DPI で 96/72)
+            scale = float(self.tk.call("tk", "scaling")) / (96 / 72)
+        except (tk.TclError, ValueError):
+            scale = 1.0
+        target = self.BASE_ICON_SIZE * scale
+        side = min(self.ICON_SIZES, key=lambda candidate: abs(candidate - target))
+        return (side, side)
+
+    @tracer.traced("icon.load")
+    def _load_icon_pixels(self, path: str, size):
+        """
+        [ワーカースレッド] パスを解決し、アイコンの RGBA ピクセルを取得する
+        実行ファイルごとに ICON_MASTER_SIZE で1枚だけ描画してディスクキャッシュ(IconStore)に保持し、
+        要求されたサイズはそこから縮小して作る。変更された実行ファイルのみ再抽出する
+        """
+        full_path = self.icon_backend.resolve(path)
+        master = self.icon_store.get(full_path, ICON_MASTER_SIZE)
+        if master and tuple(size) != ICON_MASTER_SIZE:
+            return full_path, scale_icon_pixels(master, ICON_MASTER_SIZE, size)
+        return full_path, master
+
+    def _request_icon(self, button, path: str, size=None):
+        """
+        ボタンのアイコンを非同期に読み込む
+        メモリ上にあれば即座に設定し、なければプレースホルダーを表示してワーカーに依頼する
+        """
+        size = tuple(size) if size is not None else self.icon_size
+        # 行が別のアプリに割り当て直された場合は、前のアプリの読み込みを取り消す
+        self._on_row_released(button)
+        if not self._icons_enabled:
+            button.icon_pending = False
+            return
 
-        if full_path in self.icon_cache:
-            return self.icon_cache[full_path]
+        generation = self.path_resolver.refresh()
+        if generation != self._icon_paths_generation:
+            self._icon_paths.clear()
+            self._icon_paths_generation = generation
+        full_path = self._icon_paths.get(path)
+        icon = self.icon_cache.get((full_path, size)) if full_path else None
+        if icon is not None:
+            self._set_button_icon(button, icon)
+            button.icon_pending = False
+            return
 
-        large, small = [], []
-        hdc, hdc_mem, hbmp = 0, 0, 0
+        self._set_button_icon(button, self.placeholder_icon)
+        button.icon_pending = True
+        generation = self._icon_generation
+        future = self._icon_executor.submit(self._load_icon_pixels, path, size)
+        future.add_done_callback(
+            lambda f: self.post_to_ui(self._on_icon_loaded, generation, button, path, size, f)
+        )
+        self._pending_icons.add(future)
+        button.icon_future = future
+
+    @tracer.traced("icon.apply")
+    def _on_icon_loaded(self, generation, button, path: str, size, future):
+        """
+        [メインスレッド] ワーカーが取得したアイコンをボタンに設定する
+        カテゴリが切り替わった後に届いた古い結果は破棄する
+        """
+        self._pending_icons.discard(future)
+        if getattr(button, "icon_future", None) is future:
+            button.icon_future = None
+        if generation != self._icon_generation or future.cancelled():
+            return
+        error = future.exception()
+        if isinstance(error, ImportError):
+            # アイコンの抽出に必要なライブラリがない場合は、以降の読み込みをやめる
+            self._icons_enabled = False
+            package = "Pillow" if (error.name or "").startswith("PIL") else "pywin32"
+            self._report_missing_library(package, "アイコンの表示")
+            return
+        if error is not None:
+            return
+        full_path, pixels = future.result()
+        self._icon_paths[path] = full_path
+        # 仮想化リストの行は使い回されるため、別のアプリに割り当て直されていれば破棄する
+        if not button.winfo_exists() or getattr(button, "app_path", None) != path:
+            return
+
+        key = (full_path, size)
+        # 他のボタンの読み込みで作成済みの場合がある (ミスは依頼時に数えたので数えない)
+        icon = self.icon_cache.peek(key)
+        if icon is not None:
+            button.icon_pending = False
+            self._set_button_icon(button, icon)
+            return
+        if not pixels:
+            button.icon_pending = False
+            return
+        self._icon_batch.append((generation, button, path, key, pixels))
+        if not self._icon_batch_scheduled:
+            self._icon_batch_scheduled = True
+            self.after_idle(self._flush_icon_batch)
+
+    @tracer.traced("icon.batch")
+    def _flush_icon_batch(self):
+        """
+        [メインスレッド] 読み込みが終わったアイコンの Tk 画像をまとめて作成し、ボタンに設定する
+        """
+        batch, self._icon_batch = self._icon_batch, []
+        self._icon_batch_scheduled = False
         try:
-            large, small = win32gui.ExtractIconEx(full_path, 0)
-            icon_handle = large[0] if large else (small[0] if small else 0)
-            if icon_handle == 0:
-                return None
+            image_module = lazy_import("PIL.Image")
+            image_tk = lazy_import("PIL.ImageTk")
+        except ImportError:
+            self._icons_enabled = False
+            self._report_missing_library("Pillow", "アイコンの表示")
+            return
 
-            hdc = win32gui.GetDC(0)
-            hdc_mem = win32gui.CreateCompatibleDC(hdc)
-            hbmp = win32gui.CreateCompatibleBitmap(hdc, size[0], size[1])
-            win32gui.SelectObject(hdc_mem, hbmp)
-            
-            win32gui.DrawIconEx(hdc_mem, 0, 0, icon_handle, size[0], size[1], 0, 0, win32con.DI_NORMAL)
-            
-            bmp_str = win32gui.GetBitmapBits(hbmp, True)
-            img = Image.frombuffer('RGBA', size, bmp_str, 'raw', 'BGRA', 0, 1)
+        # 同じアイコンは1枚だけ作り、サイズごとに1枚のアトラスにまとめる
+        waiting = {}
+        for generation, button, path, key, pixels in batch:
+            pixels_and_buttons = waiting.setdefault(key, (pixels, []))
+            pixels_and_buttons[1].append((generation, button, path))
+        by_size = {}
+        for key in waiting:
+            if self.icon_cache.peek(key) is None:
+                by_size.setdefault(key[1], []).append(key)
+        for size, keys in by_size.items():
+            icons = self._icons_from_atlas(image_module, image_tk, size, [waiting[key][0] for key in keys])
+            for key, icon in zip(keys, icons):
+                if icon is not None:
+                    self.icon_cache.put(key, icon, len(waiting[key][0]))
+
+        for key, (_, buttons) in waiting.items():
+            icon = self.icon_cache.peek(key)
+            for generation, button, path in buttons:
+                if (generation != self._icon_generation or not button.winfo_exists()
+                        or getattr(button, "app_path", None) != path):
+                    continue
+                button.icon_pending = False
+                if icon is not None:
+                    self._set_button_icon(button, icon)
 
-            photo_image = ImageTk.PhotoImage(img.resize(size, Image.Resampling.LANCZOS))
-            self.icon_cache[full_path] = photo_image
-            return photo_image
+    def _icons_from_atlas(self, image_module, image_tk, size, pixel_list: list) -> list:
+        """
+        同じサイズのアイコンを縦に並べた1枚の画像 (アトラス) として Tk に渡し、
+        そこから各アイコンの領域を Tk の画像として切り出す (大きさが合わないものは None)
+
+        PIL から Tk への画像の転送はアトラス1枚につき1回で済み、切り出しは Tk 内のコピーだけになる。
+        Tk のボタンは画像の一部だけを表示できないため、アイコンごとの画像はアトラスから作る
+        """
+        width, height = size
+        expected = width * height * 4
+        valid = [pixels for pixels in pixel_list if len(pixels) == expected]
+        if not valid:
+            return [None] * len(pixel_list)
+        try:
+            # 幅が同じ RGBA の画像は、バイト列を連結するだけで縦に並べられる
+            strip = image_module.frombuffer('RGBA', (width, height * len(valid)), b"".join(valid), 'raw', 'RGBA', 0, 1)
+            atlas = image_tk.PhotoImage(strip, master=self)
         except Exception:
-            return None
-        finally:
-            for i in large + small:
-                if i: win32gui.DestroyIcon(i)
-            if hbmp: win32gui.DeleteObject(hbmp)
-            if hdc_mem: win32gui.DeleteDC(hdc_mem)
-            if hdc: win32gui.ReleaseDC(0, hdc)
+            return [None] * len(pixel_list)
+
+        icons = []
+        row = 0
+        for pixels in pixel_list:
+            if len(pixels) != expected:
+                icons.append(None)
+                continue
+            icon = tk.PhotoImage(master=self, width=width, height=height)
+            icon.tk.call(icon, "copy", str(atlas), "-from", 0, row * height, width, (row + 1) * height)
+            icons.append(icon)
+            row += 1
+        return icons
+
+    def _set_button_icon(self, button, icon):
+        """
+        ボタンに画像を設定する
+        """
+        button.configure(image=icon)
+        # 画像がガベージコレクションで消えないように参照を保持
+        button.image = icon
+
+    def _cancel_icon_requests(self):
+        """
+        未処理のアイコン読み込みを取り消し、処理中の結果も無効にする
+        """
+        self._icon_generation += 1
+        for future in self._pending_icons:
+            future.cancel()
+        self._pending_icons.clear()
+
+    def post_to_ui(self, callback, *args):
+        """
+        任意のスレッドから、メインスレッドで実行する処理を登録する
+        """
+        self._ui_queue.put((callback, args))
+
+    def _process_ui_queue(self):
+        """
+        ワーカースレッドから届いた処理をメインスレッドで実行する
+        1回に処理する件数を制限し、イベントループを止めないようにする
+        """
+        for _ in range(self.UI_POLL_BATCH):
+            try:
+                callback, args = self._ui_queue.get_nowait()
+            except queue.Empty:
+                break
+            callback(*args)
+        self.after(self.UI_POLL_MS, self._process_ui_queue)
 
-    def _load_config(self, config_path: str) -> dict:
+    @tracer.traced("config.load")
+    def _load_config(self) -> dict:
         """
         設定ファイルを読み込み
+        壊れている場合は最も新しいバックアップから読み込む
         """
+        config_path = self.config_store.path
         try:
-            with open(config_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            config = self.config_store.load()
+            self._report_skipped_entries()
+            return config
         except FileNotFoundError:
             messagebox.showerror("エラー", f"設定ファイルが見つかりません:\n{config_path}")
-        except json.JSONDecodeError:
-            messagebox.showerror("エラー", f"設定ファイル '{config_path}' の形式が正しくありません。")
+        except ValueError as e:
+            # JSON として読めない (JSONDecodeError) か、設定の形式に合わない (ConfigSchemaError)
+            backup = self.config_store.load_latest_backup()
+            if backup is not None:
+                backup_path, config = backup
+                messagebox.showwarning(
+                    "設定ファイル",
+                    f"設定ファイル '{config_path}' の形式が正しくないため、バックアップから読み込みました:\n{backup_path}"
+                )
+                self._report_skipped_entries()
+                return config
+            messagebox.showerror("エラー", f"設定ファイル '{config_path}' の形式が正しくありません。\n{e}")
         return {}
 
+    def _report_skipped_entries(self):
+        """
+        設定の読み込みで読み飛ばした、形式の正しくないアプリの項目を通知する
+        """
+        skipped, self.config_store.skipped_entries = self.config_store.skipped_entries, []
+        if not skipped:
+            return
+        lines = skipped[:10]
+        if len(skipped) > 10:
+            lines.append(f"ほか {len(skipped) - 10} 件")
+        messagebox.showwarning(
+            "設定ファイル",
+            "形式の正しくないアプリの項目を読み飛ばしました (設定を保存すると config.json から削除されます):\n"
+            + "\n".join(lines),
+            parent=self
+        )
+
+    def _on_config_save_error(self, error):
+        """
+        [メインスレッド] バックグラウンドでの設定の保存に失敗したことを通知する
+        """
+        messagebox.showerror("保存エラー", f"設定の保存に失敗しました:\n{error}", parent=self)
+
     def _create_widgets(self):
         """
         GUIウィジェットを作成して配置
@@ -158,77 +861,381 @@ class AppLauncher(TkinterDnD.Tk):
         main_frame = ttk.Frame(self, padding="10")
         main_frame.pack(fill=tk.BOTH, expand=True)
 
+        # 上部の検索ボックス (入力するたびに全カテゴリから検索し、Enterで先頭を起動)
+        self.search_var = tk.StringVar()
+        self.search_var.trace_add("write", lambda *args: self._on_search_changed())
+        search_entry = ttk.Entry(main_frame, textvariable=self.search_var)
+        search_entry.pack(side=tk.TOP, fill=tk.X, pady=(0, 10))
+        search_entry.bind("<Return>", self._launch_top_search_hit)
+        search_entry.bind("<Escape>", lambda e: self.search_var.set(""))
+        # 索引はフォーカスを得た時点で作成しておき、最初の1文字目を待たせない
+        search_entry.bind("<FocusIn>", lambda e: self._request_search_index())
+        self.search_entry = search_entry
+
         # 左側のカテゴリフレーム
         category_frame = ttk.Frame(main_frame)
         category_frame.pack(side=tk.LEFT, fill=tk.Y, padx=(0, 10))
+        self.category_frame = category_frame
 
         # 右側のアプリケーション表示フレーム
         self.app_frame = ttk.Frame(main_frame)
         self.app_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True)
 
-        # カテゴリボタンの作成
-        for category in self.config.keys():
-            button = ttk.Button(
-                category_frame,
-                text=category,
-                command=lambda c=category: self.show_apps_for_category(c)
-            )
-            button.pack(fill=tk.X, pady=4, ipady=4)
+        # カテゴリごとのペインと、再利用するアプリボタン
+        # ボタンは app_frame の子として作成し、pack(in_=ペイン) で配置するため
+        # 別のカテゴリのペインにもそのまま付け替えられる
+        self.category_panes = {}
+        self.current_pane = None
+        self.current_category = None
+        self.search_pane = None
+        self._button_pool = []
 
         # --- 設定ボタンを左下に追加 ---
         # ttk.Frameをスペーサーとして使い、ボタンを左下に配置
         spacer = ttk.Frame(category_frame)
         spacer.pack(side=tk.BOTTOM, fill=tk.Y, expand=True)
-        
+        self.category_spacer = spacer
+
+        # 起動履歴から作られる「最近使ったアプリ」を先頭に置く
+        recent_button = ttk.Button(
+            category_frame,
+            text=RECENT_CATEGORY_TITLE,
+            command=lambda: self.select_category(RECENT_CATEGORY)
+        )
+        recent_button.pack(fill=tk.X, pady=4, ipady=4)
+        ttk.Separator(category_frame, orient=tk.HORIZONTAL).pack(fill=tk.X, pady=4)
+
+        # カテゴリボタンの作成
+        self.category_buttons = {}
+        for category in self.config.keys():
+            self._create_category_button(category)
+
         settings_button = ttk.Button(
             category_frame, text="設定の編集", command=self.open_settings_window
         )
         settings_button.pack(side=tk.BOTTOM, fill=tk.X, pady=5)
 
+    def _create_category_button(self, category: str):
+        """
+        カテゴリボタンを作成し、スペーサーの手前(リストの末尾)に配置する
+        """
+        button = ttk.Button(
+            self.category_frame,
+            text=category,
+            command=lambda c=category: self.select_category(c)
+        )
+        button.pack(fill=tk.X, pady=4, ipady=4, before=self.category_spacer)
+        self.category_buttons[category] = button
+        return button
+
+    @tracer.traced("category.show")
+    def select_category(self, category):
+        """
+        カテゴリのボタンが押されたときに、検索中であれば検索を解除してカテゴリを表示する
+        (設定の再読み込みなどでカテゴリを表示し直す場合は、検索を続けるため show_apps_for_category を使う)
+        """
+        if self.search_var.get():
+            # 検索語を空にすると _on_search_changed が検索結果を破棄して選択中のカテゴリを表示するため、
+            # 表示するカテゴリを先に切り替えておく
+            self.current_category = category
+            self.search_var.set("")
+        else:
+            self.show_apps_for_category(category)
+
     def show_apps_for_category(self, category: str):
         """
         指定されたカテゴリのアプリケーションを右側のフレームに表示
+        ペインは初回表示時に作成して保持し、以降は表示の切り替えだけを行う
         """
-        # 既存のウィジェットをクリア
-        for widget in self.app_frame.winfo_children():
-            widget.destroy()
+        if category is RECENT_CATEGORY:
+            self._show_recent()
+            return
+        pane = self.category_panes.get(category)
+        if pane is None:
+            pane = self._build_category_pane(category)
+        self._show_pane(pane)
+        self.current_category = category
+        self._rescan_folder(category)
 
-        # カテゴリタイトル
-        title_label = ttk.Label(
-            self.app_frame,
-            text=category,
-            font=("Yu Gothic UI", 16, "bold")
-        )
-        title_label.pack(anchor=tk.W, pady=(0, 15))
+    def _rescan_folder(self, category: str):
+        """
+        フォルダのカテゴリであれば、バックグラウンドでフォルダを走査し直す
+        """
+        apps = self.config.get(category)
+        if not isinstance(apps, FolderApps) or category in self._folder_scans:
+            return
+        if time.monotonic() - apps.scanned_at < self.FOLDER_RESCAN_SECONDS:
+            return
+        self._folder_scans.add(category)
+        folder_index = self.config_store.folder_index
 
-        # アプリケーションボタンの作成
+        def run():
+            entries = None
+            try:
+                entries = folder_index.scan(apps.root, apps.recursive)
+                folder_index.save()
+            finally:
+                self.post_to_ui(self._on_folder_rescanned, category, apps, entries)
+
+        threading.Thread(target=run, name="folder-scan", daemon=True).start()
+
+    def _on_folder_rescanned(self, category: str, apps, entries):
+        """
+        [メインスレッド] フォルダの中身が変わっていれば、カテゴリの表示と検索の索引を更新する
+        """
+        self._folder_scans.discard(category)
+        apps.scanned_at = time.monotonic()
+        if entries is None or self.config.get(category) is not apps or entries == apps:
+            return
+        # 保存時にはフォルダの指定に戻るため、中身はその場で入れ替えてよい
+        apps[:] = entries
+        self._search_index_version += 1
+        self._release_category_pane(category)
+        if self.search_index is not None:
+            self.search_index.remove_category(category)
+            self.search_index.add_category(category, apps)
+        self._invalidate_recent()
+        self._prune_icons()
+        if self.current_category == category:
+            self.show_apps_for_category(category)
+
+    def _show_recent(self):
+        """
+        frecency の高い順にアプリを並べた「最近使ったアプリ」を表示する
+        ペインは起動や設定の変更があった後、次に表示するときだけ作り直す
+        """
+        if self.recent_pane is None:
+            # 起動履歴に残したカテゴリだけを読み込んで探す (分割された設定で全カテゴリを読み込まない)
+            loaded = None
+            by_category = {}
+            apps = []
+            for key in self.usage.top():
+                category, _ = self.usage.location(key)
+                if category is not None and category in self.config:
+                    if category not in by_category:
+                        by_category[category] = _apps_by_path([self.config[category]])
+                    app_info = by_category[category].get(key)
+                else:
+                    app_info = None
+                if app_info is None:
+                    # カテゴリが分からない、または移動された場合は読み込み済みのカテゴリから探す
+                    if loaded is None:
+                        loaded = _apps_by_path(loaded_categories(self.config))
+                    app_info = loaded.get(key)
+                if app_info is not None:
+                    apps.append(app_info)
+                    if len(apps) >= self.RECENT_LIMIT:
+                        break
+            self.recent_pane = self._build_pane(RECENT_CATEGORY_TITLE, apps)
+        self._show_pane(self.recent_pane)
+        self.current_category = RECENT_CATEGORY
+
+    def _invalidate_recent(self):
+        """
+        「最近使ったアプリ」のペインを破棄する (表示中でなければ次の表示で作り直す)
+        """
+        if self.recent_pane is not None and self.recent_pane is not self.current_pane:
+            self._release_pane(self.recent_pane)
+            self.recent_pane = None
+
+    def _build_category_pane(self, category: str):
+        """
+        カテゴリのペインを作成し、プールから取り出したボタンを配置する
+        """
+        # 分割された設定では、カテゴリのファイルはここで初めて解析される
         apps = self.config.get(category, [])
+        pane = self._build_pane(category, apps)
+        self.category_panes[category] = pane
+        error = getattr(self.config, "load_errors", {}).pop(category, None)
+        if error is not None:
+            messagebox.showwarning("設定ファイル", f"カテゴリ '{category}' を読み込めませんでした:\n{error}", parent=self)
+        return pane
+
+    @tracer.traced("pane.build")
+    def _build_pane(self, title: str, apps: list, label_of=None):
+        """
+        タイトルとアプリ一覧を持つペインを作成する
+        label_of を指定するとボタンの表示名をアプリ情報から組み立てる
+        """
+        pane = CategoryPane(self.app_frame, title)
+        pane.apps = apps
+
+        # 大きなカテゴリは表示中の行だけを作成する仮想化リストにする
+        if len(apps) > self.VIRTUAL_LIST_THRESHOLD:
+            pane.app_list = VirtualAppList(
+                pane,
+                [app_info for app_info in apps if app_info.get("path")],
+                on_launch=self.launch_app,
+                on_row_bound=self._on_row_bound,
+                on_row_released=self._on_row_released,
+                row_height=max(VirtualAppList.ROW_HEIGHT, self.icon_size[1] + 8)
+            )
+            pane.app_list.pack(fill=tk.BOTH, expand=True)
+            return pane
+
+        # アプリケーションボタンの作成
         for app_info in apps:
-            app_name = app_info.get("name", "名称未設定")
+            app_name = label_of(app_info) if label_of else app_label(app_info)
             app_path = app_info.get("path")
 
             if app_path:
-                # アイコンを取得
-                icon = self._get_icon(app_path)
-
-                app_button = ttk.Button(
-                    self.app_frame,
+                app_button = self._acquire_app_button()
+                app_button.configure(
                     text=app_name,
-                    image=icon,
-                    compound=tk.LEFT, # テキストの左側に画像を表示
-                    command=lambda p=app_path: self.launch_app(p)
+                    command=lambda p=app_path, sh=bool(app_info.get("shell")): self.launch_app(p, sh)
                 )
-                app_button.pack(anchor=tk.W, pady=3, ipady=2, fill=tk.X)
+                app_button.app_path = app_path
+                app_button.icon_pending = True
+                app_button.pack(in_=pane, anchor=tk.W, pady=3, ipady=2, fill=tk.X)
+                # 再利用したボタンがペインの背後に隠れないよう、重なり順を上げる
+                app_button.lift(pane)
+                pane.buttons.append(app_button)
 
-                # 画像がガベージコレクションで消えないように参照を保持
-                if icon:
-                    app_button.image = icon
+        return pane
 
-    def launch_app(self, path: str):
+    def _show_pane(self, pane):
         """
-        アプリケーションを起動。
+        右側に表示するペインを切り替え、未読み込みのアイコンを依頼する
+        """
+        # 前のペインのアイコン読み込みを取り消す
+        self._cancel_icon_requests()
+
+        if pane is not self.current_pane:
+            if self.current_pane is not None:
+                self.current_pane.pack_forget()
+            pane.pack(fill=tk.BOTH, expand=True)
+            self.current_pane = pane
+
+        # 表示するたびに、期限が切れた検査結果を検査し直す (期限内のものは依頼されない)
+        self.health.check(pane.apps)
+
+        # 前回の表示中に読み込みが終わらなかったアイコンを再度依頼する
+        for button in pane.icon_targets():
+            self._mark_health(button)
+            if button.icon_pending:
+                self._request_icon(button, button.app_path)
+
+    def _acquire_app_button(self):
+        """
+        プールからアプリボタンを取り出す。空なら新しく作成する
+        """
+        if self._button_pool:
+            return self._button_pool.pop()
+        return ttk.Button(self.app_frame, compound=tk.LEFT) # テキストの左側に画像を表示
+
+    def _release_category_pane(self, category: str):
+        """
+        カテゴリのペインを破棄し、ボタンはプールに戻す
+        """
+        pane = self.category_panes.pop(category, None)
+        if pane is not None:
+            self._release_pane(pane)
+
+    def _release_pane(self, pane):
+        """
+        ペインを破棄し、ボタンはプールに戻す
+        """
+        if pane is self.current_pane:
+            self.current_pane = None
+
+        for button in pane.buttons:
+            button.pack_forget()
+            if len(self._button_pool) < self.BUTTON_POOL_SIZE:
+                button.configure(text="", image="", command="")
+                button.image = None
+                self._button_pool.append(button)
+            else:
+                button.destroy()
+        pane.destroy()
+
+    @tracer.traced("search")
+    def _on_search_changed(self):
+        """
+        検索語が変わるたびに索引を引き、結果をペインに表示する
+        検索語が空になったら選択中のカテゴリの表示に戻る
+        """
+        query = self.search_var.get()
+        self.search_results = []
+
+        if self.search_pane is not None:
+            self._release_pane(self.search_pane)
+            self.search_pane = None
+
+        if not query.strip():
+            if self.current_category is not None:
+                self.show_apps_for_category(self.current_category)
+            return
+
+        if self.search_index is None:
+            # 索引ができたら _on_search_index_built がもう一度検索する
+            self._request_search_index()
+            title = "検索の準備中..."
+        else:
+            self.search_results = self.search_index.search(query)
+            title = f"検索結果: {len(self.search_results)} 件" if self.search_results else "該当なし"
+        self.search_pane = self._build_pane(
+            title,
+            self.search_results,
+            label_of=lambda app: f"{app['name']}  ({app['category']})"
+        )
+        self._show_pane(self.search_pane)
+
+    def _request_search_index(self, callback=None):
+        """
+        検索用の索引がなければ、現在の設定からバックグラウンドで作成する
+        callback を渡すと、索引ができた時点で (既にあればすぐに) メインスレッドで呼ぶ
+        """
+        if self.search_index is not None:
+            if callback is not None:
+                callback()
+            return
+        if callback is not None:
+            self._on_search_index_ready.append(callback)
+        if self._search_index_building:
+            return
+        self._search_index_building = True
+        config, version = self.config, self._search_index_version
+
+        def run():
+            index = SearchIndex()
+            try:
+                index.rebuild(config)
+            finally:
+                self.post_to_ui(self._on_search_index_built, index, version)
+
+        threading.Thread(target=run, name="search-index", daemon=True).start()
+
+    def _on_search_index_built(self, index, version: int):
+        """
+        [メインスレッド] 作成した索引を使い始め、入力済みの検索語で検索し直す
+        作成中に設定が変わっていれば、新しい設定で作り直す
+        """
+        self._search_index_building = False
+        if version != self._search_index_version:
+            self._request_search_index()
+            return
+        self.search_index = index
+        callbacks, self._on_search_index_ready = self._on_search_index_ready, []
+        for callback in callbacks:
+            callback()
+        if self.search_var.get().strip():
+            self._on_search_changed()
+
+    def _launch_top_search_hit(self, event=None):
+        """
+        検索結果の先頭のアプリを起動する
+        """
+        if self.search_results:
+            top = self.search_results[0]
+            self.launch_app(top["path"], top["shell"])
+
+    @tracer.traced("app.launch")
+    def launch_app(self, path: str, use_shell: bool = False):
+        """
+        アプリケーションを起動。
         指定されたパスが存在しない場合は警告を表示し、
         管理者権限が必要な場合は昇格を試みる。
+        use_shell が True (設定の "shell": true) の場合のみシェル経由で実行する。
         """
         executable = ""
         params = ""
@@ -237,18 +1244,33 @@ class AppLauncher(TkinterDnD.Tk):
                 messagebox.showwarning("起動エラー", "アプリケーションのパスが設定されていません。", parent=self)
                 return
 
-            # shlex.splitでパスと引数を安全に分割する
+            # パスと引数を安全に分割する
             # 例: '"C:\\...\\Rgui.exe" --arg' -> ['C:\\...\\Rgui.exe', '--arg']
-            args = shlex.split(path)
+            # 分割と PATH の検索の結果は path_resolver が保持している
+            args, resolved = self.path_resolver.resolve_command(path)
             if not args:
                 raise FileNotFoundError(f"無効なパスです: {path}")
             executable = args[0]
-            params = ' '.join(args[1:])
+            params = subprocess.list2cmdline(args[1:])
 
-            # subprocess.Popenで非同期にプロセスを起動する
-            # shell=Trueにすることで、Windowsのシェルがパスの解釈を行うため、
-            # スペースを含むパスや引用符の有無などを柔軟に扱えるようになる。
-            subprocess.Popen(path, shell=True)
+            if use_shell:
+                # 設定でシェルのコマンドとして明示されたものだけ、シェル経由で実行する
+                with tracer.span("launch.spawn", mode="shell"):
+                    self.launcher.spawn(path, path, shell=True)
+            elif os.name != "nt" and executable.lower().endswith(".desktop"):
+                # .desktop ファイルは中に書かれたコマンドで起動する (実行属性があっても直接は実行できない)
+                with tracer.span("launch.spawn", mode="desktop"):
+                    self.launcher.open_desktop_entry(path, executable, args[1:])
+            elif is_shell_document(executable):
+                # ショートカットやフォルダなど、実行ファイルではないものは関連付けで開く
+                with tracer.span("launch.spawn", mode="document"):
+                    self.launcher.open_document(path, executable, args[1:])
+            else:
+                # 分割した引数でプロセスを直接起動する (cmd.exe を経由しない)
+                # 解決済みの実行ファイルを渡し、起動のたびに PATH を探させない
+                with tracer.span("launch.spawn", mode="process"):
+                    self.launcher.spawn(path, [resolved] + args[1:] if resolved else args)
+            self._record_launch(path)
         except FileNotFoundError:
             # executableが設定されていればそれを使う、なければ元のパスを使う
             exe_path_to_show = executable if executable else path
@@ -263,6 +1285,13 @@ class AppLauncher(TkinterDnD.Tk):
                     f"'{os.path.basename(executable)}' の起動には管理者権限が必要な可能性があります。\n\n管理者として実行しますか？", # executableはここで定義されているはず
                     parent=self
                 ):
+                    try:
+                        # Windowsの管理者権限でアプリを起動するためのライブラリ
+                        shell = lazy_import("win32com.shell.shell")
+                        win32con = lazy_import("win32con")
+                    except ImportError:
+                        self._report_missing_library("pywin32", "管理者としての起動")
+                        return
                     try:
                         shell.ShellExecuteEx(
                             lpVerb='runas',
@@ -270,6 +1299,7 @@ class AppLauncher(TkinterDnD.Tk):
                             lpParameters=params,
                             nShow=win32con.SW_SHOWNORMAL
                         )
+                        self._record_launch(path)
                     except Exception as shell_e:
                         # UACダイアログで「いいえ」を選択した場合(エラーコード1223)はユーザーによるキャンセルなので無視
                         if not (hasattr(shell_e, 'winerror') and shell_e.winerror == 1223):
@@ -284,6 +1314,28 @@ class AppLauncher(TkinterDnD.Tk):
         except Exception as e:
             messagebox.showerror("起動エラー", f"予期せぬエラーが発生しました:\n{path}\n\nエラー: {e}", parent=self)
 
+    def _record_launch(self, path: str):
+        """
+        起動履歴に記録する (書き込みはバックグラウンドでまとめて行われる)
+        カテゴリ名とアプリ名も残し、次回はそのカテゴリだけを読み込んで探せるようにする
+        """
+        self.usage.record(path, *self._locate_app(path))
+        self._invalidate_recent()
+
+    def _locate_app(self, path: str):
+        """
+        パスが登録されている (カテゴリ名, アプリ名)。読み込み済みのカテゴリと検索結果から探す
+        見つからなければ (None, None)
+        """
+        for category, apps in loaded_category_items(self.config):
+            for app_info in apps:
+                if app_info.get("path") == path:
+                    return category, app_info.get("name")
+        for result in self.search_results:
+            if result["path"] == path:
+                return result["category"], result["name"]
+        return None, None
+
     def open_settings_window(self):
         """
         設定編集ウィンドウを開く
@@ -295,37 +1347,557 @@ class AppLauncher(TkinterDnD.Tk):
             return
 
         # 新しい設定ウィンドウを作成
-        self.settings_win = SettingsWindow(self, self.config_path, self.reload_ui)
+        self.settings_win = SettingsWindow(self, self.config_store, self.reload_ui)
 
-    def reload_ui(self):
+    def _on_close(self):
         """
-        UIを再読み込みして、設定の変更を反映
+        ウィンドウを閉じる (常駐モードでは隠すだけ)
         """
-        # すべてのウィジェットを破棄
-        for widget in self.winfo_children():
-            widget.destroy()
+        if self.resident:
+            self._cancel_icon_requests()
+            self.withdraw()
+            # 隠している間にキャッシュと設定を保存しておく
+            self.config_store.flush()
+            try:
+                self.icon_store.flush()
+            except OSError:
+                pass
+            self._write_snapshot()
+            if tracer.enabled:
+                self._write_trace()
+            return
+        self.quit_launcher()
 
-        # 設定を再読み込み
-        self.config = self._load_config(self.config_path)
-        if not self.config:
-            self.destroy()
+    def quit_launcher(self):
+        """
+        アイコンキャッシュを保存してランチャーを終了する
+        """
+        self._cancel_icon_requests()
+        self._icon_executor.shutdown(wait=False, cancel_futures=True)
+        self.health.shutdown()
+        self.config_watcher.stop()
+        self.usage.close()
+        # 保存待ちの設定があれば書き出してから終了する
+        self.config_store.flush()
+        try:
+            self.icon_store.flush()
+        except OSError:
+            # キャッシュの保存に失敗しても終了は妨げない
+            pass
+        self._write_snapshot()
+        if self.startup_report_enabled:
+            # 起動後に遅延読み込みされたモジュールも含めて書き直す
+            self._write_startup_report()
+        if tracer.enabled:
+            self._write_trace()
+        self.destroy()
+
+    def _on_external_config_change(self, config):
+        """
+        [メインスレッド] 外部で変更された config.json を画面に反映する
+        カテゴリ名 -> アプリのリスト の形になっていない内容は無視する
+        """
+        if isinstance(config, SplitConfig):
+            # カテゴリのファイルは表示するときに読み込む
+            pass
+        elif not isinstance(config, dict) or not all(isinstance(apps, list) for apps in config.values()):
             return
+        self._report_skipped_entries()
+        # 外部での変更はアプリのインストールに合わせて行われることが多いため、パスを解決し直す
+        self.path_resolver.invalidate()
+        self.reload_ui(config)
 
-        # ウィジェットを再作成
-        self._create_widgets()
+    def show_window(self):
+        """
+        隠れている、または他のウィンドウの背後にあるランチャーを前面に表示する
+        """
+        self.deiconify()
+        self.lift()
+        self.focus_force()
 
-        # 最初のカテゴリを表示
-        if self.config:
-            first_category = next(iter(self.config))
-            self.show_apps_for_category(first_category)
+    def launch_by_name(self, name: str):
+        """
+        アプリ名でアプリを探して起動する
+        名前が完全に一致するものがなければ、検索結果の先頭を起動する
+        完全一致は読み込み済みのカテゴリと、起動履歴でその名前が記録されたカテゴリだけから探す
+        """
+        candidates = loaded_categories(self.config)
+        for category in self.usage.categories_named(name):
+            if category in self.config:
+                candidates.append(self.config[category])
+        for apps in candidates:
+            for app_info in apps:
+                if app_info.get("name") == name and app_info.get("path"):
+                    self.launch_app(app_info["path"], bool(app_info.get("shell")))
+                    return
+        if self.search_index is None:
+            self._request_search_index(lambda: self.launch_by_name(name))
+            return
+        results = self.search_index.search(name, limit=1)
+        if results:
+            self.launch_app(results[0]["path"], results[0]["shell"])
+        else:
+            messagebox.showwarning("起動エラー", f"アプリが見つかりません:\n{name}", parent=self)
+
+    def handle_instance_command(self, message: dict):
+        """
+        [メインスレッド] 後から起動されたランチャーから転送された要求を処理する
+        """
+        command = message.get("command")
+        if command == "show":
+            self.show_window()
+        elif command == "launch":
+            self.launch_by_name(message.get("name", ""))
+        elif command == "quit":
+            self.quit_launcher()
+
+    @tracer.traced("config.reload")
+    def reload_ui(self, new_config: dict | None = None):
+        """
+        UIを再読み込みして、設定の変更を反映
+        新旧の設定の差分を取り、変更のあったカテゴリのボタンとペインだけを更新する
+        new_config が渡された場合はファイルを読み直さずにそれを使う
+        """
+        if new_config is None:
+            # 設定を再読み込み (パスの解決結果も捨てて、ファイルの状態から調べ直す)
+            new_config = self._load_config()
+            if not new_config:
+                self.destroy()
+                return
+            self.path_resolver.invalidate()
+
+        diff = diff_config(self.config, new_config)
+        self.config = new_config
+        self._search_index_version += 1
+        if self.search_index is not None:
+            self.search_index.apply_diff(diff, new_config)
+        self._apply_config_diff(diff)
+        self._prune_icons()
+        self._check_all_paths()
+
+        # 検索中であれば、新しい設定で結果を更新する
+        if self.search_var.get().strip():
+            self._on_search_changed()
+
+    def _prune_icons(self):
+        """
+        設定から消えたアプリのアイコンとパスの検査結果をメモリ上から捨てる
+        """
+        paths = {app_info.get("path") for apps in loaded_categories(self.config) for app_info in apps}
+        for path in [path for path in self._icon_paths if path not in paths]:
+            del self._icon_paths[path]
+        self.icon_cache.retain(set(self._icon_paths.values()))
+        self.health.retain(paths)
+
+    def _apply_config_diff(self, diff):
+        """
+        設定の差分をカテゴリボタンとペインに反映する
+        アイコンのキャッシュはそのまま残すため、パスが変わらないアプリは再抽出されない
+        """
+        selected = self.current_category
+
+        # 名前だけが変わったカテゴリは、ボタンとペインをそのまま引き継ぐ
+        for old_name, new_name in diff.renamed:
+            button = self.category_buttons.pop(old_name)
+            button.configure(text=new_name, command=lambda c=new_name: self.select_category(c))
+            self.category_buttons[new_name] = button
+
+            pane = self.category_panes.pop(old_name, None)
+            if pane is not None:
+                pane.category = new_name
+                pane.title_label.configure(text=new_name)
+                self.category_panes[new_name] = pane
+            if selected == old_name:
+                selected = new_name
+
+        for category in diff.removed:
+            self.category_buttons.pop(category).destroy()
+            self._release_category_pane(category)
+
+        # 中身が変わったカテゴリのペインは破棄し、次に表示するときに作り直す
+        for category in diff.changed:
+            self._release_category_pane(category)
+
+        for category in diff.added:
+            self._create_category_button(category)
+
+        if diff.reordered:
+            for category in self.config:
+                button = self.category_buttons[category]
+                button.pack_forget()
+                button.pack(fill=tk.X, pady=4, ipady=4, before=self.category_spacer)
+
+        # アプリの名前やパスが変わった可能性があるため作り直す
+        if self.recent_pane is not None:
+            self._release_pane(self.recent_pane)
+            self.recent_pane = None
+
+        # 選択中のカテゴリが残っていればそれを、なければ最初のカテゴリを表示
+        if selected is not RECENT_CATEGORY and selected not in self.config:
+            selected = next(iter(self.config), None)
+        if selected is not None:
+            self.show_apps_for_category(selected)
+        elif self.current_pane is not None:
+            self.current_pane.pack_forget()
+            self.current_pane = None
+            self.current_category = None
+
+# --- カテゴリ表示ペイン ---
+class CategoryPane(ttk.Frame):
+    """
+    1つのカテゴリのタイトルとアプリボタンをまとめるペイン
+    ボタン自体はランチャー側で管理し、このペインには配置されるだけ
+    """
+
+    def __init__(self, master, category: str):
+        super().__init__(master)
+        self.category = category
+        self.buttons = []
+        # 表示しているアプリのリスト (パスの再検査に使う)
+        self.apps = []
+        # 大きなカテゴリの場合のみ VirtualAppList が設定される
+        self.app_list = None
+
+        # カテゴリタイトル
+        self.title_label = ttk.Label(
+            self,
+            text=category,
+            font=("Yu Gothic UI", 16, "bold")
+        )
+        self.title_label.pack(anchor=tk.W, pady=(0, 15))
+
+    def icon_targets(self):
+        """
+        アイコンを読み込む対象のボタン (仮想化リストでは表示中の行のみ)
+        """
+        if self.app_list is not None:
+            return self.app_list.bound_rows()
+        return self.buttons
+
+
+class VirtualAppList(ttk.Frame):
+    """
+    数千件のアプリを表示するための Canvas ベースの仮想化リスト
+    表示領域と前後の余白分の行だけをボタンとして作成し、スクロール時は行を使い回す
+    そのため、件数が増えてもウィジェット数と作成時間はほぼ一定になる
+    """
+    ROW_HEIGHT = 40
+    # 表示領域の前後に余分に作成しておく行数
+    OVERSCAN = 4
+
+    def __init__(self, master, apps: list, on_launch, on_row_bound, on_row_released=None,
+                 row_height: int | None = None):
+        super().__init__(master)
+        self.apps = apps
+        # 大きなアイコンを表示する場合は行を高くする
+        self.row_height = row_height or self.ROW_HEIGHT
+        self.on_launch = on_launch
+        self.on_row_bound = on_row_bound
+        self.on_row_released = on_row_released
+
+        self.canvas = tk.Canvas(self, highlightthickness=0, borderwidth=0, yscrollincrement=self.row_height)
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.canvas.yview)
+        self.canvas.configure(yscrollcommand=self._on_yscroll)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        # 行番号 -> (ボタン, Canvasのウィンドウ項目ID)
+        self._bound = {}
+        # 割り当てのない行
+        self._free = []
+        self._width = 1
+
+        self.canvas.configure(scrollregion=(0, 0, 1, len(apps) * self.row_height))
+        self.canvas.bind("<Configure>", self._on_configure)
+        self._bind_wheel(self.canvas)
+
+    def bound_rows(self):
+        """
+        現在アプリが割り当てられている行のボタン
+        """
+        return [button for button, _ in self._bound.values()]
+
+    def _bind_wheel(self, widget):
+        """
+        マウスホイールでスクロールできるようにする (Windows / X11)
+        """
+        widget.bind("<MouseWheel>", self._on_mousewheel)
+        widget.bind("<Button-4>", lambda e: self.canvas.yview_scroll(-1, "units"))
+        widget.bind("<Button-5>", lambda e: self.canvas.yview_scroll(1, "units"))
+
+    def _on_mousewheel(self, event):
+        steps = -int(event.delta / 120) or (-1 if event.delta > 0 else 1)
+        self.canvas.yview_scroll(steps, "units")
+
+    def _on_yscroll(self, first, last):
+        """
+        表示位置が変わるたびにスクロールバーを更新し、表示する行を入れ替える
+        """
+        self.scrollbar.set(first, last)
+        self._refresh()
+
+    def _on_configure(self, event):
+        """
+        Canvas の幅に合わせて行の幅を揃える
+        """
+        self._width = event.width
+        for _, item in list(self._bound.values()) + self._free:
+            self.canvas.itemconfigure(item, width=event.width)
+        self.canvas.configure(scrollregion=(0, 0, event.width, len(self.apps) * self.row_height))
+        self._refresh()
+
+    def _refresh(self):
+        """
+        表示領域に入った行にアプリを割り当て、外れた行を解放する
+        """
+        top = self.canvas.canvasy(0)
+        height = self.canvas.winfo_height()
+        first = max(0, int(top // self.row_height) - self.OVERSCAN)
+        last = min(len(self.apps), int((top + height) // self.row_height) + 1 + self.OVERSCAN)
+
+        for index in [i for i in self._bound if i < first or i >= last]:
+            button, item = self._bound.pop(index)
+            # 使われない行は表示範囲の外へ移動しておく
+            self.canvas.coords(item, 0, -2 * self.row_height)
+            self._free.append((button, item))
+            if self.on_row_released is not None:
+                self.on_row_released(button)
+
+        for index in range(first, last):
+            if index in self._bound:
+                continue
+            if self._free:
+                button, item = self._free.pop()
+                self.canvas.coords(item, 0, index * self.row_height)
+            else:
+                button = ttk.Button(self.canvas, compound=tk.LEFT) # テキストの左側に画像を表示
+                self._bind_wheel(button)
+                item = self.canvas.create_window(
+                    0, index * self.row_height, anchor=tk.NW, window=button,
+                    width=self._width, height=self.row_height - 4
+                )
+            self._bound[index] = (button, item)
+
+            app_info = self.apps[index]
+            app_path = app_info.get("path")
+            button.configure(
+                text=app_label(app_info),
+                command=lambda p=app_path, sh=bool(app_info.get("shell")): self.on_launch(p, sh)
+            )
+            button.app_path = app_path
+            # アイコンは表示中の行の分だけ読み込む
+            self.on_row_bound(button, app_path)
 
 # --- 設定編集ウィンドウ ---
+# 設定画面での1回の編集操作 (元に戻すときは inverse_op で逆の操作を作る)
+#   move_category: index の位置のカテゴリを to_index へ移動
+#   insert_category / delete_category: index の位置に category を追加・削除 (value は ConfigEditor.category_state)
+#   rename_category: index の位置のカテゴリ名を category から value に変更
+#   move_app: category のアプリを index から to_index へ移動
+#   insert_app / delete_app: category の index の位置にアプリ value を追加・削除
+#   replace_app: category の index の位置のアプリを old_value から value に置き換え
+#   insert_apps / delete_apps: category の index の位置からアプリのリスト value を追加・削除
+EditOp = namedtuple("EditOp", ["kind", "category", "index", "to_index", "value", "old_value"], defaults=(None,) * 5)
+
+_INVERSE_KINDS = {
+    "insert_category": "delete_category",
+    "delete_category": "insert_category",
+    "insert_app": "delete_app",
+    "delete_app": "insert_app",
+    "insert_apps": "delete_apps",
+    "delete_apps": "insert_apps",
+}
+
+
+def inverse_op(op: EditOp) -> EditOp:
+    """
+    操作を打ち消す操作
+    """
+    if op.kind in ("move_category", "move_app"):
+        return op._replace(index=op.to_index, to_index=op.index)
+    if op.kind == "rename_category":
+        return op._replace(category=op.value, value=op.category)
+    if op.kind == "replace_app":
+        return op._replace(value=op.old_value, old_value=op.value)
+    return op._replace(kind=_INVERSE_KINDS[op.kind])
+
+
+class ConfigEditor:
+    """
+    設定画面の編集モデル。元の設定はコピーせず、編集した部分だけを持つ (コピーオンライト)
+
+    カテゴリの並びは名前のリストで持ち、各カテゴリは元の設定での名前 (新規なら None) と、
+    変更した場合だけ複製したアプリのリストで表す。アプリの辞書は書き換えずに置き換えるため、
+    リストの浅い複製で足りる。すべての編集は EditOp として apply に渡し、
+    その記録から無制限の元に戻す・やり直しを行う。分割された設定の未読み込みのカテゴリは、
+    中身を編集しない限り読み込まない
+    """
+
+    def __init__(self, base):
+        self.base = base
+        self.order = list(base)
+        # カテゴリ名 -> 元の設定での名前 (新しく追加したカテゴリは None)
+        self._origins = {name: name for name in self.order}
+        # カテゴリ名 -> 編集したアプリのリスト (編集していないカテゴリにはない)
+        self._overrides = {}
+        self._undo = []
+        self._redo = []
+
+    def __contains__(self, name):
+        return name in self._origins
+
+    def apps(self, name) -> list:
+        """
+        カテゴリのアプリのリスト (読み取り専用として扱うこと)
+        """
+        apps = self._overrides.get(name)
+        if apps is not None:
+            return apps
+        origin = self._origins[name]
+        return self.base.get(origin, []) if origin is not None else []
+
+    def is_folder(self, name) -> bool:
+        """
+        フォルダのカテゴリかどうか (未読み込みのカテゴリは読み込まずに判断する)
+        """
+        apps = self._overrides.get(name)
+        if apps is not None:
+            return isinstance(apps, FolderApps)
+        origin = self._origins[name]
+        return origin is not None and is_folder_category(self.base, origin)
+
+    def _writable_apps(self, name) -> list:
+        apps = self._overrides.get(name)
+        if apps is None:
+            apps = self._overrides[name] = list(self.apps(name))
+        return apps
+
+    def category_state(self, name):
+        """
+        カテゴリを削除しても元に戻せるように、(元の名前, 編集したアプリのリスト) を返す
+        """
+        return self._origins[name], self._overrides.get(name)
+
+    @property
+    def can_undo(self) -> bool:
+        return bool(self._undo)
+
+    @property
+    def can_redo(self) -> bool:
+        return bool(self._redo)
+
+    @property
+    def modified(self) -> bool:
+        return bool(self._undo)
+
+    def apply(self, op: EditOp) -> EditOp:
+        """
+        操作を適用して記録する (やり直しの記録は破棄される)
+        """
+        self._apply(op)
+        self._undo.append(op)
+        self._redo.clear()
+        return op
+
+    def undo(self) -> EditOp | None:
+        """
+        最後の操作を取り消し、実際に適用した逆の操作を返す
+        """
+        if not self._undo:
+            return None
+        op = self._undo.pop()
+        inverse = inverse_op(op)
+        self._apply(inverse)
+        self._redo.append(op)
+        return inverse
+
+    def redo(self) -> EditOp | None:
+        if not self._redo:
+            return None
+        op = self._redo.pop()
+        self._apply(op)
+        self._undo.append(op)
+        return op
+
+    def _apply(self, op: EditOp):
+        kind = op.kind
+        if kind == "move_category":
+            self.order.insert(op.to_index, self.order.pop(op.index))
+        elif kind == "insert_category":
+            origin, apps = op.value
+            self.order.insert(op.index, op.category)
+            self._origins[op.category] = origin
+            if apps is not None:
+                self._overrides[op.category] = apps
+        elif kind == "delete_category":
+            del self.order[op.index]
+            del self._origins[op.category]
+            self._overrides.pop(op.category, None)
+        elif kind == "rename_category":
+            self.order[op.index] = op.value
+            self._origins[op.value] = self._origins.pop(op.category)
+            if op.category in self._overrides:
+                self._overrides[op.value] = self._overrides.pop(op.category)
+        elif kind == "move_app":
+            apps = self._writable_apps(op.category)
+            apps.insert(op.to_index, apps.pop(op.index))
+        elif kind == "insert_app":
+            self._writable_apps(op.category).insert(op.index, op.value)
+        elif kind == "delete_app":
+            del self._writable_apps(op.category)[op.index]
+        elif kind == "replace_app":
+            self._writable_apps(op.category)[op.index] = op.value
+        elif kind == "insert_apps":
+            self._writable_apps(op.category)[op.index:op.index] = op.value
+        elif kind == "delete_apps":
+            del self._writable_apps(op.category)[op.index:op.index + len(op.value)]
+        else:
+            raise ValueError(f"unknown edit operation: {kind}")
+
+    def build(self):
+        """
+        編集結果の設定を作る (元の設定は変更しない)
+        編集していないカテゴリのリストは元の設定と共有する
+        """
+        entries = [(name, self._origins[name], self._overrides.get(name)) for name in self.order]
+        if isinstance(self.base, SplitConfig):
+            return self.base.derive(entries)
+        return {
+            name: apps if apps is not None else self.base[origin]
+            for name, origin, apps in entries
+        }
+
+
+def import_ops(editor: ConfigEditor, category: str, apps: list) -> list:
+    """
+    カテゴリの末尾にアプリをまとめて追加する操作 (カテゴリがなければ作成し、登録済みのパスは除く)
+    """
+    ops = []
+    if category not in editor:
+        ops.append(EditOp("insert_category", category, len(editor.order), value=(None, [])))
+        existing = []
+    else:
+        existing = editor.apps(category)
+        if isinstance(existing, FolderApps):
+            return ops
+    registered = {app_info.get("path") for app_info in existing}
+    new_apps = []
+    for app_info in apps:
+        if app_info["path"] not in registered:
+            registered.add(app_info["path"])
+            new_apps.append(AppEntry.from_json(app_info))
+    if new_apps:
+        ops.append(EditOp("insert_apps", category, len(existing), value=new_apps))
+    return ops
+
+
 class SettingsWindow(tk.Toplevel):
     """
     設定ファイルを編集するためのGUIウィンドウ
+    編集は ConfigEditor への操作として記録し、リストボックスは変わった行だけを更新する
     """
 
-    def __init__(self, parent, config_path, reload_callback):
+    def __init__(self, parent, config_store, reload_callback):
         super().__init__(parent)
         self.title("設定の編集")
         self.geometry("800x500")
@@ -333,22 +1905,58 @@ class SettingsWindow(tk.Toplevel):
         self.transient(parent)  # 親ウィンドウの上に表示
         self.grab_set()         # このウィンドウにフォーカスを固定
 
-        self.config_path = config_path
+        self.config_store = config_store
         self.reload_callback = reload_callback
-        # 元の設定を直接変更しないよう、ディープコピーを作成
-        self.edited_config = copy.deepcopy(parent.config)
+        # パスの入力チェックにはランチャーと同じ解決結果を使う
+        self.path_resolver = getattr(parent, "path_resolver", None)
+        self.launcher = parent
+        # 元の設定は複製せず、編集した部分だけを記録する
+        self.editor = ConfigEditor(parent.config)
+        # アプリのリストボックスに表示しているカテゴリ
+        self.shown_category = None
 
         self.app_drag_start_index = None
         self.category_drag_start_index = None
 
         self._create_widgets()
         self.populate_category_list()
+        self._register_drop_targets()
+
+    def _register_drop_targets(self):
+        """
+        ファイルやフォルダをドロップしてアプリを追加できるようにする (tkinterdnd2 がある場合のみ)
+        """
+        enable = getattr(self.launcher, "enable_drag_and_drop", None)
+        dnd_files = enable(report=False) if enable is not None else None
+        if dnd_files is None:
+            return
+        self.main_frame.drop_target_register(dnd_files)
+        self.main_frame.dnd_bind("<<Drop>>", self._on_drop_files)
+
+    def _on_drop_files(self, event):
+        self.import_paths(list(self.tk.splitlist(event.data)))
+        return event.action
+
+    def import_paths(self, paths: list):
+        """
+        ドロップされたファイルとフォルダからアプリを探し、選択中のカテゴリに追加する
+        追加は1つの操作として記録されるため、元に戻すで取り消せる
+        """
+        categories = [name for name in self.editor.order if not self._is_folder_category(name)]
+        _, category = self._selected_category()
+        if category not in categories:
+            category = categories[0] if categories else ""
+        ImportPreviewDialog(self, paths, categories, category, self.launcher.post_to_ui, self._import_apps)
+
+    def _import_apps(self, category: str, apps: list):
+        for op in import_ops(self.editor, category, apps):
+            self._apply(op)
 
     def _create_widgets(self):
         """
         設定ウィンドウのウィジェットを作成・配置
         """
-        main_frame = ttk.Frame(self, padding="10")
+        main_frame = self.main_frame = ttk.Frame(self, padding="10")
         main_frame.pack(fill=tk.BOTH, expand=True)
 
         # --- 左ペイン：カテゴリ ---
@@ -370,6 +1978,7 @@ class SettingsWindow(tk.Toplevel):
         ttk.Button(cat_btn_frame, text="追加", command=self.add_category).pack(side=tk.LEFT, expand=True, fill=tk.X)
         ttk.Button(cat_btn_frame, text="編集", command=self.edit_category).pack(side=tk.LEFT, expand=True, fill=tk.X)
         ttk.Button(cat_btn_frame, text="削除", command=self.delete_category).pack(side=tk.LEFT, expand=True, fill=tk.X)
+        ttk.Button(category_pane, text="フォルダから追加", command=self.add_folder_category).pack(fill=tk.X)
 
         # --- 右ペイン：アプリケーション ---
         app_pane = ttk.Frame(main_frame)
@@ -383,23 +1992,165 @@ class SettingsWindow(tk.Toplevel):
         self.app_listbox.bind("<ButtonPress-1>", self.on_app_drag_start)
         self.app_listbox.bind("<B1-Motion>", self.on_app_drag)
         self.app_listbox.bind("<ButtonRelease-1>", self.on_app_drop)
+        # フォルダのカテゴリを選択したときは、参照しているフォルダを表示する
+        self.folder_note = ttk.Label(app_pane, foreground="gray")
 
         app_btn_frame = ttk.Frame(app_pane)
         app_btn_frame.pack(fill=tk.X, pady=5)
-        ttk.Button(app_btn_frame, text="追加", command=self.add_app).pack(side=tk.LEFT, expand=True, fill=tk.X)
-        ttk.Button(app_btn_frame, text="編集", command=self.edit_app).pack(side=tk.LEFT, expand=True, fill=tk.X)
-        ttk.Button(app_btn_frame, text="削除", command=self.delete_app).pack(side=tk.LEFT, expand=True, fill=tk.X)
+        self.app_buttons = [
+            ttk.Button(app_btn_frame, text="追加", command=self.add_app),
+            ttk.Button(app_btn_frame, text="編集", command=self.edit_app),
+            ttk.Button(app_btn_frame, text="削除", command=self.delete_app),
+        ]
+        for button in self.app_buttons:
+            button.pack(side=tk.LEFT, expand=True, fill=tk.X)
 
         # --- 下部ボタン ---
         bottom_frame = ttk.Frame(self)
         bottom_frame.pack(side=tk.BOTTOM, fill=tk.X, padx=10, pady=10)
+        self.undo_button = ttk.Button(bottom_frame, text="元に戻す", command=self.undo, state=tk.DISABLED)
+        self.undo_button.pack(side=tk.LEFT)
+        self.redo_button = ttk.Button(bottom_frame, text="やり直し", command=self.redo, state=tk.DISABLED)
+        self.redo_button.pack(side=tk.LEFT, padx=(5, 0))
         ttk.Button(bottom_frame, text="キャンセル", command=self.destroy).pack(side=tk.RIGHT, padx=(5,0))
         ttk.Button(bottom_frame, text="保存して閉じる", command=self.save_and_close).pack(side=tk.RIGHT)
 
+        # Ctrl+Z で元に戻す、Ctrl+Y / Ctrl+Shift+Z でやり直し
+        self.bind("<Control-z>", lambda e: self.undo())
+        self.bind("<Control-y>", lambda e: self.redo())
+        self.bind("<Control-Z>", lambda e: self.redo())
+
     def on_category_select(self, event=None):
         """カテゴリが選択された際にアプリリストを更新する。"""
         self.update_app_list()
 
+    def _selected_category(self):
+        """
+        選択中のカテゴリの (位置, 名前)。選択がなければ (None, None)
+        """
+        selected_indices = self.category_listbox.curselection()
+        if not selected_indices:
+            return None, None
+        index = selected_indices[0]
+        return index, self.editor.order[index]
+
+    # --- 編集操作の適用 ---
+
+    def _apply(self, op: EditOp):
+        """
+        操作をモデルに適用し、リストボックスの該当する行だけを更新する
+        """
+        self.editor.apply(op)
+        self._reflect(op)
+        # 追加・変更したアプリのパスを検査する (結果は on_health_results に届く)
+        health = getattr(self.launcher, "health", None)
+        if health is not None and op.kind in ("insert_app", "replace_app", "insert_apps"):
+            health.check(op.value if op.kind == "insert_apps" else [op.value])
+
+    def _mark_app_rows(self, first: int = 0, last: int | None = None):
+        """
+        表示中のアプリのうち、起動できないパスの行を赤く表示する
+        """
+        health = getattr(self.launcher, "health", None)
+        if health is None or self.shown_category is None:
+            return
+        apps = self.editor.apps(self.shown_category)
+        last = len(apps) - 1 if last is None else last
+        for row in range(first, last + 1):
+            problem = health.problem(apps[row].get("path"))
+            self.app_listbox.itemconfigure(row, foreground="#c0392b" if problem else "")
+
+    def on_health_results(self, results: dict):
+        """
+        パスの検査結果のうち、表示中のカテゴリのものを反映する
+        """
+        if self.shown_category is None:
+            return
+        for row, app_info in enumerate(self.editor.apps(self.shown_category)):
+            if app_info.get("path") in results:
+                self._mark_app_rows(row, row)
+
+    def undo(self):
+        op = self.editor.undo()
+        if op is not None:
+            self._reflect(op)
+
+    def redo(self):
+        op = self.editor.redo()
+        if op is not None:
+            self._reflect(op)
+
+    def _select_row(self, listbox, index):
+        listbox.selection_clear(0, tk.END)
+        listbox.selection_set(index)
+        listbox.activate(index)
+        listbox.see(index)
+
+    def _reflect(self, op: EditOp):
+        """
+        適用済みの操作をリストボックスに反映する
+        """
+        categories = self.category_listbox
+        kind = op.kind
+        if kind == "move_category":
+            categories.delete(op.index)
+            categories.insert(op.to_index, self.editor.order[op.to_index])
+            self._select_row(categories, op.to_index)
+        elif kind == "insert_category":
+            categories.insert(op.index, op.category)
+            self._select_row(categories, op.index)
+        elif kind == "delete_category":
+            categories.delete(op.index)
+            if self.editor.order:
+                self._select_row(categories, min(op.index, len(self.editor.order) - 1))
+        elif kind == "rename_category":
+            categories.delete(op.index)
+            categories.insert(op.index, op.value)
+            self._select_row(categories, op.index)
+            if self.shown_category == op.category:
+                self.shown_category = op.value
+        else:
+            # アプリの操作は、そのカテゴリを表示していなければ表示を切り替える
+            if self.shown_category != op.category:
+                self._select_row(categories, self.editor.order.index(op.category))
+                self.update_app_list()
+            else:
+                apps = self.app_listbox
+                if kind == "move_app":
+                    apps.delete(op.index)
+                    apps.insert(op.to_index, self._app_label(op.value or self.editor.apps(op.category)[op.to_index]))
+                    self._mark_app_rows(op.to_index, op.to_index)
+                elif kind == "insert_app":
+                    apps.insert(op.index, self._app_label(op.value))
+                    self._mark_app_rows(op.index, op.index)
+                elif kind == "delete_app":
+                    apps.delete(op.index)
+                elif kind == "replace_app":
+                    apps.delete(op.index)
+                    apps.insert(op.index, self._app_label(op.value))
+                    self._mark_app_rows(op.index, op.index)
+                elif kind == "insert_apps":
+                    apps.insert(op.index, *[self._app_label(app) for app in op.value])
+                    self._mark_app_rows(op.index, op.index + len(op.value) - 1)
+                elif kind == "delete_apps":
+                    apps.delete(op.index, op.index + len(op.value) - 1)
+            row = op.to_index if kind == "move_app" else op.index
+            if kind in ("delete_app", "delete_apps"):
+                row = min(op.index, self.app_listbox.size() - 1)
+            if row >= 0:
+                self._select_row(self.app_listbox, row)
+
+        # カテゴリの追加・削除で選択が変わった場合はアプリの一覧を切り替える
+        _, selected = self._selected_category()
+        if selected != self.shown_category:
+            self.update_app_list()
+        self.undo_button.configure(state=tk.NORMAL if self.editor.can_undo else tk.DISABLED)
+        self.redo_button.configure(state=tk.NORMAL if self.editor.can_redo else tk.DISABLED)
+
+    @staticmethod
+    def _app_label(app) -> str:
+        return app_label(app)
+
     # --- カテゴリのドラッグ＆ドロップ処理 ---
 
     def on_category_drag_start(self, event):
@@ -414,29 +2165,13 @@ class SettingsWindow(tk.Toplevel):
         """カテゴリのドロップ時にリストの並べ替えを行う。"""
         drop_index = self.category_listbox.nearest(event.y)
         start_index = self.category_drag_start_index
+        self.category_drag_start_index = None
 
         # 開始位置がない、または同じ場所へのドロップは無視
-        if start_index is None or start_index == drop_index:
-            self.category_drag_start_index = None
+        if start_index is None or start_index == drop_index or not self.editor.order:
             return
 
-        # config辞書のキーを並べ替える
-        keys = list(self.edited_config.keys())
-        moved_key = keys.pop(start_index)
-        keys.insert(drop_index, moved_key)
-
-        # 新しい順序で辞書を再構築
-        self.edited_config = {key: self.edited_config[key] for key in keys}
-
-        # UIを更新
-        self.populate_category_list()
-        # 移動後の項目を選択状態にする
-        self.category_listbox.selection_clear(0, tk.END)
-        self.category_listbox.selection_set(drop_index)
-        self.category_listbox.activate(drop_index)
-        self.on_category_select() # アプリリストも更新
-
-        self.category_drag_start_index = None
+        self._apply(EditOp("move_category", index=start_index, to_index=drop_index))
 
     # --- アプリケーションのドラッグ＆ドロップ処理 ---
 
@@ -452,40 +2187,22 @@ class SettingsWindow(tk.Toplevel):
         """アプリケーションのドロップ時にリストの並べ替えを行う。"""
         drop_index = self.app_listbox.nearest(event.y)
         start_index = self.app_drag_start_index
+        self.app_drag_start_index = None
 
         # 開始位置がない、または同じ場所へのドロップは無視
-        if start_index is None or start_index == drop_index:
-            self.app_drag_start_index = None
+        if start_index is None or start_index == drop_index or self.shown_category is None:
             return
-
-        # 選択中のカテゴリを取得
-        cat_indices = self.category_listbox.curselection()
-        if not cat_indices:
-            self.app_drag_start_index = None # カテゴリが選択されていなければ何もしない
+        if not self.editor.apps(self.shown_category) or self._is_folder_category(self.shown_category):
             return
 
-        category = self.category_listbox.get(cat_indices[0])
-
-        # アプリケーションリストを更新
-        app_list = self.edited_config[category]
-        moved_app = app_list.pop(start_index)
-        app_list.insert(drop_index, moved_app)
-
-        # UIを更新
-        self.update_app_list()
-        # 移動後の項目を選択状態にする
-        self.app_listbox.selection_clear(0, tk.END)
-        self.app_listbox.selection_set(drop_index)
-        self.app_listbox.activate(drop_index)
-
-        self.app_drag_start_index = None
+        self._apply(EditOp("move_app", self.shown_category, start_index, drop_index))
 
     def populate_category_list(self):
         """
-        カテゴリリストを更新
+        カテゴリリストを作成 (以降の編集では変わった行だけを更新する)
         """
         self.category_listbox.delete(0, tk.END)
-        for category in self.edited_config.keys():
+        for category in self.editor.order:
             self.category_listbox.insert(tk.END, category)
         self.update_app_list()
 
@@ -494,117 +2211,168 @@ class SettingsWindow(tk.Toplevel):
         選択されたカテゴリに応じてアプリリストを更新
         """
         self.app_listbox.delete(0, tk.END)
-        selected_indices = self.category_listbox.curselection()
-        if not selected_indices:
-            return
-        
-        category = self.category_listbox.get(selected_indices[0])
-        for app in self.edited_config.get(category, []):
-            self.app_listbox.insert(tk.END, app.get("name", "名称未設定"))
+        _, category = self._selected_category()
+        self.shown_category = category
+        apps = self.editor.apps(category) if category is not None else []
+
+        # フォルダのカテゴリの中身は編集できない
+        is_folder = isinstance(apps, FolderApps)
+        for button in self.app_buttons:
+            button.configure(state=tk.DISABLED if is_folder else tk.NORMAL)
+        if is_folder:
+            self.folder_note.configure(text=f"フォルダ '{apps.folder}' の内容 (フォルダの変更が自動で反映されます)")
+            self.folder_note.pack(anchor=tk.W, before=self.app_listbox)
+        else:
+            self.folder_note.pack_forget()
+
+        self.app_listbox.insert(tk.END, *[self._app_label(app) for app in apps])
+        self._mark_app_rows()
+        health = getattr(self.launcher, "health", None)
+        if health is not None:
+            health.check(apps)
+
+    def _is_folder_category(self, name) -> bool:
+        return self.editor.is_folder(name)
 
     def add_category(self):
         """
         新しいカテゴリを追加するダイアログを表示
         """
         name = simpledialog.askstring("カテゴリの追加", "新しいカテゴリ名を入力してください:", parent=self)
-        if name and name not in self.edited_config:
-            self.edited_config[name] = []
-            self.populate_category_list()
-            self.category_listbox.selection_set(tk.END)
+        if name and name not in self.editor:
+            self._apply(EditOp("insert_category", name, len(self.editor.order), value=(None, [])))
 
-    def edit_category(self):
-        """ 
-        編集するカテゴリを選択し、名前を変更するダイアログを表示
+    def add_folder_category(self):
         """
-        selected_indices = self.category_listbox.curselection()
-        if not selected_indices:
-            messagebox.showwarning("選択エラー", "編集するカテゴリを選択してください。", parent=self)
+        選んだフォルダの中身を表示するカテゴリを追加する (中のフォルダも対象)
+        """
+        from tkinter import filedialog
+        folder = filedialog.askdirectory(title="カテゴリにするフォルダを選択", parent=self)
+        if not folder:
             return
-        
-        old_name = self.category_listbox.get(selected_indices[0])
-        new_name = simpledialog.askstring("カテゴリの編集", "新しいカテゴリ名を入力してください:", initialvalue=old_name, parent=self)
+        name = simpledialog.askstring(
+            "カテゴリの追加", "新しいカテゴリ名を入力してください:",
+            initialvalue=os.path.basename(os.path.normpath(folder)), parent=self
+        )
+        if not name or name in self.editor:
+            return
+        folder_index = self.config_store.folder_index
+        spec = {FolderApps.FOLDER_KEY: os.path.normpath(folder), "recursive": True}
 
-        if new_name and new_name != old_name and new_name not in self.edited_config:
-            # 辞書のキーを変更するために、新しいキーで項目を作成し、古いキーを削除
-            self.edited_config[new_name] = self.edited_config.pop(old_name)
-            self.populate_category_list()
+        # 大きなフォルダの走査で画面が止まらないよう、バックグラウンドで走査する
+        def run():
+            apps = None
+            try:
+                apps = folder_index.category(spec)
+                folder_index.save()
+            finally:
+                self.launcher.post_to_ui(self._on_folder_category_scanned, name, apps)
+
+        threading.Thread(target=run, name="folder-scan", daemon=True).start()
+
+    def _on_folder_category_scanned(self, name: str, apps):
+        """
+        [メインスレッド] 走査が終わったフォルダのカテゴリを追加する
+        (走査中に画面が閉じられた、または同じ名前のカテゴリが追加された場合は何もしない)
+        """
+        if apps is None or not self.winfo_exists() or name in self.editor:
+            return
+        self._apply(EditOp("insert_category", name, len(self.editor.order), value=(None, apps)))
+
+    def edit_category(self):
+        """ 
+        編集するカテゴリを選択し、名前を変更するダイアログを表示
+        """
+        index, old_name = self._selected_category()
+        if old_name is None:
+            messagebox.showwarning("選択エラー", "編集するカテゴリを選択してください。", parent=self)
+            return
+        
+        new_name = simpledialog.askstring("カテゴリの編集", "新しいカテゴリ名を入力してください:", initialvalue=old_name, parent=self)
+
+        if new_name and new_name != old_name and new_name not in self.editor:
+            self._apply(EditOp("rename_category", old_name, index, value=new_name))
 
     def delete_category(self):
         """
         選択されたカテゴリを削除する
         """
-        selected_indices = self.category_listbox.curselection()
-        if not selected_indices:
+        index, category = self._selected_category()
+        if category is None:
             messagebox.showwarning("選択エラー", "削除するカテゴリを選択してください。", parent=self)
             return
 
-        category = self.category_listbox.get(selected_indices[0])
         if messagebox.askyesno("削除の確認", f"カテゴリ '{category}' を削除しますか？", parent=self):
-            del self.edited_config[category]
-            self.populate_category_list()
+            self._apply(EditOp("delete_category", category, index, value=self.editor.category_state(category)))
 
     def add_app(self):
         """
         選択されたカテゴリに新しいアプリケーションを追加するダイアログを表示
         """
-        cat_indices = self.category_listbox.curselection()
-        if not cat_indices:
+        _, category = self._selected_category()
+        if category is None:
             messagebox.showwarning("選択エラー", "アプリケーションを追加するカテゴリを選択してください。", parent=self)
             return
         
-        category = self.category_listbox.get(cat_indices[0])
-        dialog = AppDetailDialog(self, title="アプリケーションの追加")
+        dialog = AppDetailDialog(self, title="アプリケーションの追加", resolver=self.path_resolver)
         if dialog.result:
-            self.edited_config[category].append(dialog.result)
-            self.update_app_list()
+            index = len(self.editor.apps(category))
+            self._apply(EditOp("insert_app", category, index, value=dialog.result))
 
     def edit_app(self):
         """
         選択されたアプリケーションを編集するダイアログを表示
         """
-        cat_indices = self.category_listbox.curselection()
+        _, category = self._selected_category()
         app_indices = self.app_listbox.curselection()
-        if not cat_indices or not app_indices:
+        if category is None or not app_indices:
             messagebox.showwarning("選択エラー", "編集するアプリケーションを選択してください。", parent=self)
             return
 
-        category = self.category_listbox.get(cat_indices[0])
         app_index = app_indices[0]
-        app_data = self.edited_config[category][app_index]
+        app_data = self.editor.apps(category)[app_index]
 
-        dialog = AppDetailDialog(self, title="アプリケーションの編集", initial_data=app_data)
-        if dialog.result:
-            self.edited_config[category][app_index] = dialog.result
-            self.update_app_list()
+        dialog = AppDetailDialog(
+            self, title="アプリケーションの編集", initial_data=app_data, resolver=self.path_resolver
+        )
+        if dialog.result and dialog.result != app_data:
+            self._apply(EditOp("replace_app", category, app_index, value=dialog.result, old_value=app_data))
 
     def delete_app(self):
         """
         選択されたアプリケーションを削除する
         """
-        cat_indices = self.category_listbox.curselection()
+        _, category = self._selected_category()
         app_indices = self.app_listbox.curselection()
-        if not cat_indices or not app_indices:
+        if category is None or not app_indices:
             messagebox.showwarning("選択エラー", "削除するアプリケーションを選択してください。", parent=self)
             return
 
-        category = self.category_listbox.get(cat_indices[0])
         app_index = app_indices[0]
-        app_name = self.app_listbox.get(app_index)
+        app_data = self.editor.apps(category)[app_index]
 
-        if messagebox.askyesno("削除の確認", f"アプリケーション '{app_name}' を削除しますか？", parent=self):
-            del self.edited_config[category][app_index]
-            self.update_app_list()
+        if messagebox.askyesno("削除の確認", f"アプリケーション '{self._app_label(app_data)}' を削除しますか？", parent=self):
+            self._apply(EditOp("delete_app", category, app_index, value=app_data))
 
     def save_and_close(self):
         """
         変更をJSONファイルに保存し、ウィンドウを閉じる
         """
         try:
-            with open(self.config_path, 'w', encoding='utf-8') as f:
-                json.dump(self.edited_config, f, indent=2, ensure_ascii=False)
-            
-            messagebox.showinfo("保存完了", "設定を保存しました。", parent=self)
-            self.reload_callback()
+            # 編集結果から設定を作る (編集していないカテゴリは元の設定と共有する)
+            edited_config = self.editor.build()
+            # 書き込みはバックグラウンドで行われる (失敗した場合はランチャーが通知する)
+            # 渡した辞書はそのままランチャーの設定になるため、以降は変更しない
+            self.config_store.schedule_save(edited_config)
+
+            # この時点では書き込みを依頼しただけなので、保存の完了とは表示しない
+            messagebox.showinfo(
+                "設定の反映",
+                "設定を反映しました。\nファイルへの保存はバックグラウンドで行われ、失敗した場合は通知されます。",
+                parent=self
+            )
+            # 保存した内容をそのまま渡し、ファイルの読み直しを省く
+            self.reload_callback(edited_config)
             self.destroy()
         except Exception as e:
             messagebox.showerror("保存エラー", f"設定の保存に失敗しました:\n{e}", parent=self)
@@ -615,8 +2383,10 @@ class AppDetailDialog(simpledialog.Dialog):
     アプリケーションの名前とパスを入力するためのダイアログ
     """
 
-    def __init__(self, parent, title=None, initial_data=None):
+    def __init__(self, parent, title=None, initial_data=None, resolver=None):
         self.initial_data = initial_data if initial_data else {}
+        # 指定された場合は、見つからないパスを登録する前に確認する
+        self.resolver = resolver
         super().__init__(parent, title)
 
     def body(self, master):
@@ -632,6 +2402,12 @@ class AppDetailDialog(simpledialog.Dialog):
         self.name_entry.grid(row=0, column=1, padx=5, pady=2)
         self.path_entry.grid(row=1, column=1, padx=5, pady=2)
 
+        # シェルの機能 (パイプ、環境変数の展開、内部コマンドなど) が必要なコマンドのみチェックする
+        self.shell_var = tk.BooleanVar(value=bool(self.initial_data.get("shell")))
+        ttk.Checkbutton(master, text="シェルのコマンドとして実行", variable=self.shell_var).grid(
+            row=2, column=1, sticky=tk.W, padx=5, pady=2
+        )
+
         # 編集モードの場合、初期値を設定
         self.name_entry.insert(0, self.initial_data.get("name", ""))
         self.path_entry.insert(0, self.initial_data.get("path", ""))
@@ -668,30 +2444,3328 @@ class AppDetailDialog(simpledialog.Dialog):
         if not path:
             messagebox.showwarning("入力エラー", "パスを入力してください。", parent=self)
             return 0
+        if self.resolver is not None and not self.shell_var.get():
+            try:
+                args, executable = self.resolver.resolve_command(path)
+            except ValueError:
+                messagebox.showwarning("入力エラー", "パスの引用符が閉じられていません。", parent=self)
+                return 0
+            if args and executable is None and not messagebox.askyesno(
+                "確認", f"'{args[0]}' が見つかりません。\nこのまま登録しますか？", parent=self
+            ):
+                return 0
         return 1
 
     def apply(self):
         """
         OKボタンが押されたときに呼ばれる
         """
-        self.result = {
+        result = {
             "name": self.name_entry.get().strip(),
             "path": self.path_entry.get().strip()
         }
+        if self.shell_var.get():
+            result["shell"] = True
+        self.result = AppEntry.from_json(result)
 
-def resource_path(relative_path: str) -> str:
+# --- ドラッグ&ドロップでの一括登録 ---
+# Windows で登録の対象にする拡張子 (実行ファイルとショートカット)
+IMPORT_EXTENSIONS = (".exe", ".com", ".bat", ".cmd", ".lnk", ".url")
+
+
+def iter_dropped_files(paths: list, cancel_event):
     """
-    実行ファイル(.exe)と開発環境の両方でリソースへのパスを解決する
+    [ワーカースレッド] ドロップされたファイルと、フォルダ以下のすべてのファイルのパスを順に返す
+    フォルダは os.scandir で深さ優先に走査し (再帰呼び出しは使わない)、
+    シンボリックリンクのフォルダはたどらない。cancel_event が設定されたら止まる
+    """
+    folders = []
+    for path in paths:
+        if os.path.isdir(path):
+            folders.append(path)
+        elif os.path.isfile(path):
+            yield path
+    folders.reverse()
+    while folders:
+        if cancel_event.is_set():
+            return
+        folder = folders.pop()
+        subfolders = []
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if cancel_event.is_set():
+                        return
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subfolders.append(entry.path)
+                        elif entry.is_file():
+                            yield entry.path
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+        # 名前順に走査するため、逆順に積む
+        subfolders.sort(reverse=True)
+        folders.extend(subfolders)
+
+
+def read_desktop_entry(path: str) -> dict:
+    """
+    .desktop ファイルの [Desktop Entry] のキーと値 (読めない場合は空)
     """
+    entry = {}
     try:
-        # PyInstallerが作成する一時フォルダのパスを取得
-        base_path = sys._MEIPASS
-    except Exception:
-        # 開発環境ではスクリプトのディレクトリを基準にする
-        base_path = os.path.abspath(".")
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            in_entry = False
+            for line in f:
+                line = line.strip()
+                if line.startswith("["):
+                    in_entry = line == "[Desktop Entry]"
+                elif in_entry and "=" in line and not line.startswith("#"):
+                    key, value = line.split("=", 1)
+                    entry.setdefault(key.strip(), value.strip())
+    except OSError:
+        pass
+    return entry
 
-    return os.path.join(base_path, relative_path)
+
+def _desktop_entry_name(path: str) -> str | None:
+    """
+    .desktop ファイルの Name を返す
+    """
+    return read_desktop_entry(path).get("Name") or None
+
+
+# Exec の行の廃止されたフィールドコード (取り除く)
+_DEPRECATED_FIELD_CODES = ("%d", "%D", "%n", "%N", "%v", "%m")
+
+
+def desktop_entry_command(path: str, files=()) -> list | None:
+    """
+    .desktop ファイルの Exec の行から起動するコマンドの引数のリストを作る (Exec がなければ None)
+    %f / %u には files の先頭を、%F / %U には files のすべてを渡し、その他のフィールドコードは展開する
+    """
+    entry = read_desktop_entry(path)
+    command = entry.get("Exec")
+    if not command:
+        return None
+    try:
+        parts = shlex.split(command)
+    except ValueError:
+        return None
+    args = []
+    for part in parts:
+        if part in ("%f", "%u"):
+            args.extend(list(files)[:1])
+        elif part in ("%F", "%U"):
+            args.extend(files)
+        elif part == "%i":
+            if entry.get("Icon"):
+                args.extend(["--icon", entry["Icon"]])
+        elif part == "%c":
+            args.append(entry.get("Name", ""))
+        elif part == "%k":
+            args.append(path)
+        elif part not in _DEPRECATED_FIELD_CODES:
+            args.append(part.replace("%%", "%"))
+    return args or None
+
+
+def app_candidate(path: str) -> dict | None:
+    """
+    ファイルが登録できるアプリ (実行ファイル・ショートカット) なら設定の項目を返す
+    """
+    stem, extension = os.path.splitext(os.path.basename(path))
+    extension = extension.lower()
+    if os.name == "nt":
+        if extension not in IMPORT_EXTENSIONS:
+            return None
+        return {"name": stem, "path": path}
+    if extension == ".desktop":
+        return {"name": _desktop_entry_name(path) or stem, "path": path}
+    # 拡張子のない実行ファイル、AppImage、シェルスクリプト
+    if extension in ("", ".appimage", ".sh") and os.access(path, os.X_OK):
+        return {"name": stem, "path": path}
+    return None
+
+
+class ImportScanner:
+    """
+    ドロップされたフォルダをバックグラウンドで走査し、見つかったアプリを少しずつ通知する
+
+    走査 (iter_dropped_files) と判定 (app_candidate) はジェネレーターでつながっており、
+    見つかったアプリは BATCH_SIZE 件ごと、または BATCH_SECONDS 秒ごとにまとめて渡す。
+    そのため、10万件のファイルがあっても UI への通知は数十回で済む
+    """
+    BATCH_SIZE = 500
+    BATCH_SECONDS = 0.1
+
+    def __init__(self, paths: list, on_batch, on_done):
+        # on_batch(アプリのリスト, 走査したファイル数) と on_done(中止したか) は走査スレッドから呼ばれる
+        self.paths = paths
+        self.on_batch = on_batch
+        self.on_done = on_done
+        self.scanned = 0
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="import-scanner", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def _run(self):
+        batch = []
+        seen = set()
+        last_report = time.monotonic()
+        try:
+            for path in iter_dropped_files(self.paths, self._cancel):
+                self.scanned += 1
+                candidate = app_candidate(path)
+                if candidate is not None and candidate["path"] not in seen:
+                    seen.add(candidate["path"])
+                    batch.append(candidate)
+                now = time.monotonic()
+                if len(batch) >= self.BATCH_SIZE or now - last_report >= self.BATCH_SECONDS:
+                    self.on_batch(batch, self.scanned)
+                    batch = []
+                    last_report = now
+        finally:
+            self.on_batch(batch, self.scanned)
+            self.on_done(self._cancel.is_set())
+
+
+class ImportPreviewDialog(tk.Toplevel):
+    """
+    ドロップされたファイルとフォルダから見つかったアプリを一覧表示し、選んだものを登録するダイアログ
+    走査中も操作でき、見つかったアプリは順次一覧に追加される (最初はすべて選択状態)
+    """
+
+    def __init__(self, parent, paths: list, categories: list, category: str, post_to_ui, on_import):
+        super().__init__(parent)
+        self.title("アプリの一括登録")
+        self.geometry("640x420")
+        self.transient(parent)
+        # 設定画面から開いた場合は、閉じた後に設定画面へ入力を戻す
+        self._previous_grab = self.grab_current()
+        self.grab_set()
+
+        # on_import(カテゴリ名, アプリのリスト) は「追加」が押されたときに呼ばれる
+        self.on_import = on_import
+        self.apps = []
+
+        self.status_var = tk.StringVar(value="検索しています...")
+        ttk.Label(self, textvariable=self.status_var).pack(anchor=tk.W, padx=10, pady=(10, 0))
+        self.progress = ttk.Progressbar(self, mode="indeterminate")
+        self.progress.pack(fill=tk.X, padx=10, pady=5)
+        self.progress.start(15)
+
+        list_frame = ttk.Frame(self)
+        list_frame.pack(fill=tk.BOTH, expand=True, padx=10)
+        self.listbox = tk.Listbox(list_frame, selectmode=tk.EXTENDED, exportselection=False)
+        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.listbox.yview)
+        self.listbox.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        bottom_frame = ttk.Frame(self)
+        bottom_frame.pack(fill=tk.X, padx=10, pady=10)
+        ttk.Label(bottom_frame, text="追加先のカテゴリ:").pack(side=tk.LEFT)
+        self.category_var = tk.StringVar(value=category)
+        # 一覧にない名前を入力すると、新しいカテゴリとして追加する
+        ttk.Combobox(bottom_frame, textvariable=self.category_var, values=categories, width=20).pack(side=tk.LEFT, padx=5)
+        ttk.Button(bottom_frame, text="キャンセル", command=self.close).pack(side=tk.RIGHT, padx=(5, 0))
+        self.add_button = ttk.Button(bottom_frame, text="追加", command=self.add_selected)
+        self.add_button.pack(side=tk.RIGHT, padx=(5, 0))
+        self.stop_button = ttk.Button(bottom_frame, text="検索を中止", command=self.stop_scan)
+        self.stop_button.pack(side=tk.RIGHT)
+
+        self.protocol("WM_DELETE_WINDOW", self.close)
+        self.scanner = ImportScanner(
+            paths,
+            on_batch=lambda apps, scanned: post_to_ui(self._on_batch, apps, scanned),
+            on_done=lambda cancelled: post_to_ui(self._on_done, cancelled)
+        )
+        self.scanner.start()
+
+    def _on_batch(self, apps: list, scanned: int):
+        """
+        [メインスレッド] 見つかったアプリを一覧に追加する
+        """
+        if not self.winfo_exists():
+            return
+        if apps:
+            start = len(self.apps)
+            self.apps.extend(apps)
+            self.listbox.insert(tk.END, *[f"{app['name']}    ({app['path']})" for app in apps])
+            self.listbox.selection_set(start, tk.END)
+        self.status_var.set(f"検索しています... {scanned} 件のファイルから {len(self.apps)} 件のアプリが見つかりました")
+
+    def _on_done(self, cancelled: bool):
+        if not self.winfo_exists():
+            return
+        self.progress.stop()
+        self.progress.configure(mode="determinate", value=100)
+        self.stop_button.configure(state=tk.DISABLED)
+        state = "中止しました" if cancelled else "完了しました"
+        self.status_var.set(f"検索を{state}: {self.scanner.scanned} 件のファイルから {len(self.apps)} 件のアプリが見つかりました")
+
+    def stop_scan(self):
+        self.scanner.cancel()
+
+    def add_selected(self):
+        """
+        選択したアプリを登録して閉じる
+        """
+        category = self.category_var.get().strip()
+        if not category:
+            messagebox.showwarning("入力エラー", "追加先のカテゴリを入力してください。", parent=self)
+            return
+        selected = [self.apps[index] for index in self.listbox.curselection()]
+        self.close()
+        if selected:
+            self.on_import(category, selected)
+
+    def close(self):
+        self.scanner.cancel()
+        self.grab_release()
+        if self._previous_grab is not None:
+            try:
+                self._previous_grab.grab_set()
+            except tk.TclError:
+                pass
+        self.destroy()
+
+# --- アイコンの抽出とディスクキャッシュ ---
+class Win32IconBackend:
+    """
+    ExtractIconEx と GDI を使って実行ファイルのアイコンを RGBA に描画するバックエンド
+    IconStore はこのインターフェース (resolve / extract) だけに依存するため、
+    テストでは Windows API を使わない代替バックエンドに差し替えられる
+    """
+
+    def __init__(self, resolver=None):
+        self.resolver = resolver if resolver is not None else PathResolver()
+
+    def resolve(self, path: str) -> str:
+        """
+        設定に書かれたパスを実際の実行ファイルのパスに解決する
+        """
+        try:
+            return self.resolver.resolve(path) or path
+        except ValueError:
+            return path
+
+    def extract(self, full_path: str, size) -> bytes | None:
+        """
+        アイコンを指定サイズで描画し、RGBA のバイト列を返す (取得できなければ None)
+        ライブラリが見つからない場合は ImportError を送出する
+        """
+        lazy_import("PIL.Image")
+        win32gui = lazy_import("win32gui")
+        win32con = lazy_import("win32con")
+
+        large, small = [], []
+        hdc, hdc_mem, hbmp = 0, 0, 0
+        try:
+            # 指定サイズのアイコンを直接取り出す (32x32 を拡大するとぼやけるため)
+            large = self._extract_sized(full_path, size)
+            if not large:
+                large, small = win32gui.ExtractIconEx(full_path, 0)
+            icon_handle = large[0] if large else (small[0] if small else 0)
+            if icon_handle == 0:
+                return None
+
+            hdc = win32gui.GetDC(0)
+            hdc_mem = win32gui.CreateCompatibleDC(hdc)
+            hbmp = win32gui.CreateCompatibleBitmap(hdc, size[0], size[1])
+            win32gui.SelectObject(hdc_mem, hbmp)
+
+            win32gui.DrawIconEx(hdc_mem, 0, 0, icon_handle, size[0], size[1], 0, 0, win32con.DI_NORMAL)
+
+            # 描画した大きさのまま変換する (同じ大きさへの縮小は不要)
+            return bgra_to_rgba(win32gui.GetBitmapBits(hbmp, True), size)
+        except Exception:
+            return None
+        finally:
+            for i in large + small:
+                if i: win32gui.DestroyIcon(i)
+            if hbmp: win32gui.DeleteObject(hbmp)
+            if hdc_mem: win32gui.DeleteDC(hdc_mem)
+            if hdc: win32gui.ReleaseDC(0, hdc)
+
+    @staticmethod
+    def _extract_sized(full_path: str, size) -> list:
+        """
+        PrivateExtractIconsW で指定サイズに最も近いアイコンを取り出す (取り出せなければ空のリスト)
+        """
+        try:
+            handle = ctypes.c_void_p()
+            count = ctypes.windll.user32.PrivateExtractIconsW(
+                full_path, 0, size[0], size[1], ctypes.byref(handle), None, 1, 0
+            )
+        except (AttributeError, OSError):
+            return []
+        if count in (0, 0xFFFFFFFF) or not handle.value:
+            return []
+        return [handle.value]
+
+
+class XdgIconBackend:
+    """
+    Linux 向けのバックエンド。.desktop ファイルと freedesktop のアイコンテーマからアイコンを探す
+
+    テーマのフォルダを毎回走査すると遅いため、テーマごとに「アイコン名 -> [(サイズ, ファイル)]」の
+    索引を作って icon_index.json に保存する。索引には走査したフォルダの更新時刻を記録し、
+    次回の起動ではフォルダの更新時刻を確認するだけで再利用する (変わったテーマだけを作り直す)。
+    解決済みのパスはアイコンのファイルそのものなので、IconStore はアイコンの更新も検出できる
+    """
+    INDEX_VERSION = 1
+    IMAGE_EXTENSIONS = (".png", ".xpm")
+    FALLBACK_THEME = "hicolor"
+    # 解決するアイコンの大きさ (ランチャーのボタンに合わせる)
+    PREFERRED_SIZE = 32
+
+    def __init__(self, index_path: str | None = None):
+        self.index_path = index_path
+        self._lock = threading.Lock()
+        self._index = None
+        self._resolved = {}
+
+    # --- 探索するフォルダ ---
+    @staticmethod
+    def data_dirs() -> list:
+        home = os.path.expanduser("~")
+        data_home = os.environ.get("XDG_DATA_HOME") or os.path.join(home, ".local", "share")
+        dirs = os.environ.get("XDG_DATA_DIRS") or "/usr/local/share:/usr/share"
+        return [data_home] + [d for d in dirs.split(os.pathsep) if d]
+
+    @classmethod
+    def icon_base_dirs(cls) -> list:
+        return [os.path.expanduser("~/.icons")] + [os.path.join(d, "icons") for d in cls.data_dirs()]
+
+    @classmethod
+    def current_theme(cls) -> str:
+        """
+        GTK の設定ファイルに書かれたアイコンテーマ名 (見つからなければ hicolor)
+        """
+        config_home = os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config")
+        for name in ("gtk-4.0", "gtk-3.0"):
+            try:
+                with open(os.path.join(config_home, name, "settings.ini"), 'r', encoding='utf-8') as f:
+                    for line in f:
+                        key, _, value = line.partition("=")
+                        if key.strip() == "gtk-icon-theme-name" and value.strip():
+                            return value.strip().strip('"')
+            except OSError:
+                continue
+        return cls.FALLBACK_THEME
+
+    @staticmethod
+    def _mtime(path: str):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    @staticmethod
+    def _read_ini(path: str) -> dict:
+        """
+        index.theme や .desktop の簡単なパーサー {セクション: {キー: 値}}
+        """
+        sections = {}
+        current = None
+        try:
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line or line.startswith("#"):
+                        continue
+                    if line.startswith("[") and line.endswith("]"):
+                        current = sections.setdefault(line[1:-1], {})
+                    elif current is not None and "=" in line:
+                        key, _, value = line.partition("=")
+                        current.setdefault(key.strip(), value.strip())
+        except OSError:
+            pass
+        return sections
+
+    # --- 索引の作成 ---
+    def _scan_theme(self, theme: str) -> dict:
+        """
+        テーマのフォルダを走査して索引を作る
+        """
+        roots = [os.path.join(base, theme) for base in self.icon_base_dirs()]
+        dirs = {root: self._mtime(root) for root in roots}
+        icons = {}
+        inherits = []
+        for root in roots:
+            if dirs[root] is None:
+                continue
+            info = self._read_ini(os.path.join(root, "index.theme"))
+            theme_info = info.get("Icon Theme", {})
+            if not inherits and theme_info.get("Inherits"):
+                inherits = [t.strip() for t in theme_info["Inherits"].split(",") if t.strip()]
+            subdirs = [d for d in theme_info.get("Directories", "").split(",") if d]
+            subdirs += [d for d in theme_info.get("ScaledDirectories", "").split(",") if d and d not in subdirs]
+            for subdir in subdirs:
+                section = info.get(subdir, {})
+                try:
+                    size = int(section.get("Size", "0"))
+                except ValueError:
+                    size = 0
+                folder = os.path.join(root, subdir)
+                mtime = self._mtime(folder)
+                if mtime is None:
+                    continue
+                dirs[folder] = mtime
+                try:
+                    names = os.listdir(folder)
+                except OSError:
+                    continue
+                for file_name in names:
+                    stem, extension = os.path.splitext(file_name)
+                    if extension.lower() in self.IMAGE_EXTENSIONS:
+                        icons.setdefault(stem, []).append([size, os.path.join(folder, file_name)])
+        return {"dirs": dirs, "icons": icons, "inherits": inherits}
+
+    def _scan_flat(self, folders: list, extensions: tuple) -> dict:
+        """
+        pixmaps や applications のようにサブフォルダを持たないフォルダを走査する
+        """
+        dirs = {}
+        files = {}
+        for folder in folders:
+            mtime = self._mtime(folder)
+            dirs[folder] = mtime
+            if mtime is None:
+                continue
+            try:
+                names = os.listdir(folder)
+            except OSError:
+                continue
+            for file_name in names:
+                stem, extension = os.path.splitext(file_name)
+                if extension.lower() in extensions:
+                    files.setdefault(stem, os.path.join(folder, file_name))
+        return {"dirs": dirs, "files": files}
+
+    def _scan_desktop_entries(self) -> dict:
+        """
+        .desktop ファイルを走査し、実行ファイル名とファイル名からアイコン名を引けるようにする
+        """
+        folders = [os.path.join(d, "applications") for d in self.data_dirs()]
+        flat = self._scan_flat(folders, (".desktop",))
+        by_exec = {}
+        by_id = {}
+        for desktop_id, path in flat["files"].items():
+            entry = self._read_ini(path).get("Desktop Entry", {})
+            icon = entry.get("Icon")
+            if not icon:
+                continue
+            by_id[desktop_id] = icon
+            try:
+                exec_args = shlex.split(entry.get("Exec", ""))
+            except ValueError:
+                continue
+            if exec_args:
+                by_exec.setdefault(os.path.basename(exec_args[0]), icon)
+        return {"dirs": flat["dirs"], "by_exec": by_exec, "by_id": by_id}
+
+    @classmethod
+    def _is_fresh(cls, section) -> bool:
+        """
+        索引を作ったときから、記録したフォルダがどれも変わっていないか
+        """
+        if not section:
+            return False
+        return all(cls._mtime(folder) == mtime for folder, mtime in section["dirs"].items())
+
+    def _ensure_index(self) -> dict:
+        """
+        保存済みの索引を読み込み、変更のあった部分だけを作り直す (ロックを保持した状態で呼ぶ)
+        """
+        if self._index is not None:
+            return self._index
+        saved = {}
+        if self.index_path:
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    saved = json.load(f)
+                if saved.get("version") != self.INDEX_VERSION:
+                    saved = {}
+            except (OSError, ValueError):
+                saved = {}
+
+        changed = False
+        themes = saved.get("themes", {})
+        order = []
+        pending = [self.current_theme()]
+        while pending:
+            theme = pending.pop(0)
+            if theme in order:
+                continue
+            order.append(theme)
+            if not self._is_fresh(themes.get(theme)):
+                themes[theme] = self._scan_theme(theme)
+                changed = True
+            pending.extend(themes[theme]["inherits"])
+        if self.FALLBACK_THEME not in order:
+            order.append(self.FALLBACK_THEME)
+            if not self._is_fresh(themes.get(self.FALLBACK_THEME)):
+                themes[self.FALLBACK_THEME] = self._scan_theme(self.FALLBACK_THEME)
+                changed = True
+
+        pixmaps = saved.get("pixmaps")
+        if not self._is_fresh(pixmaps):
+            pixmaps = self._scan_flat([os.path.join(d, "pixmaps") for d in self.data_dirs()], self.IMAGE_EXTENSIONS)
+            changed = True
+        desktop = saved.get("desktop")
+        if not self._is_fresh(desktop):
+            desktop = self._scan_desktop_entries()
+            changed = True
+
+        self._index = {
+            "version": self.INDEX_VERSION,
+            "order": order,
+            "themes": themes,
+            "pixmaps": pixmaps,
+            "desktop": desktop,
+        }
+        if changed and self.index_path:
+            self._save_index()
+        return self._index
+
+    def _save_index(self):
+        try:
+            fd, tmp_path = tempfile.mkstemp(prefix=".icon_index.", dir=os.path.dirname(self.index_path) or ".")
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self._index, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, self.index_path)
+        except OSError:
+            pass
+
+    # --- 検索 ---
+    def lookup_icon(self, icon_name: str, size: int = PREFERRED_SIZE) -> str | None:
+        """
+        アイコン名をファイルのパスに解決する (テーマの継承順に、近い大きさのものを選ぶ)
+        """
+        if os.path.isabs(icon_name):
+            return icon_name if os.path.isfile(icon_name) else None
+        with self._lock:
+            index = self._ensure_index()
+        for theme in index["order"]:
+            candidates = index["themes"].get(theme, {}).get("icons", {}).get(icon_name)
+            if candidates:
+                # 要求以上で最も小さいもの、なければ最も大きいもの
+                larger = [c for c in candidates if c[0] >= size]
+                return min(larger)[1] if larger else max(candidates)[1]
+        return index["pixmaps"]["files"].get(icon_name)
+
+    def resolve(self, path: str) -> str:
+        """
+        設定のパス (コマンド、実行ファイル、.desktop ファイル) をアイコンのファイルに解決する
+        見つからなければ元のパスを返す
+        """
+        resolved = self._resolved.get(path)
+        if resolved is not None:
+            return resolved
+        resolved = path
+        try:
+            args = split_command(path)
+        except ValueError:
+            args = []
+        if args:
+            executable = args[0]
+            stem = os.path.splitext(os.path.basename(executable))[0]
+            if executable.endswith(".desktop"):
+                icon_name = self._read_ini(executable).get("Desktop Entry", {}).get("Icon")
+                if icon_name is None:
+                    with self._lock:
+                        icon_name = self._ensure_index()["desktop"]["by_id"].get(stem)
+            else:
+                with self._lock:
+                    desktop = self._ensure_index()["desktop"]
+                icon_name = desktop["by_exec"].get(os.path.basename(executable)) or stem
+            icon_file = self.lookup_icon(icon_name) if icon_name else None
+            if icon_file is not None:
+                resolved = icon_file
+        self._resolved[path] = resolved
+        return resolved
+
+    def extract(self, full_path: str, size) -> bytes | None:
+        """
+        アイコンのファイルを読み込み、指定サイズの RGBA のバイト列を返す
+        ライブラリが見つからない場合は ImportError を送出する
+        """
+        if os.path.splitext(full_path)[1].lower() not in self.IMAGE_EXTENSIONS:
+            return None
+        Image = lazy_import("PIL.Image")
+        try:
+            with Image.open(full_path) as img:
+                img = img.convert("RGBA")
+                if img.size != tuple(size):
+                    img = img.resize(size, Image.Resampling.LANCZOS)
+                return img.tobytes()
+        except Exception:
+            return None
+
+
+def default_icon_backend(index_path: str | None = None, resolver=None):
+    """
+    実行中の OS に合ったアイコンのバックエンド
+    """
+    if os.name == "nt":
+        return Win32IconBackend(resolver)
+    return XdgIconBackend(index_path)
+
+
+# ディスクキャッシュには実行ファイルごとにこの大きさで1枚だけ保持し、各サイズはここから縮小する
+ICON_MASTER_SIZE = (64, 64)
+
+
+def bgra_to_rgba(data: bytes, size) -> bytes:
+    """
+    GDI で描画した BGRA (アルファ乗算済み) を、アルファ乗算なしの RGBA に変換する
+    アルファがすべて 0 のもの (アルファチャンネルのない古い形式のアイコン) は不透明として扱う
+    """
+    Image = lazy_import("PIL.Image")
+    if not any(data[3::4]):
+        return Image.frombuffer('RGB', tuple(size), data, 'raw', 'BGRX', 0, 1).convert('RGBA').tobytes()
+    # Pillow の "BGRa" は乗算済みのアルファを戻しながら並べ替える
+    return Image.frombuffer('RGBA', tuple(size), data, 'raw', 'BGRa', 0, 1).tobytes()
+
+
+def scale_icon_pixels(pixels: bytes, source_size, size) -> bytes:
+    """
+    RGBA のピクセルを指定サイズに縮小する
+    """
+    Image = lazy_import("PIL.Image")
+    img = Image.frombuffer('RGBA', tuple(source_size), pixels, 'raw', 'RGBA', 0, 1)
+    return img.resize(tuple(size), Image.Resampling.LANCZOS).tobytes()
+
+
+class IconImageCache:
+    """
+    作成済みの Tk 画像をメモリの上限付きで保持する LRU キャッシュ (メインスレッド専用)
+
+    キーは (解決済みパス, サイズ)、大きさは RGBA のバイト数で数える。
+    上限を超えたら最も長く使われていないものから捨てる。捨てた画像も、
+    ボタンが参照している間は表示され続け、参照がなくなった時点で解放される。
+    ヒット・ミス・追い出しの回数は stats() で確認できる (上限の調整用)
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        # キー -> (画像, バイト数)
+        self._images = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._images)
+
+    def get(self, key):
+        entry = self._images.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._images.move_to_end(key)
+        return entry[0]
+
+    def peek(self, key):
+        """
+        ヒット・ミスを数えずに取得する
+        """
+        entry = self._images.get(key)
+        if entry is None:
+            return None
+        self._images.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, image, nbytes: int):
+        old = self._images.pop(key, None)
+        if old is not None:
+            self.total_bytes -= old[1]
+        self._images[key] = (image, nbytes)
+        self.total_bytes += nbytes
+        while self.total_bytes > self.max_bytes and len(self._images) > 1:
+            _, (_, evicted_bytes) = self._images.popitem(last=False)
+            self.total_bytes -= evicted_bytes
+            self.evictions += 1
+
+    def retain(self, full_paths: set):
+        """
+        full_paths に含まれないパスの画像を捨てる (設定から消えたアプリの分)
+        """
+        for key in [key for key in self._images if key[0] not in full_paths]:
+            self.total_bytes -= self._images.pop(key)[1]
+
+    def clear(self):
+        self._images.clear()
+        self.total_bytes = 0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._images),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def describe(self) -> str:
+        stats = self.stats()
+        lookups = stats["hits"] + stats["misses"]
+        ratio = stats["hits"] / lookups * 100 if lookups else 0.0
+        return (
+            f"アイコンキャッシュ: {stats['entries']} 件 "
+            f"{stats['bytes'] / 1024:.0f} / {stats['max_bytes'] / 1024:.0f} KB, "
+            f"ヒット {stats['hits']} ミス {stats['misses']} ({ratio:.1f}%), 追い出し {stats['evictions']}"
+        )
+
+
+class IconStore:
+    """
+    描画済みアイコン(RGBA)を1つのパック形式ファイルに永続化するキャッシュ
+
+    キーは (解決済みパス, 要求サイズ)。各エントリには実行ファイルのサイズと更新時刻を
+    記録し、一致しない場合のみバックエンドで再抽出する。
+    ファイル形式: ヘッダ (magic, version, 件数) に続いて、
+    エントリヘッダ (パス長, サイズ, 更新時刻, 幅, 高さ, データ長, CRC32) + パス + ピクセル
+    """
+    MAGIC = b"LICN"
+    VERSION = 1
+    _HEADER = struct.Struct("<4sHHI")
+    _ENTRY = struct.Struct("<HqqHHII")
+    # 合計サイズがこの割合を超えたら、保存時に今回使われなかったエントリを捨てる
+    COMPACT_RATIO = 0.75
+
+    def __init__(self, path: str, backend, max_bytes: int = 32 * 1024 * 1024):
+        self.path = path
+        self.backend = backend
+        self.max_bytes = max_bytes
+        # (解決済みパス, 幅, 高さ) -> [ファイルサイズ, 更新時刻, ピクセル, 未検証のCRC, 今回使用したか]
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._dirty = False
+        # 複数のワーカースレッドから同時に呼ばれるため、エントリの操作は排他する
+        self._lock = threading.Lock()
+        # ファイルの読み込みは起動を遅らせないよう、最初に使われるときに行う
+        self._loaded = False
+
+    @staticmethod
+    def _file_signature(full_path: str):
+        """
+        実行ファイルの (サイズ, 更新時刻) を返す。存在しない場合は (-1, -1)
+        """
+        try:
+            st = os.stat(full_path)
+            return st.st_size, st.st_mtime_ns
+        except OSError:
+            return -1, -1
+
+    def _load(self):
+        """
+        キャッシュファイルを1回の読み込みで展開する (ロックを保持した状態で呼ぶ)
+        壊れている場合はすべて破棄し、次回の保存で作り直す
+        """
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return
+
+        try:
+            magic, version, _, count = self._HEADER.unpack_from(data, 0)
+            if magic != self.MAGIC or version != self.VERSION:
+                raise ValueError("unknown icon cache format")
+            offset = self._HEADER.size
+            for _ in range(count):
+                path_len, file_size, mtime_ns, w, h, data_len, crc = self._ENTRY.unpack_from(data, offset)
+                offset += self._ENTRY.size
+                full_path = data[offset:offset + path_len].decode('utf-8')
+                offset += path_len
+                pixels = data[offset:offset + data_len]
+                offset += data_len
+                # 途中で切れたファイルはここで検出される
+                if len(pixels) != data_len or (data_len and data_len != w * h * 4):
+                    raise ValueError("truncated icon cache")
+                self._entries[(full_path, w, h)] = [file_size, mtime_ns, pixels, crc, False]
+                self._total_bytes += data_len
+        except (struct.error, ValueError, UnicodeDecodeError):
+            self._entries.clear()
+            self._total_bytes = 0
+            self._dirty = True
+
+    def get(self, full_path: str, size) -> bytes | None:
+        """
+        アイコンの RGBA ピクセルを返す。キャッシュが古い場合のみ再抽出する
+        """
+        key = (full_path, size[0], size[1])
+        file_size, mtime_ns = self._file_signature(full_path)
+
+        with self._lock:
+            self._load()
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == file_size and entry[1] == mtime_ns:
+                pixels, crc = entry[2], entry[3]
+                # CRC は読み込み時ではなく、初めて使うときに検証する
+                if crc is None or zlib.crc32(pixels) == crc:
+                    entry[3] = None
+                    entry[4] = True
+                    self._entries.move_to_end(key)
+                    return pixels or None
+
+        # 抽出はロックの外で行い、他のワーカーを待たせない
+        pixels = self.backend.extract(full_path, size) or b""
+        with self._lock:
+            self._put(key, file_size, mtime_ns, pixels)
+        return pixels or None
+
+    def _put(self, key, file_size, mtime_ns, pixels: bytes):
+        """
+        エントリを追加し、上限を超えた分を古い順に追い出す
+        アイコンが取得できなかった結果も空データとして記録し、再抽出を避ける
+        """
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._total_bytes -= len(old[2])
+        self._entries[key] = [file_size, mtime_ns, pixels, None, True]
+        self._total_bytes += len(pixels)
+        self._dirty = True
+
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self._total_bytes -= len(evicted[2])
+
+    def _compact(self):
+        """
+        今回の起動で一度も使われなかったエントリを破棄する (ロックを保持した状態で呼ぶ)
+        表示しなかったカテゴリのアイコンも捨てるため、保存時に上限に近づいたときだけ行う
+        """
+        unused = [key for key, entry in self._entries.items() if not entry[4]]
+        for key in unused:
+            self._total_bytes -= len(self._entries.pop(key)[2])
+        if unused:
+            self._dirty = True
+
+    def flush(self):
+        """
+        変更があればキャッシュファイルを書き出す
+        一時ファイルに書いてから置き換えるため、途中で落ちても壊れたファイルは残らない
+        """
+        with self._lock:
+            if self._total_bytes > self.max_bytes * self.COMPACT_RATIO:
+                self._compact()
+            if not self._dirty:
+                return
+
+            chunks = [self._HEADER.pack(self.MAGIC, self.VERSION, 0, len(self._entries))]
+            for (full_path, w, h), (file_size, mtime_ns, pixels, _, _) in self._entries.items():
+                encoded = full_path.encode('utf-8')
+                chunks.append(self._ENTRY.pack(
+                    len(encoded), file_size, mtime_ns, w, h, len(pixels), zlib.crc32(pixels)
+                ))
+                chunks.append(encoded)
+                chunks.append(pixels)
+            self._dirty = False
+
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(b"".join(chunks))
+            os.replace(tmp_path, self.path)
+        except OSError:
+            self._dirty = True
+            raise
+
+# --- 起動履歴 ---
+class UsageStore:
+    """
+    アプリの起動履歴を SQLite (usage.db) に記録し、frecency のスコアを管理する
+
+    スコアは半減期 HALF_LIFE_DAYS で減衰する起動回数で、比較しやすいよう
+    log2(スコア) + 時刻 / 半減期 の形 (rank) で保持する。この形では時間が経っても
+    値を更新する必要がなく、起動のたびに1件だけ O(1) で更新できる。
+    書き込みは専用のスレッドが FLUSH_SECONDS ごとにまとめて行い、UI を待たせない。
+    生の履歴は RETENTION_DAYS を過ぎたら削除し、スコアの表だけを残すため、
+    何年分の履歴があっても読み込みは速い。HALF_LIFE_DAYS を変更した場合は、
+    残っている履歴からスコアを計算し直す。
+    スコアの表には最後に起動したときのカテゴリ名とアプリ名も残し、分割された設定でも
+    「最近使ったアプリ」や名前での起動に必要なカテゴリだけを読み込めるようにする。
+    """
+    HALF_LIFE_DAYS = 7.0
+    RETENTION_DAYS = 180
+    COMPACT_INTERVAL_DAYS = 7
+    FLUSH_SECONDS = 2.0
+    # スコアが 2^-20 を下回ったものは削除する
+    FORGET_BELOW = -20.0
+
+    def __init__(self, path: str, on_loaded=None):
+        self.path = path
+        # on_loaded() はスコアの読み込みが終わったときに書き込みスレッドから呼ばれる
+        self.on_loaded = on_loaded
+        # キー(アプリのパス) -> [rank, 起動回数, 最後に起動した時刻, カテゴリ名, アプリ名]
+        self._scores = {}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="usage-store", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def bump_rank(cls, rank, now: float) -> float:
+        """
+        rank に時刻 now の起動を1回加えた値を返す (rank が None なら初回)
+        """
+        t = now / (cls.HALF_LIFE_DAYS * 86400)
+        if rank is None:
+            return t
+        return math.log2(2 ** min(rank - t, 1000.0) + 1) + t
+
+    def record(self, key: str, category: str | None = None, name: str | None = None):
+        """
+        起動を記録する (すぐに戻り、書き込みはバックグラウンドで行う)
+        カテゴリ名とアプリ名が分からない場合は、前回の記録を引き継ぐ
+        """
+        self._queue.put((time.time(), key, category, name))
+
+    def location(self, key: str):
+        """
+        最後に起動したときの (カテゴリ名, アプリ名)。記録がなければ (None, None)
+        """
+        with self._lock:
+            entry = self._scores.get(key)
+        return (entry[3], entry[4]) if entry else (None, None)
+
+    def categories_named(self, name: str) -> list:
+        """
+        その名前のアプリを起動したことのあるカテゴリ (スコアの高い順)
+        """
+        with self._lock:
+            ranked = sorted((entry for entry in self._scores.values() if entry[4] == name),
+                            key=lambda entry: entry[0], reverse=True)
+        return [entry[3] for entry in ranked if entry[3] is not None]
+
+    def top(self, limit: int | None = None) -> list:
+        """
+        スコアの高い順のキーのリスト
+        """
+        with self._lock:
+            ranked = sorted(self._scores.items(), key=lambda item: item[1][0], reverse=True)
+        keys = [key for key, _ in ranked]
+        return keys[:limit] if limit is not None else keys
+
+    def close(self):
+        """
+        書き込み待ちの履歴を書き出してスレッドを終了する
+        """
+        self._queue.put(None)
+        self._thread.join(timeout=5.0)
+
+    def _run(self):
+        try:
+            sqlite3 = lazy_import("sqlite3")
+            conn = sqlite3.connect(self.path)
+            self._setup(conn)
+        except Exception:
+            # 履歴が使えなくても起動には影響させず、メモリ上だけで集計する
+            conn = None
+        if self.on_loaded is not None:
+            self.on_loaded()
+
+        pending = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = ()
+            if item:
+                now, key, category, name = item
+                with self._lock:
+                    entry = self._scores.get(key)
+                    rank = self.bump_rank(entry[0] if entry else None, now)
+                    count = (entry[1] if entry else 0) + 1
+                    if category is None and entry is not None:
+                        category, name = entry[3], entry[4]
+                    self._scores[key] = [rank, count, now, category, name]
+                pending.append((now, key, rank, count, category, name))
+                if deadline is None:
+                    deadline = time.monotonic() + self.FLUSH_SECONDS
+            if pending and (item is None or time.monotonic() >= deadline):
+                self._flush(conn, pending)
+                pending = []
+                deadline = None
+            if item is None:
+                break
+        if conn is not None:
+            conn.close()
+
+    def _setup(self, conn):
+        """
+        表を作成してスコアを読み込み、必要なら古い履歴を削除する
+        """
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS launches (ts REAL NOT NULL, key TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS scores (
+                key TEXT PRIMARY KEY, rank REAL NOT NULL, count INTEGER NOT NULL, last_ts REAL NOT NULL,
+                category TEXT, name TEXT
+            );
+            CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value REAL NOT NULL);
+        """)
+        # カテゴリ名とアプリ名の列がない以前の usage.db には列を追加する
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(scores)")}
+        with conn:
+            for column in ("category", "name"):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE scores ADD COLUMN {column} TEXT")
+        row = conn.execute("SELECT value FROM meta WHERE name = 'half_life_days'").fetchone()
+        if row is not None and row[0] != self.HALF_LIFE_DAYS:
+            self._rebuild_scores(conn)
+        elif row is None:
+            with conn:
+                conn.execute("INSERT INTO meta (name, value) VALUES ('half_life_days', ?)", (self.HALF_LIFE_DAYS,))
+        with self._lock:
+            for key, rank, count, last_ts, category, name in conn.execute(
+                    "SELECT key, rank, count, last_ts, category, name FROM scores"):
+                self._scores[key] = [rank, count, last_ts, category, name]
+
+        now = time.time()
+        row = conn.execute("SELECT value FROM meta WHERE name = 'compacted_at'").fetchone()
+        if row is None or now - row[0] > self.COMPACT_INTERVAL_DAYS * 86400:
+            self._compact(conn, now)
+
+    def _rebuild_scores(self, conn):
+        """
+        半減期が変わったときに、残っている履歴からスコアを計算し直す
+        (保存期間を過ぎて削除された起動は数えられないため、起動回数もその分だけ減る)
+        """
+        locations = {key: (category, name) for key, category, name in
+                     conn.execute("SELECT key, category, name FROM scores")}
+        scores = {}
+        for ts, key in conn.execute("SELECT ts, key FROM launches ORDER BY ts"):
+            entry = scores.get(key)
+            scores[key] = (self.bump_rank(entry[0] if entry else None, ts), (entry[1] if entry else 0) + 1, ts)
+        with conn:
+            conn.execute("DELETE FROM scores")
+            conn.executemany(
+                "INSERT INTO scores (key, rank, count, last_ts, category, name) VALUES (?, ?, ?, ?, ?, ?)",
+                [(key, rank, count, ts, *locations.get(key, (None, None)))
+                 for key, (rank, count, ts) in scores.items()]
+            )
+            conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('half_life_days', ?)",
+                         (self.HALF_LIFE_DAYS,))
+
+    def _compact(self, conn, now: float):
+        """
+        保存期間を過ぎた履歴と、スコアが十分に小さくなったアプリを削除する
+        """
+        forget_rank = now / (self.HALF_LIFE_DAYS * 86400) + self.FORGET_BELOW
+        with conn:
+            conn.execute("DELETE FROM launches WHERE ts < ?", (now - self.RETENTION_DAYS * 86400,))
+            conn.execute("DELETE FROM scores WHERE rank < ?", (forget_rank,))
+            conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('compacted_at', ?)", (now,))
+        conn.execute("VACUUM")
+        with self._lock:
+            for key in [key for key, entry in self._scores.items() if entry[0] < forget_rank]:
+                del self._scores[key]
+
+    @staticmethod
+    def _flush(conn, pending):
+        """
+        まとめた履歴を1回のトランザクションで書き込む
+        """
+        if conn is None:
+            return
+        try:
+            with conn:
+                conn.executemany("INSERT INTO launches (ts, key) VALUES (?, ?)",
+                                 [(now, key) for now, key, _, _, _, _ in pending])
+                conn.executemany(
+                    "INSERT OR REPLACE INTO scores (key, rank, count, last_ts, category, name) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(key, rank, count, now, category, name) for now, key, rank, count, category, name in pending]
+                )
+        except Exception:
+            pass
+
+# --- アプリの項目 ---
+class ConfigSchemaError(ValueError):
+    """
+    config.json の内容が設定の形式に合わない
+    """
+
+
+class AppEntry(Mapping):
+    """
+    アプリの1項目 ({"name": ..., "path": ..., "shell": ...}) を表す読み取り専用のオブジェクト
+
+    辞書と同じく app_info.get("path") や app_info["name"] で参照できるが、__slots__ で
+    値だけを持つため、10万件では1件あたりのメモリが辞書より3割ほど少ない (大半は文字列自体)。
+    名前とパスはほとんどが重複しないため intern はしない (intern の表の分だけかえって増える)。
+    キーの並び (全項目で共有するタプル) と未知のキーも持つため、JSON にそのまま戻せる。
+    項目は書き換えずに置き換えるため、複製 (copy / deepcopy) は同じオブジェクトを返す。
+    編集していない項目は新旧の設定で同じオブジェクトになるため、オブジェクト自体を項目の ID として
+    差分の判定に使える (リストの比較は同じオブジェクトなら値を比べない)
+    """
+    __slots__ = ("name", "path", "shell", "_keys", "_extra")
+    FIELDS = ("name", "path", "shell")
+    # 名前のない項目の表示名
+    UNNAMED = "名称未設定"
+    # キーの並び -> 共有するタプル
+    _key_orders = {}
+
+    def __init__(self, name: str | None = None, path: str | None = None, shell=None, keys=None, extra=None):
+        self.name = name
+        self.path = path
+        self.shell = shell
+        if keys is None:
+            keys = tuple(key for key, value in (("name", name), ("path", path), ("shell", shell)) if value is not None)
+        self._keys = self._shared_keys(keys)[0]
+        # name / path / shell 以外のキー (なければ None)
+        self._extra = extra or None
+
+    @classmethod
+    def _shared_keys(cls, keys: tuple):
+        """
+        キーの並びを共有するタプルと、name / path / shell 以外のキーを含むかどうか
+        """
+        shared = cls._key_orders.get(keys)
+        if shared is None:
+            shared = cls._key_orders[keys] = (keys, any(key not in cls.FIELDS for key in keys))
+        return shared
+
+    @classmethod
+    def from_json(cls, value) -> "AppEntry":
+        """
+        config.json のアプリの項目から作る (形式が正しくなければ ConfigSchemaError を送出する)
+        """
+        # AppEntry への isinstance は ABC の確認で遅いため、辞書かどうかを先に調べる
+        if value.__class__ is not dict:
+            if isinstance(value, AppEntry):
+                return value
+            if not isinstance(value, dict):
+                raise ConfigSchemaError(f"アプリの項目がオブジェクトではありません: {value!r}")
+        name = value.get("name")
+        path = value.get("path")
+        shell = value.get("shell")
+        if not (name is None or name.__class__ is str):
+            raise ConfigSchemaError(f"\"name\" が文字列ではありません: {name!r}")
+        if path.__class__ is not str:
+            if "path" not in value:
+                raise ConfigSchemaError(f"\"path\" がありません: {value!r}")
+            raise ConfigSchemaError(f"\"path\" が文字列ではありません: {path!r}")
+        if "shell" in value and shell.__class__ is not bool:
+            raise ConfigSchemaError(f"\"shell\" は true か false にしてください: {shell!r}")
+        keys, has_extra = cls._shared_keys(tuple(value))
+        extra = {key: item for key, item in value.items() if key not in cls.FIELDS} if has_extra else None
+        return cls(name, path, shell, keys, extra)
+
+    @classmethod
+    def list_from_json(cls, apps, where: str = "", skipped: list | None = None) -> list:
+        """
+        カテゴリのアプリのリストを変換する
+        形式の正しくない項目は読み飛ばし、理由を skipped に追加する (1件のために設定全体を捨てない)
+        """
+        if not isinstance(apps, list):
+            raise ConfigSchemaError(f"{where}アプリのリストではありません")
+        from_json = cls.from_json
+        try:
+            return [from_json(app_info) for app_info in apps]
+        except ConfigSchemaError:
+            pass
+        entries = []
+        for index, app_info in enumerate(apps):
+            try:
+                entries.append(from_json(app_info))
+            except ConfigSchemaError as e:
+                if skipped is not None:
+                    skipped.append(f"{where}{index + 1}番目: {e}")
+        return entries
+
+    def snapshot_row(self) -> tuple:
+        """
+        StartupSnapshot に保存する形 (形式の確認と変換を済ませた値のタプル)
+        """
+        return (self.name, self.path, self.shell, self._keys, self._extra)
+
+    @classmethod
+    def list_from_snapshot(cls, rows: list) -> list:
+        """
+        snapshot_row の行のリストから、形式を確認せずに作る
+        (件数が多いため __init__ を通さずに値を設定し、キーの並びの共有も1回の辞書の参照で済ませる)
+        """
+        new = object.__new__
+        key_orders = cls._key_orders
+        entries = []
+        append = entries.append
+        for name, path, shell, keys, extra in rows:
+            shared = key_orders.get(keys)
+            if shared is None:
+                shared = cls._shared_keys(keys)
+            entry = new(cls)
+            entry.name = name
+            entry.path = path
+            entry.shell = shell
+            entry._keys = shared[0]
+            entry._extra = extra
+            append(entry)
+        return entries
+
+    # --- Mapping ---
+    def __getitem__(self, key):
+        if key in self._keys:
+            return self._extra[key] if key not in self.FIELDS else getattr(self, key)
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        return self[key] if key in self._keys else default
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __eq__(self, other):
+        if other.__class__ is AppEntry:
+            return (self.name == other.name and self.path == other.path and self.shell == other.shell
+                    and self._keys == other._keys and self._extra == other._extra)
+        if isinstance(other, Mapping):
+            return self.to_json() == dict(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __repr__(self):
+        return f"AppEntry({self.to_json()!r})"
+
+    @property
+    def label(self) -> str:
+        """
+        画面に表示する名前
+        """
+        return self.name or self.UNNAMED
+
+    def to_json(self) -> dict:
+        return {key: self[key] for key in self._keys}
+
+
+def app_label(app_info) -> str:
+    """
+    アプリの項目の表示名 (検索結果などの辞書も受け付ける)
+    """
+    if app_info.__class__ is AppEntry:
+        return app_info.label
+    return app_info.get("name") or AppEntry.UNNAMED
+
+
+def json_default(value):
+    """
+    json.dumps の default: AppEntry を辞書として書き出す
+    """
+    if isinstance(value, AppEntry):
+        return value.to_json()
+    raise TypeError(f"{type(value).__name__} は JSON にできません")
+
+# --- 分割された設定 ---
+def _file_signature(path: str):
+    """
+    ファイルの (サイズ, 更新時刻)。存在しない場合は None
+    """
+    try:
+        st = os.stat(path)
+        return st.st_size, st.st_mtime_ns
+    except OSError:
+        return None
+
+
+class SplitConfig(MutableMapping):
+    """
+    カテゴリごとに別のファイルに分けられた設定 (カテゴリ名 -> アプリのリスト)
+
+    config.json には索引だけを書き、カテゴリの値にアプリのリストの代わりに
+    ファイルのパス (config.json からの相対パス) を書くと、そのファイルを読み込む。
+    "$include_dir" にフォルダを指定すると、索引にないそのフォルダの *.json も
+    ファイル名をカテゴリ名として末尾に加え、新しいカテゴリもそのフォルダに保存する。
+        {"$include_dir": "categories", "仕事用ツール": "categories/work.json", "ブラウザ": [...]}
+    起動時には索引だけを読み、各カテゴリのファイルは初めて参照されたときに解析する。
+    保存時は読み込んだ後に変更されたカテゴリのファイルだけを書き直す。
+    読み込みと保存は別のスレッドから行われるため、カテゴリの操作は排他する
+    """
+    INCLUDE_DIR_KEY = "$include_dir"
+    _UNSAFE_CHARS = '<>:"/\\|?*'
+
+    def __init__(self, base_dir: str, include_dir: str | None = None):
+        self.base_dir = base_dir
+        self.include_dir = include_dir
+        self._lock = threading.RLock()
+        self._order = []
+        # カテゴリ名 -> アプリのリスト (未読み込みは None)
+        self._apps = {}
+        # カテゴリ名 -> ファイルの相対パス (config.json に直接書かれたカテゴリにはない)
+        self._sources = {}
+        # カテゴリ名 -> 索引の作成時または保存時のファイルの (サイズ, 更新時刻)
+        self._signatures = {}
+        # カテゴリ名 -> 読み込み時または保存時の JSON (変更の検出に使う)
+        self._saved_text = {}
+        # 削除・改名で使われなくなったファイル (保存時に include_dir 内のものだけ削除する)
+        self._orphans = set()
+        # カテゴリ名 -> 読み込めなかった理由
+        self.load_errors = {}
+
+    @classmethod
+    def is_split_document(cls, document) -> bool:
+        return isinstance(document, dict) and (
+            cls.INCLUDE_DIR_KEY in document or any(isinstance(value, str) for value in document.values())
+        )
+
+    @classmethod
+    def from_document(cls, document: dict, base_dir: str):
+        """
+        config.json の内容から索引を作る (カテゴリのファイルはまだ読み込まない)
+        """
+        config = cls(base_dir, document.get(cls.INCLUDE_DIR_KEY))
+        for name, value in document.items():
+            if name == cls.INCLUDE_DIR_KEY:
+                continue
+            config._order.append(name)
+            if isinstance(value, str):
+                config._sources[name] = value
+                config._apps[name] = None
+                config._signatures[name] = _file_signature(config._full_path(value))
+            else:
+                config._apps[name] = value
+        if config.include_dir:
+            referenced = {os.path.normcase(os.path.normpath(path)) for path in config._sources.values()}
+            folder = config._full_path(config.include_dir)
+            try:
+                file_names = sorted(os.listdir(folder))
+            except OSError:
+                file_names = []
+            for file_name in file_names:
+                stem, extension = os.path.splitext(file_name)
+                relative = os.path.join(config.include_dir, file_name)
+                if (extension.lower() != ".json" or stem in config._apps
+                        or os.path.normcase(os.path.normpath(relative)) in referenced):
+                    continue
+                config._order.append(stem)
+                config._sources[stem] = relative
+                config._apps[stem] = None
+                config._signatures[stem] = _file_signature(config._full_path(relative))
+        return config
+
+    def _full_path(self, relative: str) -> str:
+        return os.path.join(self.base_dir, relative)
+
+    # --- MutableMapping ---
+    def __getitem__(self, name):
+        with self._lock:
+            apps = self._apps[name]
+            if apps is None:
+                apps = self._apps[name] = self._load_category(name)
+            return apps
+
+    def __setitem__(self, name, apps):
+        with self._lock:
+            if name not in self._apps:
+                self._order.append(name)
+                if self.include_dir:
+                    self._sources[name] = self._new_source(name)
+            self._apps[name] = apps
+
+    def __delitem__(self, name):
+        with self._lock:
+            del self._apps[name]
+            self._order.remove(name)
+            source = self._sources.pop(name, None)
+            if source is not None:
+                self._orphans.add(source)
+            self._signatures.pop(name, None)
+            self._saved_text.pop(name, None)
+
+    def __iter__(self):
+        return iter(list(self._order))
+
+    def __len__(self):
+        return len(self._order)
+
+    def __contains__(self, name):
+        return name in self._apps
+
+    def __deepcopy__(self, memo):
+        # 読み込み済みのカテゴリだけを複製し、未読み込みのものは未読み込みのまま残す
+        with self._lock:
+            clone = SplitConfig(self.base_dir, self.include_dir)
+            clone._order = list(self._order)
+            clone._apps = {name: copy.deepcopy(apps, memo) for name, apps in self._apps.items()}
+            clone._sources = dict(self._sources)
+            clone._signatures = dict(self._signatures)
+            clone._saved_text = dict(self._saved_text)
+            clone._orphans = set(self._orphans)
+            clone.load_errors = dict(self.load_errors)
+            return clone
+
+    # --- カテゴリのファイル ---
+    def _load_category(self, name: str) -> list:
+        """
+        カテゴリのファイルを解析する (ロックを保持した状態で呼ぶ)
+        読み込めない場合は空のリストとし、理由を load_errors に残す
+        """
+        path = self._full_path(self._sources[name])
+        skipped = []
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                apps = AppEntry.list_from_json(json.load(f), skipped=skipped)
+        except (OSError, ValueError) as e:
+            self.load_errors[name] = f"{path}: {e}"
+            apps = []
+        if skipped:
+            # 読み飛ばした項目は、このカテゴリを編集して保存するまでファイルに残る
+            self.load_errors[name] = f"{path}: 形式の正しくない項目を読み飛ばしました\n" + "\n".join(skipped[:10])
+        # 読み込めなかった場合も、変更しない限り空のリストで上書きしない
+        self._saved_text[name] = self._dump(apps)
+        return apps
+
+    def _new_source(self, name: str) -> str:
+        """
+        include_dir に新しいカテゴリのファイル名を割り当てる
+        """
+        stem = "".join("_" if c in self._UNSAFE_CHARS else c for c in name).strip(" .") or "category"
+        used = {os.path.normcase(path) for path in self._sources.values()}
+        candidate, counter = stem, 1
+        while True:
+            relative = os.path.join(self.include_dir, candidate + ".json")
+            if os.path.normcase(relative) not in used and (
+                    relative in self._orphans or not os.path.exists(self._full_path(relative))):
+                return relative
+            counter += 1
+            candidate = f"{stem}_{counter}"
+
+    @staticmethod
+    def _dump(apps) -> str:
+        return json.dumps(apps, indent=2, ensure_ascii=False, default=json_default)
+
+    def is_loaded(self, name) -> bool:
+        return self._apps.get(name) is not None
+
+    def peek(self, name):
+        """
+        読み込み済みのカテゴリのアプリのリスト (未読み込みのものは読み込まずに None)
+        フォルダのカテゴリは索引に直接書かれるため、常に読み込み済みになる
+        """
+        return self._apps.get(name)
+
+    def loaded_values(self) -> list:
+        """
+        読み込み済みのカテゴリのアプリのリスト (未読み込みのものは読み込まない)
+        """
+        with self._lock:
+            return [apps for apps in self._apps.values() if apps is not None]
+
+    def loaded_items(self) -> list:
+        """
+        読み込み済みのカテゴリの (カテゴリ名, アプリのリスト) のリスト
+        """
+        with self._lock:
+            return [(name, self._apps[name]) for name in self._order if self._apps[name] is not None]
+
+    def read(self, name) -> list:
+        """
+        カテゴリのアプリのリスト。未読み込みのカテゴリはファイルを解析して返すが、保持はしない
+        (検索の索引の作成のように全カテゴリを一度だけ見る処理で、遅延読み込みを無効にしないため)
+        読み込めない場合は空のリスト (理由は表示のために読み込んだときに load_errors に残る)
+        """
+        with self._lock:
+            apps = self._apps.get(name)
+            source = self._sources.get(name)
+        if apps is not None or source is None:
+            return apps or []
+        try:
+            with open(self._full_path(source), 'r', encoding='utf-8') as f:
+                return AppEntry.list_from_json(json.load(f))
+        except (OSError, ValueError):
+            return []
+
+    def same_category(self, name, other, other_name):
+        """
+        どちらも未読み込みで同じファイル (同じ更新時刻) を指していれば True
+        読み込まずに判断できなければ None
+        """
+        if not isinstance(other, SplitConfig) or self.is_loaded(name) or other.is_loaded(other_name):
+            return None
+        source = self._sources.get(name)
+        if source is None or self._full_path(source) != other._full_path(other._sources.get(other_name, "")):
+            return None
+        if self._signatures.get(name) != other._signatures.get(other_name):
+            return None
+        return True
+
+    def derive(self, entries: list):
+        """
+        編集結果から新しい SplitConfig を作る (このオブジェクトは変更しない)
+        entries は (カテゴリ名, 元のカテゴリ名 or None, 編集したアプリのリスト or None) のリスト。
+        ファイルの参照先は元のカテゴリから引き継ぎ、include_dir 内のカテゴリ名から付けた
+        ファイルは、名前が変わった場合に新しい名前のファイルへ移す
+        """
+        with self._lock:
+            clone = SplitConfig(self.base_dir, self.include_dir)
+            include_dir = os.path.normpath(self.include_dir) if self.include_dir else None
+            renamed = []
+            for name, origin, apps in entries:
+                clone._order.append(name)
+                clone._apps[name] = apps
+                if origin is None:
+                    # フォルダのカテゴリはファイルに書き出さない
+                    if not isinstance(apps, FolderApps):
+                        renamed.append(name)
+                    continue
+                if apps is None:
+                    clone._apps[name] = self._apps[origin]
+                source = self._sources.get(origin)
+                if source is None:
+                    if clone._apps[name] is None:
+                        clone._apps[name] = self[origin]
+                    continue
+                named_file = (include_dir is not None
+                              and os.path.dirname(os.path.normpath(source)) == include_dir
+                              and os.path.splitext(os.path.basename(source))[0] == origin)
+                if name != origin and named_file:
+                    # 新しいファイルに書き出すため、中身を読み込んでおく
+                    if clone._apps[name] is None:
+                        clone._apps[name] = self[origin]
+                    renamed.append(name)
+                    continue
+                clone._sources[name] = source
+                clone._signatures[name] = self._signatures.get(origin)
+                if origin in self._saved_text:
+                    clone._saved_text[name] = self._saved_text[origin]
+
+            # 使われなくなったファイルを先に決めてから、新しいファイル名を割り当てる
+            in_use = set(clone._sources.values())
+            clone._orphans = set(self._orphans) | {path for path in self._sources.values() if path not in in_use}
+            if self.include_dir:
+                for name in renamed:
+                    clone._sources[name] = clone._new_source(name)
+            return clone
+
+    def pending_writes(self) -> list:
+        """
+        保存が必要なカテゴリの (カテゴリ名, ファイルのパス, JSON) のリスト
+        """
+        writes = []
+        with self._lock:
+            for name in self._order:
+                apps = self._apps[name]
+                source = self._sources.get(name)
+                if source is None or apps is None:
+                    continue
+                text = self._dump(apps)
+                if text != self._saved_text.get(name):
+                    writes.append((name, self._full_path(source), text))
+        return writes
+
+    def mark_saved(self, name, text: str):
+        with self._lock:
+            if name in self._sources:
+                self._saved_text[name] = text
+                self._signatures[name] = _file_signature(self._full_path(self._sources[name]))
+
+    def take_orphans(self) -> list:
+        """
+        削除してよい使われなくなったファイル (include_dir 内のものだけ) を返す
+        """
+        with self._lock:
+            in_use = {os.path.normcase(os.path.normpath(path)) for path in self._sources.values()}
+            orphans, self._orphans = self._orphans, set()
+        if not self.include_dir:
+            return []
+        include_dir = os.path.normpath(self.include_dir)
+        return [
+            self._full_path(path) for path in orphans
+            if os.path.dirname(os.path.normpath(path)) == include_dir
+            and os.path.normcase(os.path.normpath(path)) not in in_use
+        ]
+
+    def index_document(self) -> dict:
+        """
+        config.json に書き出す索引 (ファイルに分けたカテゴリはパスだけを書く)
+        """
+        with self._lock:
+            document = {}
+            if self.include_dir:
+                document[self.INCLUDE_DIR_KEY] = self.include_dir
+            for name in self._order:
+                source = self._sources.get(name)
+                document[name] = source.replace(os.sep, "/") if source is not None else self[name]
+            return document
+
+
+def loaded_categories(config) -> list:
+    """
+    読み込み済みのカテゴリのアプリのリスト (分割された設定で未読み込みのものは含めない)
+    """
+    if isinstance(config, SplitConfig):
+        return config.loaded_values()
+    return list(config.values())
+
+
+def loaded_category_items(config) -> list:
+    """
+    読み込み済みのカテゴリの (カテゴリ名, アプリのリスト) のリスト
+    """
+    if isinstance(config, SplitConfig):
+        return config.loaded_items()
+    return list(config.items())
+
+
+def read_category(config, name) -> list:
+    """
+    カテゴリのアプリのリスト。分割された設定の未読み込みのカテゴリは、読み込んだ状態にせずに返す
+    """
+    if isinstance(config, SplitConfig):
+        return config.read(name)
+    return config.get(name, [])
+
+
+def _apps_by_path(app_lists) -> dict:
+    """
+    パス -> アプリの項目 (同じパスが複数あれば最初のもの)
+    """
+    by_path = {}
+    for apps in app_lists:
+        for app_info in apps:
+            if app_info.get("path"):
+                by_path.setdefault(app_info["path"], app_info)
+    return by_path
+
+
+def is_folder_category(config, name) -> bool:
+    """
+    フォルダのカテゴリかどうか (分割された設定の未読み込みのカテゴリは読み込まない)
+    """
+    if isinstance(config, SplitConfig):
+        return isinstance(config.peek(name), FolderApps)
+    return isinstance(config.get(name), FolderApps)
+
+# --- フォルダのカテゴリ ---
+class FolderApps(list):
+    """
+    フォルダの中身から作られるカテゴリのアプリのリスト
+    config.json には {"$folder": フォルダのパス, "recursive": true} として書き、
+    読み込み時に FolderIndex がフォルダ内の実行ファイルやショートカットを並べる
+    (フォルダのパスは環境変数と ~ を展開し、相対パスは config.json のフォルダから解決する)
+    """
+    FOLDER_KEY = "$folder"
+
+    def __init__(self, folder: str, recursive: bool = True, root: str | None = None, apps=()):
+        super().__init__(apps)
+        # 設定に書かれたままのパスと、展開・解決したパス
+        self.folder = folder
+        self.recursive = recursive
+        self.root = root or folder
+        self.scanned_at = time.monotonic()
+
+    @classmethod
+    def is_spec(cls, value) -> bool:
+        return isinstance(value, dict) and cls.FOLDER_KEY in value
+
+    def spec(self) -> dict:
+        return {self.FOLDER_KEY: self.folder, "recursive": self.recursive}
+
+
+def config_document(config) -> dict:
+    """
+    設定を config.json に書き出す形にする (フォルダのカテゴリはフォルダの指定に戻す)
+    """
+    if isinstance(config, SplitConfig):
+        config = config.index_document()
+    return {name: apps.spec() if isinstance(apps, FolderApps) else apps for name, apps in config.items()}
+
+
+class FolderIndex:
+    """
+    フォルダのカテゴリの中身を作り、走査したフォルダのスナップショットを保存する
+
+    スナップショットはフォルダごとに (更新時刻, ファイルの一覧, サブフォルダの一覧) を持つ。
+    ファイルの追加・削除・改名ではそのフォルダの更新時刻が変わるため、
+    更新時刻が同じフォルダは中を列挙せず、stat 1回だけで前回の結果を使う。
+    ファイルは (名前, サイズ, 更新時刻, 表示名) として残し、登録の対象でないものは表示名を None にする。
+    列挙し直したフォルダでも、サイズと更新時刻が同じファイルは判定 (.desktop の解析など) を省く
+    """
+    VERSION = 1
+
+    def __init__(self, path: str | None = None):
+        self.path = path
+        self._lock = threading.Lock()
+        # フォルダのパス -> {"mtime": 更新時刻, "files": [[名前, サイズ, 更新時刻, 表示名], ...], "dirs": [名前, ...]}
+        self._folders = None
+        self._dirty = False
+        # 直前の走査で列挙したフォルダと、スナップショットを再利用したフォルダの数
+        self.listed = 0
+        self.reused = 0
+
+    def _ensure_loaded(self):
+        if self._folders is not None:
+            return
+        self._folders = {}
+        if not self.path:
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                document = json.load(f)
+            if document.get("version") == self.VERSION:
+                self._folders = document["folders"]
+        except (OSError, ValueError, KeyError, AttributeError):
+            pass
+
+    def category(self, spec: dict, base_dir: str = "") -> FolderApps:
+        """
+        config.json のフォルダの指定からカテゴリを作る
+        """
+        folder = spec[FolderApps.FOLDER_KEY]
+        recursive = bool(spec.get("recursive", True))
+        root = os.path.normpath(os.path.join(base_dir, os.path.expandvars(os.path.expanduser(folder))))
+        apps = FolderApps(folder, recursive, root)
+        apps.extend(self.scan(root, recursive))
+        return apps
+
+    @tracer.traced("folder.scan")
+    def scan(self, root: str, recursive: bool = True) -> list:
+        """
+        フォルダ (recursive なら中のフォルダも) にあるアプリの一覧を名前順で返す
+        """
+        with self._lock:
+            self._ensure_loaded()
+            self.listed = self.reused = 0
+            apps = []
+            seen = set()
+            folders = [root]
+            while folders:
+                folder = folders.pop()
+                try:
+                    mtime = os.stat(folder).st_mtime_ns
+                except OSError:
+                    continue
+                seen.add(folder)
+                entry = self._folders.get(folder)
+                if entry is None or entry["mtime"] != mtime:
+                    entry = self._folders[folder] = self._list(folder, mtime, entry)
+                    self._dirty = True
+                    self.listed += 1
+                else:
+                    self.reused += 1
+                for name, _, _, label in entry["files"]:
+                    if label is not None:
+                        apps.append(AppEntry(label, os.path.join(folder, name)))
+                if recursive:
+                    folders.extend(os.path.join(folder, name) for name in entry["dirs"])
+
+            if recursive:
+                # 消えたフォルダをスナップショットから取り除く
+                prefix = os.path.join(root, "")
+                for folder in [f for f in self._folders if (f == root or f.startswith(prefix)) and f not in seen]:
+                    del self._folders[folder]
+                    self._dirty = True
+        apps.sort(key=lambda app_info: (app_info["name"].casefold(), app_info["path"]))
+        return apps
+
+    @staticmethod
+    def _list(folder: str, mtime: int, previous) -> dict:
+        """
+        フォルダを列挙し、ファイルごとに登録の対象かどうかを判定する
+        """
+        known = {}
+        if previous is not None:
+            known = {name: (size, file_mtime, label) for name, size, file_mtime, label in previous["files"]}
+        files = []
+        dirs = []
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            dirs.append(entry.name)
+                            continue
+                        if not entry.is_file():
+                            continue
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    size, file_mtime = st.st_size, st.st_mtime_ns
+                    cached = known.get(entry.name)
+                    if cached is not None and cached[:2] == (size, file_mtime):
+                        label = cached[2]
+                    else:
+                        candidate = app_candidate(entry.path)
+                        label = candidate["name"] if candidate is not None else None
+                    files.append([entry.name, size, file_mtime, label])
+        except OSError:
+            pass
+        files.sort()
+        dirs.sort(reverse=True)
+        return {"mtime": mtime, "files": files, "dirs": dirs}
+
+    def save(self):
+        """
+        スナップショットが変わっていれば書き出す
+        """
+        with self._lock:
+            if not self._dirty or not self.path:
+                return
+            data = json.dumps({"version": self.VERSION, "folders": self._folders}, ensure_ascii=False, separators=(',', ':'))
+            self._dirty = False
+        try:
+            fd, tmp_path = tempfile.mkstemp(prefix=".folder_index.", dir=os.path.dirname(self.path) or ".")
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+# --- 設定ファイルの保存 ---
+class ConfigStore:
+    """
+    config.json の読み書きを担当するストア
+
+    書き込みは同じフォルダの一時ファイルに書いてから os.replace で置き換えるため、
+    途中で落ちても config.json が壊れることはない。置き換える直前の内容は
+    config.json.bak1 〜 bakN として世代ごとに残す (ハードリンクなのでサイズによらず一瞬で済む)。
+    schedule_save は短時間に続いた保存要求をまとめ、最後の内容だけをバックグラウンドで書き出す。
+    """
+    BACKUP_COUNT = 3
+    DEBOUNCE_SECONDS = 0.5
+    # これより多くのアプリを持つ設定は、インデントなしで書き出す
+    # (インデント付きの出力は Python 実装の遅い経路になり、数MBでは数倍の時間がかかる)
+    COMPACT_ENTRY_THRESHOLD = 2000
+
+    def __init__(self, path: str, on_error=None, folder_index=None, snapshot=None):
+        self.path = path
+        # 前回の解析結果 (StartupSnapshot)。config.json と一致すれば解析を省く
+        self.snapshot = snapshot
+        # on_error(exception) は書き込みを行ったスレッドから呼ばれる
+        self.on_error = on_error
+        # フォルダのカテゴリの中身は、読み込み時にこのスナップショットを使って作る
+        self.folder_index = folder_index if folder_index is not None else FolderIndex()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._pending = None
+        self._timer = None
+        self._last_written = None
+        # 最後に自分で書き込んだファイルの (サイズ, 更新時刻)。外部からの変更と区別するために使う
+        self.last_written_signature = None
+        # 最後の読み込みで読み飛ばした、形式の正しくないアプリの項目 (理由の文字列)
+        self.skipped_entries = []
+
+    def load(self) -> dict:
+        """
+        設定ファイルを読み込む (FileNotFoundError / json.JSONDecodeError / ConfigSchemaError はそのまま送出する)
+        カテゴリをファイルに分けた設定の場合は、索引だけを読んだ SplitConfig を返す
+        """
+        if self.snapshot is not None:
+            document = self.snapshot.load_document(self.path)
+            if document is not None:
+                return self._parse(document, self.snapshot.data["skipped"])
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return self._parse(json.load(f))
+
+    def _parse(self, document, snapshot_skipped=None):
+        """
+        読み込んだ JSON を設定にする (アプリの項目は AppEntry にし、形式を確認する)
+        snapshot_skipped を渡した場合、document は StartupSnapshot の形式の確認済みの内容で、
+        アプリのリストは AppEntry.snapshot_row の行のリストになっている
+        """
+        if not isinstance(document, dict):
+            raise ConfigSchemaError("設定がカテゴリ名をキーとするオブジェクトではありません")
+        base_dir = os.path.dirname(os.path.abspath(self.path))
+        parsed = {}
+        skipped = []
+        for name, value in document.items():
+            if FolderApps.is_spec(value):
+                value = self.folder_index.category(value, base_dir)
+            elif snapshot_skipped is not None and isinstance(value, list):
+                value = AppEntry.list_from_snapshot(value)
+            elif isinstance(value, list):
+                value = AppEntry.list_from_json(value, f"カテゴリ '{name}' の ", skipped)
+            elif not isinstance(value, str):
+                raise ConfigSchemaError(f"カテゴリ '{name}' の値はアプリのリストかファイルのパスにしてください")
+            parsed[name] = value
+        document = parsed
+        self.skipped_entries = skipped if snapshot_skipped is None else list(snapshot_skipped)
+        if any(isinstance(value, FolderApps) for value in document.values()):
+            self.folder_index.save()
+        if SplitConfig.is_split_document(document):
+            return SplitConfig.from_document(document, base_dir)
+        return document
+
+    def backup_path(self, generation: int) -> str:
+        return f"{self.path}.bak{generation}"
+
+    def load_latest_backup(self):
+        """
+        読み込めるバックアップのうち最も新しいものを (パス, 設定) で返す。なければ None
+        """
+        for generation in range(1, self.BACKUP_COUNT + 1):
+            path = self.backup_path(generation)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    return path, self._parse(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return None
+
+    @tracer.traced("config.save")
+    def save(self, config: dict):
+        """
+        設定を直ちに書き出す。内容が前回の書き込みと同じで、その後ファイルが外部で
+        変更されていない場合は何もしない
+        分割された設定は、変更されたカテゴリのファイルと索引だけを書き出す
+        """
+        with self._write_lock:
+            if isinstance(config, SplitConfig):
+                for name, path, text in config.pending_writes():
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    self._write_atomic(path, text)
+                    config.mark_saved(name, text)
+                for path in config.take_orphans():
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+            config = config_document(config)
+
+            entry_count = sum(len(apps) for apps in config.values() if isinstance(apps, list))
+            if entry_count > self.COMPACT_ENTRY_THRESHOLD:
+                data = json.dumps(config, ensure_ascii=False, separators=(",", ":"), default=json_default)
+            else:
+                data = json.dumps(config, indent=2, ensure_ascii=False, default=json_default)
+            if data == self._last_written and self._file_signature() == self.last_written_signature:
+                return
+            self._write_atomic(self.path, data, backup=True)
+            self._last_written = data
+            self.last_written_signature = self._file_signature()
+
+    def _file_signature(self):
+        """
+        config.json の現在の (サイズ, 更新時刻)。ファイルがなければ None
+        """
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_size, st.st_mtime_ns)
+
+    def _write_atomic(self, path: str, data: str, backup: bool = False):
+        """
+        同じフォルダの一時ファイルに書いてから置き換える
+        """
+        directory = os.path.dirname(path) or "."
+        fd, tmp_path = tempfile.mkstemp(prefix=".config-", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            # mkstemp のファイルは 0600 で作られるため、元のファイルの権限を引き継ぐ
+            if os.path.exists(path):
+                shutil.copymode(path, tmp_path)
+            if backup:
+                self._rotate_backups()
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def _rotate_backups(self):
+        """
+        バックアップを1世代ずつずらし、現在の config.json を bak1 として残す
+        """
+        if not os.path.exists(self.path):
+            return
+        for generation in range(self.BACKUP_COUNT - 1, 0, -1):
+            src = self.backup_path(generation)
+            if os.path.exists(src):
+                os.replace(src, self.backup_path(generation + 1))
+        newest = self.backup_path(1)
+        try:
+            os.link(self.path, newest)
+        except OSError:
+            # ハードリンクが使えないファイルシステムではコピーする
+            shutil.copy2(self.path, newest)
+
+    def schedule_save(self, config: dict):
+        """
+        DEBOUNCE_SECONDS の間に次の要求がなければ、最後に渡された設定を書き出す
+        渡した辞書は書き込みが終わるまで変更しないこと
+        """
+        with self._lock:
+            self._pending = config
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.DEBOUNCE_SECONDS, self._write_pending)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """
+        保存待ちの設定があれば、待たずに書き出す
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+        self._write_pending()
+
+    def _write_pending(self):
+        with self._lock:
+            config, self._pending = self._pending, None
+            self._timer = None
+        if config is None:
+            return
+        try:
+            self.save(config)
+        except OSError as e:
+            if self.on_error is not None:
+                self.on_error(e)
+
+# --- 起動用のスナップショット ---
+class StartupSnapshot:
+    """
+    前回の終了時の config.json の解析結果と、パスの解決結果をまとめたバイナリファイル
+
+    中身は marshal で直列化した辞書で、1回の読み込みで復元できる (JSON の解析より速い)。
+    config.json の (サイズ, 更新時刻) とハッシュ値が記録時と一致する場合だけ使い、
+    一致しなければ読み込まずに config.json を解析する。保持するのは
+        document: config.json の内容 (分割された設定では索引のみ)。アプリのリストは
+            形式を確認済みの AppEntry.snapshot_row の行にしておき、読み込み時の確認と変換を省く
+        skipped: 解析時に読み飛ばした項目の理由
+        path_env / resolved: PATH の状態と PathResolver の結果 (PATH が同じ場合だけ使う)
+        icon_paths: 設定のパス -> アイコンのキャッシュのキー (解決済みのパス)
+    """
+    MAGIC = b"LSNP"
+    VERSION = 2
+
+    def __init__(self, path: str):
+        self.path = path
+        # 有効だった場合に読み込んだ内容
+        self.data = None
+
+    @staticmethod
+    def _digest(data: bytes) -> bytes:
+        return hashlib.blake2b(data, digest_size=16).digest()
+
+    def load_document(self, config_path: str):
+        """
+        config.json と一致するスナップショットがあれば、その設定の内容を返す (なければ None)
+        """
+        self.data = None
+        try:
+            st = os.stat(config_path)
+            with open(self.path, 'rb') as f:
+                raw = f.read()
+            if raw[:4] != self.MAGIC or struct.unpack_from("<I", raw, 4)[0] != self.VERSION:
+                return None
+            data = marshal.loads(raw[8:])
+            if (data["size"], data["mtime_ns"]) != (st.st_size, st.st_mtime_ns):
+                return None
+            with open(config_path, 'rb') as f:
+                if self._digest(f.read()) != data["hash"]:
+                    return None
+        except (OSError, ValueError, EOFError, TypeError, KeyError, struct.error):
+            return None
+        self.data = data
+        return data["document"]
+
+    def seed(self, resolver, icon_paths: dict):
+        """
+        読み込んだスナップショットのパスの解決結果を取り込む
+        """
+        if self.data is None:
+            return
+        if resolver.seed(self.data["path_env"], self.data["resolved"]):
+            icon_paths.update(self.data["icon_paths"])
+
+    def write(self, config_path: str, resolver, icon_paths: dict):
+        """
+        現在の config.json と解決結果からスナップショットを書き出す
+        (config.json を解析できない場合は何もしない)
+        """
+        try:
+            with open(config_path, 'rb') as f:
+                raw = f.read()
+            st = os.stat(config_path)
+            document = json.loads(raw)
+        except (OSError, ValueError):
+            return
+        if not isinstance(document, dict):
+            return
+        # アプリのリストは形式を確認して変換した値で持ち、次回の読み込みでは確認を省く
+        skipped = []
+        for name, value in document.items():
+            if isinstance(value, list):
+                entries = AppEntry.list_from_json(value, f"カテゴリ '{name}' の ", skipped)
+                document[name] = [entry.snapshot_row() for entry in entries]
+        path_env, resolved = resolver.export()
+        data = {
+            "size": st.st_size, "mtime_ns": st.st_mtime_ns, "hash": self._digest(raw),
+            "document": document, "skipped": skipped, "path_env": path_env, "resolved": resolved,
+            "icon_paths": {path: full_path for path, full_path in icon_paths.items() if isinstance(full_path, str)},
+        }
+        try:
+            payload = self.MAGIC + struct.pack("<I", self.VERSION) + marshal.dumps(data)
+        except ValueError:
+            # marshal で扱えない値が含まれていれば保存しない
+            return
+        try:
+            fd, tmp_path = tempfile.mkstemp(prefix=".snapshot.", dir=os.path.dirname(self.path) or ".")
+            with os.fdopen(fd, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+# --- 設定ファイルの監視 ---
+class ConfigWatcher:
+    """
+    config.json の外部からの変更を監視するスレッド
+
+    Linux では inotify でフォルダを監視し、使えない環境ではサイズと更新時刻をポーリングする
+    (変更がない間はポーリング間隔を MAX_INTERVAL まで延ばす)。
+    変更を検出するとこのスレッドで読み込み・解析し、正しい JSON のときだけ on_change(config) を呼ぶ。
+    書き込み途中の不完全なファイルは無視し、次に変更されたときに改めて読み込む。
+    """
+    MIN_INTERVAL = 0.5
+    MAX_INTERVAL = 5.0
+    # inotify の通知を受けてから読み込むまでの待ち時間 (連続した書き込みをまとめる)
+    SETTLE_SECONDS = 0.1
+
+    # <sys/inotify.h>
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_CLOEXEC = 0o2000000
+    _EVENT = struct.Struct("iIII")
+
+    def __init__(self, path: str, on_change, own_signature=None, load=None):
+        self.path = path
+        self.on_change = on_change
+        # 設定を読み込む関数 (省略時は JSON をそのまま読み込む)
+        self.load = load
+        # ランチャー自身が書き込んだファイルの (サイズ, 更新時刻) を返す関数
+        self.own_signature = own_signature
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_signature = self._signature()
+
+    def _signature(self):
+        try:
+            st = os.stat(self.path)
+            return st.st_size, st.st_mtime_ns
+        except OSError:
+            return None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="config-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        if not self._watch_inotify():
+            self._watch_polling()
+
+    def _check(self):
+        """
+        ファイルが変わっていれば読み込み、正しい JSON なら通知する
+        """
+        signature = self._signature()
+        if signature is None or signature == self._last_signature:
+            return
+        self._last_signature = signature
+        if self.own_signature is not None and signature == self.own_signature():
+            return
+        try:
+            if self.load is not None:
+                config = self.load()
+            else:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    config = json.load(f)
+        except (OSError, ValueError):
+            # 書き込み途中などで読めない場合は、次の変更を待つ
+            return
+        self.on_change(config)
+
+    def _watch_polling(self):
+        interval = self.MIN_INTERVAL
+        while not self._stop.wait(interval):
+            before = self._last_signature
+            self._check()
+            if self._last_signature != before:
+                interval = self.MIN_INTERVAL
+            else:
+                interval = min(interval * 1.5, self.MAX_INTERVAL)
+
+    def _watch_inotify(self) -> bool:
+        """
+        inotify でフォルダを監視する。使えない環境では False を返す
+        os.replace による置き換えも検出できるよう、ファイルではなくフォルダを監視する
+        """
+        if not sys.platform.startswith("linux"):
+            return False
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(self.IN_CLOEXEC)
+        except (OSError, AttributeError):
+            return False
+        if fd < 0:
+            return False
+
+        try:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            mask = self.IN_MODIFY | self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE
+            if libc.inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+                return False
+            filename = os.fsencode(os.path.basename(self.path))
+
+            while not self._stop.is_set():
+                readable, _, _ = select.select([fd], [], [], 1.0)
+                if not readable:
+                    continue
+                data = os.read(fd, 64 * 1024)
+                offset, touched = 0, False
+                while offset + self._EVENT.size <= len(data):
+                    _, _, _, name_len = self._EVENT.unpack_from(data, offset)
+                    offset += self._EVENT.size
+                    name = data[offset:offset + name_len].rstrip(b"\0")
+                    offset += name_len
+                    touched = touched or name == filename
+                if touched:
+                    self._stop.wait(self.SETTLE_SECONDS)
+                    self._check()
+            return True
+        finally:
+            os.close(fd)
+
+# --- 設定の差分 ---
+ConfigDiff = namedtuple("ConfigDiff", ["added", "removed", "renamed", "changed", "reordered"])
+
+
+def diff_config(old: dict, new: dict) -> ConfigDiff:
+    """
+    2つの設定 (カテゴリ名 -> アプリのリスト) を比較し、構造的な差分を返す
+
+    added / removed: 追加・削除されたカテゴリ名のリスト
+    renamed: 中身が同じまま名前だけ変わったカテゴリの (旧名, 新名) のリスト
+    changed: 両方に存在し、アプリのリストが変わったカテゴリ名のリスト
+    reordered: 名前の変更を反映した上でカテゴリの並び順が変わったかどうか
+    """
+    removed = [name for name in old if name not in new]
+    added = [name for name in new if name not in old]
+
+    # 削除と追加の組のうち、アプリのリストが一致するものを名前の変更とみなす
+    renamed = []
+    for old_name in list(removed):
+        for new_name in added:
+            if _same_apps(old, old_name, new, new_name):
+                renamed.append((old_name, new_name))
+                removed.remove(old_name)
+                added.remove(new_name)
+                break
+
+    changed = [name for name in new if name in old and not _same_apps(old, name, new, name)]
+
+    renames = dict(renamed)
+    old_order = [renames.get(name, name) for name in old if name not in removed]
+    new_order = [name for name in new if name not in added]
+    reordered = old_order != new_order or bool(added)
+
+    return ConfigDiff(added, removed, renamed, changed, reordered)
+
+def _same_apps(old, old_name, new, new_name) -> bool:
+    """
+    2つのカテゴリのアプリのリストが同じか
+    分割された設定で、どちらも未読み込みの同じファイルなら読み込まずに判断する
+    編集していない AppEntry は新旧で同じオブジェクトのため、リストの比較では値を比べずに済む
+    """
+    if isinstance(old, SplitConfig):
+        same = old.same_category(old_name, new, new_name)
+        if same is not None:
+            return same
+    return old[old_name] == new[new_name]
+
+# --- 検索用の索引 ---
+class SearchIndex:
+    """
+    全カテゴリのアプリ名と実行ファイル名を対象にした前方一致 + n-gram 索引
+
+    検索結果は次の段階の順に埋め、上限件数に達した時点で打ち切る。
+    1. 名前の前方一致 (完全一致は名前が最も短いため自然に先頭になる)
+    2. 名前に含まれる単語の前方一致
+    3. 名前の部分一致 / 4. 実行ファイル名の部分一致 (3-gram の積で絞り込む)
+    5. 3-gram の多くが一致するあいまい一致 (1〜4 で見つからなかった場合のみ)
+    各段階の中では名前の短い順に heapq.nsmallest で上位だけを取り出すため、
+    候補が多くても検索語1文字あたりの処理は小さく抑えられる。
+    設定の変更はカテゴリ単位で索引に反映できる。
+    """
+    MAX_GRAM = 3
+    MAX_PREFIX = 8
+    # あいまい一致で調べる候補数の上限
+    FUZZY_POOL_LIMIT = 1000
+
+    def __init__(self):
+        # ID -> (名前, パス, カテゴリ, 検索用の名前, 検索用の実行ファイル名, シェル経由か)
+        self._entries = {}
+        # ID -> 段階内での並び順 (名前の長さ, 名前)
+        self._sort_keys = {}
+        # カテゴリ -> そのカテゴリのエントリIDのリスト
+        self._by_category = {}
+        # 前方一致用: 名前 / 単語の先頭 MAX_PREFIX 文字までの各接頭辞 -> IDの集合
+        self._name_prefixes = {}
+        self._word_prefixes = {}
+        # 部分一致用: 長さ 1〜MAX_GRAM の部分文字列 -> IDの集合
+        self._name_grams = {}
+        self._file_grams = {}
+        self._next_id = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @classmethod
+    def _grams_of(cls, text: str):
+        """
+        文字列に含まれる長さ 1〜MAX_GRAM の部分文字列の集合
+        """
+        return {
+            text[i:i + n]
+            for n in range(1, cls.MAX_GRAM + 1)
+            for i in range(len(text) - n + 1)
+        }
+
+    @classmethod
+    def _prefixes_of(cls, text: str):
+        return {text[:n] for n in range(1, min(len(text), cls.MAX_PREFIX) + 1)}
+
+    def _postings(self, entry_id: int, name_key: str, file_key: str):
+        """
+        エントリが登録される (索引, キーの集合) の組
+        """
+        word_prefixes = set()
+        for word in name_key.split()[1:]:
+            word_prefixes |= self._prefixes_of(word)
+        return (
+            (self._name_prefixes, self._prefixes_of(name_key)),
+            (self._word_prefixes, word_prefixes),
+            (self._name_grams, self._grams_of(name_key)),
+            (self._file_grams, self._grams_of(file_key)),
+        )
+
+    def rebuild(self, config: dict):
+        """
+        設定全体から索引を作り直す
+        分割された設定の未読み込みのカテゴリは、読み込んだ状態にせずにファイルを解析する
+        """
+        for table in (self._entries, self._sort_keys, self._by_category, self._name_prefixes,
+                      self._word_prefixes, self._name_grams, self._file_grams):
+            table.clear()
+        for category in config:
+            self.add_category(category, read_category(config, category))
+
+    def add_category(self, category: str, apps: list):
+        """
+        カテゴリのアプリを索引に追加する
+        """
+        ids = self._by_category.setdefault(category, [])
+        for app_info in apps:
+            name = app_label(app_info)
+            path = app_info.get("path")
+            if not path:
+                continue
+            entry_id = self._next_id
+            self._next_id += 1
+
+            name_key = name.casefold()
+            file_key = os.path.basename(path.strip().strip('"')).casefold()
+            self._entries[entry_id] = (name, path, category, name_key, file_key, bool(app_info.get("shell")))
+            self._sort_keys[entry_id] = (len(name_key), name_key)
+            ids.append(entry_id)
+            for table, keys in self._postings(entry_id, name_key, file_key):
+                for key in keys:
+                    table.setdefault(key, set()).add(entry_id)
+
+    def remove_category(self, category: str):
+        """
+        カテゴリのアプリを索引から取り除く
+        """
+        for entry_id in self._by_category.pop(category, []):
+            _, _, _, name_key, file_key, _ = self._entries.pop(entry_id)
+            del self._sort_keys[entry_id]
+            for table, keys in self._postings(entry_id, name_key, file_key):
+                for key in keys:
+                    ids = table.get(key)
+                    if ids is not None:
+                        ids.discard(entry_id)
+                        if not ids:
+                            del table[key]
+
+    def rename_category(self, old_name: str, new_name: str):
+        """
+        カテゴリ名だけを付け替える (索引のキーは変わらない)
+        """
+        ids = self._by_category.pop(old_name, [])
+        self._by_category[new_name] = ids
+        for entry_id in ids:
+            name, path, _, name_key, file_key, use_shell = self._entries[entry_id]
+            self._entries[entry_id] = (name, path, new_name, name_key, file_key, use_shell)
+
+    def apply_diff(self, diff: ConfigDiff, config: dict):
+        """
+        diff_config の結果に含まれるカテゴリだけを更新する
+        """
+        for old_name, new_name in diff.renamed:
+            self.rename_category(old_name, new_name)
+        for category in diff.removed:
+            self.remove_category(category)
+        for category in diff.changed:
+            self.remove_category(category)
+            self.add_category(category, read_category(config, category))
+        for category in diff.added:
+            self.add_category(category, read_category(config, category))
+
+    def _prefix_ids(self, table: dict, query: str, matches) -> set:
+        """
+        接頭辞の索引から候補を引く
+        MAX_PREFIX 文字を超える検索語の場合のみ、名前を見て絞り込む
+        """
+        ids = table.get(query[:self.MAX_PREFIX], set())
+        if len(query) <= self.MAX_PREFIX:
+            return ids
+        return {entry_id for entry_id in ids if matches(self._entries[entry_id][3])}
+
+    def _substring_ids(self, table: dict, query: str, key_index: int) -> set:
+        """
+        索引 table を使い、検索語を部分文字列として含むエントリを求める
+        """
+        if len(query) <= self.MAX_GRAM:
+            return table.get(query, set())
+        grams = {query[i:i + self.MAX_GRAM] for i in range(len(query) - self.MAX_GRAM + 1)}
+        postings = sorted((table.get(g, set()) for g in grams), key=len)
+        if not postings[0]:
+            return set()
+        # 3-gram をすべて含んでも連続しているとは限らないため、最後に確認する
+        return {
+            entry_id for entry_id in set.intersection(*postings)
+            if query in self._entries[entry_id][key_index]
+        }
+
+    def _fuzzy_ids(self, query: str) -> set:
+        """
+        検索語の 3-gram の半分以上を名前に含むエントリ
+        """
+        if len(query) <= self.MAX_GRAM:
+            return set()
+        grams = {query[i:i + self.MAX_GRAM] for i in range(len(query) - self.MAX_GRAM + 1)}
+        required = max(2, (len(grams) + 1) // 2)
+        postings = sorted((self._name_grams.get(g, set()) for g in grams), key=len)
+
+        # required 個以上の 3-gram を含むエントリは、小さい方から (件数 - required + 1) 個の
+        # 集合のどれかに必ず含まれるため、そこから候補を集める
+        pool = set().union(*postings[:len(postings) - required + 1])
+        if len(pool) > self.FUZZY_POOL_LIMIT:
+            # 候補が多すぎる検索語ではあいまい一致は役に立たないため省略する
+            return set()
+        return {
+            entry_id for entry_id in pool
+            if sum(entry_id in ids for ids in postings) >= required
+        }
+
+    def search(self, query: str, limit: int = 20) -> list:
+        """
+        検索語に一致するアプリを順位の高い順に返す
+        """
+        query = query.strip().casefold()
+        if not query:
+            return []
+
+        stages = (
+            lambda: self._prefix_ids(self._name_prefixes, query, lambda key: key.startswith(query)),
+            lambda: self._prefix_ids(
+                self._word_prefixes, query,
+                lambda key: any(word.startswith(query) for word in key.split()[1:])
+            ),
+            lambda: self._substring_ids(self._name_grams, query, 3),
+            lambda: self._substring_ids(self._file_grams, query, 4),
+            # あいまい一致はそれまでに何も見つからなかった場合のみ行う
+            lambda: set() if found else self._fuzzy_ids(query),
+        )
+
+        found = []
+        seen = set()
+        for stage in stages:
+            candidates = stage() - seen
+            found.extend(heapq.nsmallest(limit - len(found), candidates, key=self._sort_keys.__getitem__))
+            seen.update(found)
+            if len(found) >= limit:
+                break
+
+        results = []
+        for entry_id in found:
+            name, path, category, _, _, use_shell = self._entries[entry_id]
+            results.append({"name": name, "path": path, "category": category, "shell": use_shell})
+        return results
+
+# --- 多重起動の防止とプロセス間通信 ---
+class InstanceServer:
+    """
+    起動中のランチャーが後から起動されたランチャーの要求を受け付けるローカルサーバー
+
+    127.0.0.1 の空きポートで待ち受け、ポート番号と認証用のトークンをロックファイルに書く。
+    後から起動されたプロセスは send_instance_command でロックファイルを読んで接続し、
+    1行の JSON で要求を送る。応答のないロックファイルは古いものとみなして取り除く。
+    ハンドラーが設定される前 (ランチャーの作成中) に届いた要求は保留し、attach で渡す。
+    """
+
+    def __init__(self, lock_path: str, handler=None):
+        self.lock_path = lock_path
+        # handler(message) はサーバーのスレッドから呼ばれる
+        self.handler = handler
+        self.token = secrets.token_hex(16)
+        self._sock = None
+        self._thread = None
+        self._lock = threading.Lock()
+        # ハンドラーが設定されるまでに届いた要求
+        self._backlog = []
+
+    def acquire(self) -> bool:
+        """
+        待ち受けを開始してロックファイルを作成する
+        既に別のランチャーが応答する場合は False を返す
+        """
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.bind(("127.0.0.1", 0))
+        self._sock.listen(8)
+
+        for _ in range(2):
+            try:
+                fd = os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600)
+            except FileExistsError:
+                if not self._remove_stale_lock():
+                    break
+                continue
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({"pid": os.getpid(), "port": self._sock.getsockname()[1], "token": self.token}, f)
+            return True
+
+        self._sock.close()
+        self._sock = None
+        return False
+
+    def _remove_stale_lock(self) -> bool:
+        """
+        ロックファイルの持ち主が応答しなければ削除して True を返す
+        作成直後で中身がまだ書かれていない場合に備え、少し待ってもう一度確認する
+        """
+        for delay in (0, 0.3):
+            time.sleep(delay)
+            if send_instance_command(self.lock_path, {"command": "ping"}) is not None:
+                return False
+        try:
+            os.remove(self.lock_path)
+        except FileNotFoundError:
+            pass
+        return True
+
+    def serve(self, handler=None):
+        """
+        バックグラウンドのスレッドで要求の受け付けを開始する
+        """
+        if handler is not None:
+            self.attach(handler)
+        self._thread = threading.Thread(target=self._serve_forever, name="instance-server", daemon=True)
+        self._thread.start()
+
+    def _serve_forever(self):
+        sock = self._sock
+        while True:
+            try:
+                conn, _ = sock.accept()
+            except OSError:
+                # stop() でソケットが閉じられた
+                return
+            with conn:
+                try:
+                    conn.settimeout(2.0)
+                    response = self._handle(_read_json_line(conn))
+                    conn.sendall(json.dumps(response).encode('utf-8') + b"\n")
+                except (OSError, ValueError):
+                    continue
+
+    def attach(self, handler):
+        """
+        ハンドラーを設定し、それまでに保留した要求を届いた順に渡す
+        """
+        with self._lock:
+            backlog, self._backlog = self._backlog, []
+            self.handler = handler
+        for message in backlog:
+            handler(message)
+
+    def _handle(self, message: dict) -> dict:
+        """
+        トークンを確認し、ping 以外の要求はハンドラーに渡す (ハンドラーがまだなければ保留する)
+        """
+        if not secrets.compare_digest(str(message.get("token", "")), self.token):
+            return {"ok": False, "error": "invalid token"}
+        if message.get("command") == "ping":
+            return {"ok": True, "pid": os.getpid()}
+        message = {key: value for key, value in message.items() if key != "token"}
+        with self._lock:
+            handler = self.handler
+            if handler is None:
+                self._backlog.append(message)
+                return {"ok": True, "queued": True}
+        handler(message)
+        return {"ok": True}
+
+    def stop(self):
+        """
+        待ち受けを終了し、自分のロックファイルを削除する
+        """
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        try:
+            with open(self.lock_path, 'r', encoding='utf-8') as f:
+                owner = json.load(f)
+            if owner.get("token") == self.token:
+                os.remove(self.lock_path)
+        except (OSError, ValueError):
+            pass
+
+
+def _read_json_line(conn) -> dict:
+    """
+    ソケットから改行までを読み、JSON として解釈する
+    """
+    data = b""
+    while not data.endswith(b"\n"):
+        chunk = conn.recv(4096)
+        if not chunk:
+            break
+        data += chunk
+        if len(data) > 65536:
+            raise ValueError("message too long")
+    message = json.loads(data.decode('utf-8'))
+    if not isinstance(message, dict):
+        raise ValueError("invalid message")
+    return message
+
+
+def send_instance_command(lock_path: str, message: dict, timeout: float = 1.0) -> dict | None:
+    """
+    起動中のランチャーに要求を送り、応答を返す
+    ランチャーが起動していない、または応答しない場合は None を返す
+    """
+    try:
+        with open(lock_path, 'r', encoding='utf-8') as f:
+            owner = json.load(f)
+        with socket.create_connection(("127.0.0.1", int(owner["port"])), timeout=timeout) as conn:
+            conn.sendall(json.dumps(dict(message, token=owner["token"])).encode('utf-8') + b"\n")
+            response = _read_json_line(conn)
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    return response if response.get("ok") else None
+
+
+def run_ipc_selftest() -> int:
+    """
+    Tk を使わずに InstanceServer と代替クライアントの動作を確認する
+    一時フォルダにロックファイルを作り、要求の転送・認証・古いロックの回収を試す
+    """
+    failures = []
+
+    def check(label, condition):
+        print(f"{'OK' if condition else 'NG'}  {label}")
+        if not condition:
+            failures.append(label)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        lock_path = os.path.join(tmp, "launcher.lock")
+        received = []
+
+        # 応答しないプロセスが残したロックファイル
+        with open(lock_path, 'w', encoding='utf-8') as f:
+            json.dump({"pid": 0, "port": 9, "token": "stale"}, f)
+        check("応答のないランチャーへの送信は None", send_instance_command(lock_path, {"command": "show"}) is None)
+
+        server = InstanceServer(lock_path, handler=received.append)
+        check("古いロックファイルを回収して起動できる", server.acquire())
+        server.serve()
+        try:
+            check("ping に応答する", send_instance_command(lock_path, {"command": "ping"}) is not None)
+            check("show を転送する", send_instance_command(lock_path, {"command": "show"}) is not None)
+            check("launch を転送する", send_instance_command(lock_path, {"command": "launch", "name": "メモ帳"}) is not None)
+            check("ハンドラーに要求が届く",
+                  received == [{"command": "show"}, {"command": "launch", "name": "メモ帳"}])
+
+            second = InstanceServer(lock_path)
+            check("2つ目のランチャーはロックを取得できない", not second.acquire())
+
+            with open(lock_path, 'r', encoding='utf-8') as f:
+                port = json.load(f)["port"]
+            with socket.create_connection(("127.0.0.1", port), timeout=1.0) as conn:
+                conn.sendall(b'{"command": "show", "token": "wrong"}\n')
+                check("トークンが違う要求は拒否する", _read_json_line(conn).get("ok") is False)
+        finally:
+            server.stop()
+        check("終了時にロックファイルを削除する", not os.path.exists(lock_path))
+
+    return 1 if failures else 0
+
+# --- アプリの起動 ---
+# CreateProcess で直接起動できる拡張子 (.bat / .cmd は Windows が自動的に cmd.exe で実行する)
+EXECUTABLE_EXTENSIONS = (".exe", ".com", ".bat", ".cmd")
+
+
+def split_command(command: str) -> list:
+    """
+    設定のパス文字列を実行ファイルと引数のリストに分割する
+    引用符なしでスペースを含むパス (C:/Program Files/.../chrome.exe) も、
+    ファイルとして存在すればそのまま1つの実行ファイルとして扱う
+    """
+    command = command.strip()
+    if os.path.exists(command.strip('"')):
+        return [command.strip('"')]
+    if os.name == "nt":
+        # posix=True ではバックスラッシュがエスケープとして消えてしまうため使わない
+        args = shlex.split(command, posix=False)
+        return [arg[1:-1] if len(arg) >= 2 and arg[0] == arg[-1] == '"' else arg for arg in args]
+    return shlex.split(command)
+
+
+def is_shell_document(executable: str) -> bool:
+    """
+    プロセスとして直接起動できず、関連付けで開く必要があるものか
+    (ショートカット、フォルダ、文書ファイルなど)
+    """
+    if os.path.isdir(executable):
+        return True
+    if os.name == "nt":
+        extension = os.path.splitext(executable)[1].lower()
+        return bool(extension) and extension not in EXECUTABLE_EXTENSIONS
+    return os.path.isfile(executable) and not os.access(executable, os.X_OK)
+
+
+class PathResolver:
+    """
+    設定に書かれたパスを引数のリストと実行ファイルの絶対パスに解決し、結果を保持する
+
+    PATH の検索はフォルダを順に調べるため、ボタンごと・起動ごとに行うと遅い。
+    結果は PATH の値と PATH の各フォルダの更新時刻のスナップショットが変わるまで再利用する
+    (フォルダにファイルが追加・削除されると、そのフォルダの更新時刻が変わる)。
+    スナップショットの確認は CHECK_INTERVAL 秒に1回だけ行う。
+    フォルダを含むパスは、そのフォルダの更新時刻が変わっていなければ再利用する。
+    """
+    CHECK_INTERVAL = 2.0
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 設定のパス -> (引数のリスト, 実行ファイル or None, 確認するフォルダ, その更新時刻)
+        self._cache = {}
+        self._snapshot = None
+        self._checked_at = None
+        # PATH の変化でキャッシュを破棄するたびに増える (利用側の派生キャッシュの破棄に使う)
+        self.generation = 0
+
+    @staticmethod
+    def _mtime(folder: str):
+        try:
+            return os.stat(folder).st_mtime_ns
+        except OSError:
+            return None
+
+    @classmethod
+    def _path_snapshot(cls):
+        path_env = os.environ.get("PATH", "")
+        folders = [folder for folder in path_env.split(os.pathsep) if folder]
+        return path_env, os.environ.get("PATHEXT", ""), tuple(cls._mtime(folder) for folder in folders)
+
+    def refresh(self, force: bool = False) -> int:
+        """
+        PATH が変わっていればキャッシュを破棄し、現在の世代を返す
+        """
+        now = time.monotonic()
+        with self._lock:
+            if not force and self._checked_at is not None and now - self._checked_at < self.CHECK_INTERVAL:
+                return self.generation
+            self._checked_at = now
+        snapshot = self._path_snapshot()
+        with self._lock:
+            if snapshot != self._snapshot:
+                if self._snapshot is not None:
+                    self.generation += 1
+                self._snapshot = snapshot
+                self._cache.clear()
+            return self.generation
+
+    def resolve_command(self, path: str):
+        """
+        (引数のリスト, 実行ファイルの絶対パス) を返す。見つからなければ実行ファイルは None
+        引用符が閉じられていない場合は ValueError を送出する
+        """
+        self.refresh()
+        entry = self._cache.get(path)
+        if entry is not None:
+            args, executable, folder, mtime = entry
+            if folder is None or self._mtime(folder) == mtime:
+                return list(args), executable
+
+        args = split_command(path)
+        executable = folder = mtime = None
+        if args:
+            target = args[0]
+            if os.path.dirname(target):
+                folder = os.path.dirname(os.path.abspath(target))
+                mtime = self._mtime(folder)
+                if os.path.exists(target):
+                    executable = os.path.abspath(target)
+            else:
+                # PATH (Windows では PATHEXT の拡張子も) を検索する
+                executable = shutil.which(target)
+        with self._lock:
+            self._cache[path] = (tuple(args), executable, folder, mtime)
+        return list(args), executable
+
+    def resolve(self, path: str) -> str | None:
+        """
+        実行ファイルの絶対パス (見つからなければ None)
+        """
+        return self.resolve_command(path)[1]
+
+    def export(self):
+        """
+        (PATH のスナップショット, 保持している結果) を返す (StartupSnapshot への保存用)
+        """
+        with self._lock:
+            return self._snapshot, dict(self._cache)
+
+    def seed(self, snapshot, entries: dict) -> bool:
+        """
+        前回の起動で保存した結果を取り込む。PATH の状態が変わっていれば何もせず False を返す
+        フォルダを含むパスの結果は、使うときにフォルダの更新時刻で確認される
+        """
+        current = self._path_snapshot()
+        if snapshot is None or tuple(snapshot) != current:
+            return False
+        with self._lock:
+            self._snapshot = current
+            self._checked_at = time.monotonic()
+            for path, entry in entries.items():
+                self._cache.setdefault(path, tuple(entry))
+        return True
+
+    def invalidate(self):
+        """
+        保持している結果をすべて破棄する (設定ファイルを読み直すときに呼ぶ)
+        PATH とフォルダの更新時刻で検出できない変化 (シンボリックリンクの付け替えなど) も反映される
+        """
+        with self._lock:
+            self._cache.clear()
+            self._checked_at = None
+            self.generation += 1
+
+
+def _lnk_target(path: str) -> str | None:
+    """
+    Windows のショートカット (.lnk) のリンク先のローカルパス
+    リンク先がローカルパスで書かれていない (ネットワーク、特殊フォルダなど) 場合や読めない場合は None
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read(65536)
+        if len(data) < 0x4C or struct.unpack_from("<I", data, 0)[0] != 0x4C:
+            return None
+        link_flags = struct.unpack_from("<I", data, 0x14)[0]
+        offset = 0x4C
+        if link_flags & 0x01:
+            # HasLinkTargetIDList: ID リストは読み飛ばす
+            offset += 2 + struct.unpack_from("<H", data, offset)[0]
+        if not link_flags & 0x02:
+            return None
+        # LinkInfo: VolumeIDAndLocalBasePath がある場合だけローカルパスを持つ
+        _, header_size, info_flags, _, base_offset, _, suffix_offset = struct.unpack_from("<7I", data, offset)
+        if not info_flags & 0x01:
+            return None
+        if header_size >= 0x24:
+            base_offset, suffix_offset = struct.unpack_from("<2I", data, offset + 0x1C)
+            base, suffix = (_read_cstring(data, offset + position, wide=True) for position in (base_offset, suffix_offset))
+        else:
+            base, suffix = (_read_cstring(data, offset + position, wide=False) for position in (base_offset, suffix_offset))
+    except (OSError, struct.error, UnicodeDecodeError):
+        return None
+    if not base:
+        return None
+    return os.path.join(base, suffix) if suffix else base
+
+
+def _read_cstring(data: bytes, position: int, wide: bool) -> str:
+    """
+    NUL で終わる文字列を読む (wide なら UTF-16LE、そうでなければ ANSI コードページ)
+    """
+    if wide:
+        end = position
+        while data[end:end + 2] not in (b"\0\0", b""):
+            end += 2
+        return data[position:end].decode("utf-16-le")
+    end = data.find(b"\0", position)
+    return data[position:end if end >= 0 else len(data)].decode("mbcs" if os.name == "nt" else "cp1252")
+
+
+def shortcut_target(path: str) -> str | None:
+    """
+    ショートカット (.lnk) や .desktop ファイルが指す実行ファイルのパス
+    ショートカットでない場合や、リンク先を判断できない場合は None
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".lnk":
+        return _lnk_target(path)
+    if extension != ".desktop":
+        return None
+    entry = read_desktop_entry(path)
+    command = entry.get("TryExec") or entry.get("Exec")
+    if not command:
+        return None
+    try:
+        args = shlex.split(command)
+    except ValueError:
+        return None
+    # env VAR=値 コマンド ... の形はコマンドの部分を見る
+    if args and os.path.basename(args[0]) == "env":
+        args = [arg for arg in args[1:] if "=" not in arg]
+    if not args:
+        return None
+    return shutil.which(args[0]) or args[0]
+
+
+class PathHealthChecker:
+    """
+    設定されたアプリのパスが起動できるかをバックグラウンドで検査し、結果を一定時間保持する
+
+    パスの分割と PATH の検索は PathResolver の結果を共有し、ショートカットはリンク先の有無も確認する。
+    検査は CHUNK_SIZE 件ずつワーカーに渡し、結果も同じ単位でまとめて on_results に通知するため、
+    1万件でも UI への通知は数十回で済む。問題のないパスは OK_TTL 秒、問題のあるパスは
+    修正がすぐに反映されるよう BROKEN_TTL 秒だけ結果を再利用する
+    """
+    OK_TTL = 300.0
+    BROKEN_TTL = 30.0
+    CHUNK_SIZE = 256
+    WORKERS = 8
+
+    def __init__(self, resolver, on_results=None):
+        self.resolver = resolver
+        # on_results({パス: 問題の説明 or None}) はワーカースレッドから呼ばれる
+        self.on_results = on_results
+        self._lock = threading.Lock()
+        # 設定のパス -> (問題の説明 or None, 有効期限)
+        self._results = {}
+        self._pending = set()
+        self._executor = ThreadPoolExecutor(max_workers=self.WORKERS, thread_name_prefix="health")
+
+    def problem(self, path: str) -> str | None:
+        """
+        最後に検査したときの問題の説明 (問題がない、または未検査なら None)
+        """
+        result = self._results.get(path)
+        return result[0] if result is not None else None
+
+    def check(self, apps):
+        """
+        アプリのリストのうち、未検査または結果の期限が切れたパスの検査を依頼する
+        """
+        now = time.monotonic()
+        entries = []
+        with self._lock:
+            for app_info in apps:
+                path = app_info.get("path")
+                if not path or path in self._pending:
+                    continue
+                result = self._results.get(path)
+                if result is not None and result[1] > now:
+                    continue
+                self._pending.add(path)
+                entries.append((path, bool(app_info.get("shell"))))
+        for start in range(0, len(entries), self.CHUNK_SIZE):
+            try:
+                self._executor.submit(self._check_chunk, entries[start:start + self.CHUNK_SIZE])
+            except RuntimeError:
+                # 終了処理の後は何もしない
+                return
+
+    def _check_chunk(self, entries: list):
+        results = {}
+        with tracer.span("health.check", paths=len(entries)):
+            for path, shell in entries:
+                try:
+                    results[path] = self.diagnose(path, shell)
+                except Exception as e:
+                    results[path] = str(e)
+        now = time.monotonic()
+        with self._lock:
+            for path, problem in results.items():
+                self._results[path] = (problem, now + (self.BROKEN_TTL if problem else self.OK_TTL))
+                self._pending.discard(path)
+        if self.on_results is not None:
+            self.on_results(results)
+
+    def retain(self, paths):
+        """
+        指定したパス以外の検査結果を捨てる (設定から消えたパスの結果を残し続けないため)
+        """
+        with self._lock:
+            self._results = {path: result for path, result in self._results.items() if path in paths}
+
+    def diagnose(self, path: str, shell: bool = False) -> str | None:
+        """
+        [ワーカースレッド] パスの問題の説明を返す (問題がなければ None)
+        """
+        if shell:
+            # シェルのコマンドはシェルが解釈するため検査しない
+            return None
+        try:
+            args, executable = self.resolver.resolve_command(path)
+        except ValueError:
+            return "パスの引用符が閉じられていません"
+        if not args:
+            return "パスが空です"
+        if executable is None:
+            return f"見つかりません: {args[0]}"
+        target = shortcut_target(executable)
+        if target is not None and not os.path.exists(target):
+            return f"リンク先が見つかりません: {target}"
+        return None
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class LaunchRecord:
+    """
+    1回の起動の記録 (起動にかかった時間と終了コード)
+    """
+    __slots__ = ("label", "pid", "spawn_ms", "started_at", "exit_code", "ended_at", "process")
+
+    def __init__(self, label: str, process, spawn_ms: float):
+        self.label = label
+        self.process = process
+        self.pid = getattr(process, "pid", None)
+        self.spawn_ms = spawn_ms
+        self.started_at = time.time()
+        self.exit_code = None
+        self.ended_at = None
+
+
+class LaunchSupervisor:
+    """
+    起動したアプリのプロセスを追跡し、終了したものを回収するスーパーバイザー
+
+    プロセスの終了はバックグラウンドのスレッドで定期的に確認するため、Tk のスレッドは待たされない。
+    終了コードは history に統計として残すだけで通知はしない
+    (explorer.exe のように、処理を別のプロセスに引き渡して 1 で終わるものがあるため)。
+    ユーザーに知らせるのは spawn 自体が送出した OSError だけにする。
+    """
+    POLL_INTERVAL = 0.5
+    HISTORY_SIZE = 200
+
+    def __init__(self, spawn=subprocess.Popen):
+        # プロセスを作成する関数 (ベンチマークなどでは代替の関数に差し替える)
+        self._spawn = spawn
+        self._children = []
+        # 直近の起動記録 (起動時間と終了コードの確認用)
+        self.history = deque(maxlen=self.HISTORY_SIZE)
+        self._lock = threading.Lock()
+        self._reaper = None
+
+    def spawn(self, label: str, args, shell: bool = False) -> LaunchRecord:
+        """
+        プロセスを起動して追跡を始める
+        起動自体の失敗 (見つからない、権限がない) は OSError としてそのまま送出する
+        """
+        start = time.perf_counter()
+        process = self._spawn(
+            args,
+            shell=shell,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            close_fds=True
+        )
+        record = LaunchRecord(label, process, (time.perf_counter() - start) * 1000)
+        with self._lock:
+            self._children.append(record)
+            self.history.append(record)
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap_loop, name="launch-reaper", daemon=True)
+                self._reaper.start()
+        return record
+
+    def open_document(self, label: str, path: str, args=()) -> LaunchRecord:
+        """
+        ショートカットやフォルダを OS の関連付けで開く
+        """
+        if os.name != "nt":
+            opener = "open" if sys.platform == "darwin" else "xdg-open"
+            return self.spawn(label, [opener, path])
+
+        # ShellExecute で開くため、プロセスは追跡できず起動時間だけを記録する
+        start = time.perf_counter()
+        os.startfile(path, arguments=subprocess.list2cmdline(list(args)))
+        record = LaunchRecord(label, None, (time.perf_counter() - start) * 1000)
+        with self._lock:
+            self.history.append(record)
+        return record
+
+    def open_desktop_entry(self, label: str, path: str, files=()) -> LaunchRecord:
+        """
+        .desktop ファイルのアプリを起動する
+        (xdg-open ではテキストエディターで開かれ、直接実行すると ENOEXEC で失敗するため)
+        gio があれば gio launch に任せ、なければ Exec の行からコマンドを作って起動する
+        """
+        gio = shutil.which("gio")
+        if gio is not None:
+            return self.spawn(label, [gio, "launch", path, *files])
+        command = desktop_entry_command(path, files)
+        if command is None:
+            raise FileNotFoundError(f"起動するコマンド (Exec) がありません: {path}")
+        return self.spawn(label, command)
+
+    def _reap_loop(self):
+        """
+        終了したプロセスを回収する。追跡中のプロセスがなくなったらスレッドを終える
+        """
+        while True:
+            time.sleep(self.POLL_INTERVAL)
+            with self._lock:
+                for record in list(self._children):
+                    code = record.process.poll()
+                    if code is None:
+                        continue
+                    record.exit_code = code
+                    record.ended_at = time.time()
+                    record.process = None
+                    self._children.remove(record)
+                if not self._children:
+                    self._reaper = None
+                    return
+
+def persistent_path(filename: str) -> str:
+    """
+    永続的な設定ファイルなどを置くパスを取得する。
+    .exeの場合は実行ファイルと同じディレクトリ、開発環境ではスクリプトと同じディレクトリ。
+    """
+    # PyInstallerによって作成された実行可能ファイルから実行されているかチェック
+    if getattr(sys, 'frozen', False) and hasattr(sys, '_MEIPASS'):
+        # .exeのパスを取得
+        app_path = os.path.dirname(sys.executable)
+    else:
+        # スクリプトとして実行されている場合は、スクリプトのディレクトリ
+        app_path = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(app_path, filename)
+
+def resource_path(relative_path: str) -> str:
+    """
+    実行ファイル(.exe)と開発環境の両方でリソースへのパスを解決する
+    """
+    try:
+        # PyInstallerが作成する一時フォルダのパスを取得
+        base_path = sys._MEIPASS
+    except Exception:
+        # 開発環境ではスクリプトのディレクトリを基準にする
+        base_path = os.path.abspath(".")
+
+    return os.path.join(base_path, relative_path)
+
+def main(argv=None):
+    """
+    コマンドライン引数を解釈してランチャーを起動する
+    """
+    parser = argparse.ArgumentParser(description="アプリランチャー")
+    parser.add_argument(
+        "--startup-report", action="store_true",
+        default=env_flag("LAUNCHER_STARTUP_REPORT"),
+        help="起動時間とモジュールの読み込み時間を startup_report.txt に出力する"
+    )
+    parser.add_argument(
+        "--trace", action="store_true",
+        help="主な処理の所要時間を記録し、終了時に trace.json と trace_summary.txt に出力する"
+    )
+    parser.add_argument("--resident", action="store_true", help="閉じてもウィンドウを隠すだけにして常駐する")
+    command = parser.add_mutually_exclusive_group()
+    command.add_argument("--show", action="store_true", help="起動中のランチャーを表示する (既定の動作)")
+    command.add_argument("--launch", metavar="NAME", help="指定した名前のアプリを起動する")
+    command.add_argument("--quit", action="store_true", help="常駐中のランチャーを終了する")
+    command.add_argument("--ipc-selftest", action="store_true", help="プロセス間通信の自己診断を実行する")
+    args = parser.parse_args(argv)
+
+    if args.ipc_selftest:
+        return run_ipc_selftest()
+
+    # 既に起動しているランチャーがあれば要求を転送して終了する
+    lock_path = persistent_path("launcher.lock")
+    if args.launch is not None:
+        message = {"command": "launch", "name": args.launch}
+    elif args.quit:
+        message = {"command": "quit"}
+    else:
+        message = {"command": "show"}
+    if send_instance_command(lock_path, message) is not None or args.quit:
+        return 0
+
+    server = InstanceServer(lock_path)
+    if not server.acquire():
+        # 同時に起動された別のランチャーが先にロックを取得した
+        send_instance_command(lock_path, message)
+        return 0
+
+    if args.trace:
+        tracer.enable()
+    # ランチャーの作成中に起動されたプロセスにも応答できるよう、先に受け付けを始める
+    # (作成が終わるまでに届いた要求は保留され、attach でランチャーに渡される)
+    server.serve()
+    try:
+        record_startup_event("モジュールの読み込み")
+        app = AppLauncher(startup_report_enabled=args.startup_report, resident=args.resident)
+        if not app.config:
+            # 設定の読み込みに失敗した場合、ウィンドウは破棄されている
+            return 1
+        server.attach(lambda msg: app.post_to_ui(app.handle_instance_command, msg))
+        if args.launch is not None:
+            app.after_idle(lambda: app.launch_by_name(args.launch))
+        app.mainloop()
+    finally:
+        server.stop()
+    return 0
 
 if __name__ == "__main__":
-    app = AppLauncher()
-    app.mainloop()
+    sys.exit(main())
@@ -0,0 +1,422 @@
+"""
+アプリランチャーのベンチマーク
+
+アイコンの抽出とプロセスの起動を代替のバックエンドに差し替え、
+合成した設定 (10〜10,000 件のアプリ) で次の項目を計測する。
+  ・起動時間 (モジュールの読み込みからウィンドウの作成まで)
+  ・最初のカテゴリが表示されるまでの時間
+  ・表示中のアイコンがすべて読み込まれるまでの時間
+  ・カテゴリの切り替え (初回の作成 / 作成済みの表示)
+  ・設定の再読み込み (差分の反映)
+  ・最大メモリ使用量
+計測は条件ごとに別のプロセスで行い、結果は JSON で出力する。
+--compare で以前の結果と比べると、遅くなった項目を表示して終了コード 1 を返す。
+
+Linux で DISPLAY がない場合は Xvfb を起動して実行する。
+    python launcher_benchmark.py --output bench.json
+    python launcher_benchmark.py --compare bench.json
+"""
+import time
+_CHILD_T0 = time.perf_counter()
+
+import argparse
+import copy
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+DEFAULT_SIZES = (10, 100, 1000, 10000)
+CATEGORY_COUNT = 8
+# 値が小さいほど良い項目。--compare でこの割合を超えて増えたら遅くなったとみなす
+DEFAULT_THRESHOLD = 1.2
+# 比較の対象にしない程度の小さな差 (ms)
+NOISE_FLOOR_MS = 2.0
+WAIT_TIMEOUT = 30.0
+
+
+# --- 代替バックエンド ---
+class StubIconBackend:
+    """
+    Windows API を使わずに単色のアイコンを返すバックエンド
+    delay を指定すると、抽出1回ごとにその秒数だけ待つ (実際の抽出の重さの再現)
+    """
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+
+    def resolve(self, path: str) -> str:
+        return path
+
+    def extract(self, full_path: str, size) -> bytes | None:
+        if self.delay:
+            time.sleep(self.delay)
+        shade = sum(full_path.encode('utf-8')) & 0xFF
+        return bytes((shade, 255 - shade, 128, 255)) * (size[0] * size[1])
+
+
+class StubProcess:
+    """
+    すぐに正常終了したものとして振る舞うプロセス
+    """
+    pid = 0
+    returncode = 0
+
+    def poll(self):
+        return 0
+
+
+def stub_spawn(args, **kwargs):
+    """
+    subprocess.Popen の代わりに渡す関数 (プロセスを作らない)
+    """
+    return StubProcess()
+
+
+# --- 合成した設定 ---
+def synthetic_config(app_count: int, category_count: int = CATEGORY_COUNT) -> dict:
+    """
+    app_count 件のアプリを持つ設定を作る
+    半分を最初のカテゴリに集め、大きなカテゴリ (仮想化リスト) も計測できるようにする
+    """
+    names = [f"カテゴリ{i + 1}" for i in range(category_count)]
+    config = {name: [] for name in names}
+    big = app_count // 2
+    for i in range(app_count):
+        if i < big:
+            category = names[0]
+        else:
+            category = names[1 + (i - big) % (category_count - 1)]
+        config[category].append({
+            "name": f"アプリ {i:05d}",
+            "path": f"C:/Program Files/Bench/app{i:05d}/app{i:05d}.exe"
+        })
+    return config
+
+
+def summarize(samples: list) -> dict:
+    """
+    計測値 (ms) のリストを中央値・p95・最大値にまとめる
+    """
+    if not samples:
+        return {"median": None, "p95": None, "max": None}
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    return {
+        "median": round(statistics.median(ordered), 3),
+        "p95": round(p95, 3),
+        "max": round(ordered[-1], 3),
+    }
+
+
+def peak_memory_kb() -> int | None:
+    """
+    プロセスの最大常駐メモリ (KB)。取得できない環境では None
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS はバイト単位、Linux は KB 単位
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+# --- 計測 (子プロセス) ---
+def _pump_until(app, condition, timeout: float = WAIT_TIMEOUT) -> bool:
+    """
+    condition() が真になるまでイベントループを回す
+    """
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            return False
+        app.update()
+        time.sleep(0.001)
+    return True
+
+
+def _icons_ready(app) -> bool:
+    pane = app.current_pane
+    if pane is None:
+        return False
+    return not any(getattr(button, "icon_pending", False) for button in pane.icon_targets())
+
+
+def _timed(app, action) -> float:
+    """
+    action() を実行し、再描画が終わるまでの時間 (ms) を返す
+    """
+    start = time.perf_counter()
+    action()
+    app.update_idletasks()
+    return (time.perf_counter() - start) * 1000
+
+
+def _reload_variants(config: dict):
+    """
+    再読み込みの計測に使う設定の変更 (アプリの改名・追加・カテゴリの追加・並べ替え)
+    """
+    categories = list(config)
+    last = categories[-1]
+
+    renamed = copy.deepcopy(config)
+    first = renamed[categories[0]]
+    if first:
+        # アプリの項目は書き換えずに置き換える
+        first[0] = dict(first[0], name=first[0]["name"] + " (改名)")
+    yield "rename_app", renamed
+
+    added = copy.deepcopy(renamed)
+    added[last].append({"name": "追加したアプリ", "path": "C:/Program Files/Bench/added/added.exe"})
+    yield "add_app", added
+
+    with_category = copy.deepcopy(added)
+    with_category["追加したカテゴリ"] = [{"name": "新規", "path": "C:/Program Files/Bench/new/new.exe"}]
+    yield "add_category", with_category
+
+    reordered = {name: copy.deepcopy(with_category[name]) for name in reversed(list(with_category))}
+    yield "reorder_categories", reordered
+
+
+def run_scenario(app_count: int, icon_delay: float) -> dict:
+    """
+    1つの条件で計測し、結果を辞書で返す (このプロセスで1回だけ呼ぶ)
+    """
+    data_dir = tempfile.mkdtemp(prefix="launcher-bench-")
+    config = synthetic_config(app_count)
+    with open(os.path.join(data_dir, "config.json"), 'w', encoding='utf-8') as f:
+        json.dump(config, f, ensure_ascii=False)
+
+    import_start = time.perf_counter()
+    import desktop_launcher
+    import_ms = (time.perf_counter() - import_start) * 1000
+
+    app = desktop_launcher.AppLauncher(
+        data_dir=data_dir,
+        icon_backend=StubIconBackend(icon_delay),
+        spawn=stub_spawn
+    )
+    try:
+        cold_start_ms = (time.perf_counter() - _CHILD_T0) * 1000
+        _pump_until(app, lambda: app.current_category is not None)
+        first_paint_ms = (time.perf_counter() - _CHILD_T0) * 1000
+
+        icons_start = time.perf_counter()
+        icons_complete = _pump_until(app, lambda: _icons_ready(app))
+        first_icons_ms = (time.perf_counter() - icons_start) * 1000
+
+        # 初回の切り替えはペインの作成を含み、2回目以降は作成済みのペインを表示するだけ
+        categories = list(app.config)
+        switch_cold = [_timed(app, lambda c=c: app.show_apps_for_category(c)) for c in categories[1:]]
+        switch_warm = []
+        for _ in range(3):
+            switch_warm.extend(_timed(app, lambda c=c: app.show_apps_for_category(c)) for c in categories)
+
+        reload_ms = {}
+        current = app.config
+        for label, new_config in _reload_variants(current):
+            reload_ms[label] = round(_timed(app, lambda n=new_config: app.reload_ui(n)), 3)
+        # 元の設定に戻す (多くのカテゴリが入れ替わる場合)
+        reload_ms["restore"] = round(_timed(app, lambda: app.reload_ui(copy.deepcopy(config))), 3)
+
+        return {
+            "apps": app_count,
+            "icon_delay_ms": icon_delay * 1000,
+            "import_ms": round(import_ms, 3),
+            "cold_start_ms": round(cold_start_ms, 3),
+            "first_paint_ms": round(first_paint_ms, 3),
+            "first_icons_ms": round(first_icons_ms, 3),
+            "icons_complete": icons_complete,
+            "switch_cold_ms": summarize(switch_cold),
+            "switch_warm_ms": summarize(switch_warm),
+            "reload_ms": reload_ms,
+            "peak_rss_kb": peak_memory_kb(),
+            "icon_cache": app.icon_cache.stats(),
+        }
+    finally:
+        app.quit_launcher()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+# --- 実行と比較 (親プロセス) ---
+def ensure_display():
+    """
+    Linux で DISPLAY がなければ Xvfb を起動する。起動したプロセスを返す
+    """
+    if not sys.platform.startswith("linux") or os.environ.get("DISPLAY"):
+        return None
+    xvfb = shutil.which("Xvfb")
+    if xvfb is None:
+        raise RuntimeError("DISPLAY が設定されておらず、Xvfb も見つかりません")
+    read_fd, write_fd = os.pipe()
+    process = subprocess.Popen(
+        [xvfb, "-displayfd", str(write_fd), "-screen", "0", "1280x1024x24", "-nolisten", "tcp"],
+        pass_fds=(write_fd,),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    os.close(write_fd)
+    # Xvfb は準備ができると使用したディスプレイ番号を書き込む
+    with os.fdopen(read_fd) as f:
+        display = f.readline().strip()
+    if not display:
+        process.kill()
+        raise RuntimeError("Xvfb を起動できませんでした")
+    os.environ["DISPLAY"] = f":{display}"
+    return process
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_child(app_count: int, icon_delay: float) -> dict:
+    """
+    新しいプロセスで1つの条件を計測する (起動時間に前回の計測の影響を残さないため)
+    """
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", str(app_count), "--icon-delay", str(icon_delay)],
+        capture_output=True, text=True, encoding='utf-8'
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"{app_count} 件の計測に失敗しました:\n{completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def merge_runs(runs: list) -> dict:
+    """
+    繰り返し計測した結果を、数値ごとの中央値にまとめる
+    """
+    first = runs[0]
+    merged = {}
+    for key, value in first.items():
+        if isinstance(value, dict):
+            merged[key] = merge_runs([run[key] for run in runs])
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values = [run[key] for run in runs if run[key] is not None]
+            if values and all(v == values[0] for v in values):
+                merged[key] = values[0]
+            else:
+                merged[key] = round(statistics.median(values), 3) if values else None
+        else:
+            merged[key] = value
+    return merged
+
+
+def flatten(result: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in result.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list:
+    """
+    以前の結果より遅く (大きく) なった項目のリストを返す
+    """
+    regressions = []
+    base_by_size = {r["apps"]: flatten(r) for r in baseline["results"]}
+    for result in current["results"]:
+        base = base_by_size.get(result["apps"])
+        if base is None:
+            continue
+        for name, value in flatten(result).items():
+            if name in ("apps", "icon_delay_ms") or name.startswith("icon_cache.") or value is None:
+                continue
+            old = base.get(name)
+            if not old:
+                continue
+            # メモリ以外の時間は、小さすぎる差をノイズとして無視する
+            if name.endswith("_ms") or "_ms." in name:
+                if value - old < NOISE_FLOOR_MS:
+                    continue
+            if value > old * threshold:
+                regressions.append((result["apps"], name, old, value))
+    return regressions
+
+
+def format_table(results: list) -> str:
+    header = (f"{'アプリ数':>8} {'起動':>9} {'初回表示':>9} {'アイコン':>9} "
+              f"{'切替(初回)':>10} {'切替':>8} {'再読込':>8} {'メモリ(MB)':>10}")
+    lines = [header]
+    for r in results:
+        reload_worst = max(r["reload_ms"].values())
+        memory = f"{r['peak_rss_kb'] / 1024:10.1f}" if r["peak_rss_kb"] else f"{'-':>10}"
+        lines.append(
+            f"{r['apps']:8d} {r['cold_start_ms']:9.1f} {r['first_paint_ms']:9.1f} {r['first_icons_ms']:9.1f} "
+            f"{r['switch_cold_ms']['p95'] or 0:10.2f} {r['switch_warm_ms']['p95'] or 0:8.2f} "
+            f"{reload_worst:8.2f} {memory}"
+        )
+    lines.append("(時間は ms、切替は p95、再読込は最も遅かった変更)")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="アプリランチャーのベンチマーク")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="計測するアプリ数")
+    parser.add_argument("--repeat", type=int, default=3, help="条件ごとの計測回数 (中央値を採用)")
+    parser.add_argument("--icon-delay", type=float, default=0.0, help="アイコン1件の抽出にかける秒数")
+    parser.add_argument("--output", help="結果の JSON を書き出すファイル")
+    parser.add_argument("--compare", metavar="BASELINE", help="比較する以前の結果の JSON")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="遅くなったとみなす倍率")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child is not None:
+        print(json.dumps(run_scenario(args.child, args.icon_delay)))
+        return 0
+
+    xvfb = ensure_display()
+    try:
+        results = []
+        for size in args.sizes:
+            runs = [run_child(size, args.icon_delay) for _ in range(max(1, args.repeat))]
+            results.append(merge_runs(runs))
+            print(f"{size} 件: 完了", file=sys.stderr)
+    finally:
+        if xvfb is not None:
+            xvfb.terminate()
+
+    report = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+    print(format_table(results))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report, args.threshold)
+        for size, name, old, new in regressions:
+            print(f"遅くなった項目: {size} 件 {name}: {old} -> {new}")
+        if regressions:
+            return 1
+        print(f"{baseline.get('revision') or '以前の結果'} と比べて遅くなった項目はありません")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())